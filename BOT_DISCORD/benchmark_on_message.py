@@ -0,0 +1,212 @@
+"""Benchmark offline do fluxo on_message -> get_prefix -> process_commands
+
+Reproduz mensagens falsas (sem conexão com o Discord) contra um config.db
+temporário e mede vazão e latência p50/p99 para uma mistura configurável de:
+
+    chat     conversa comum em canal de texto
+    ticket   conversa em um canal de ticket aberto
+    command  comando com o prefixo do servidor
+    panel    mensagem contendo só o prefixo (abre o painel)
+
+Uso:
+    python benchmark_on_message.py
+    python benchmark_on_message.py --messages 50000 --mix chat=60,ticket=20,command=15,panel=5
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+DEFAULT_MIX = "chat=70,ticket=15,command=10,panel=5"
+MESSAGE_KINDS = ("chat", "ticket", "command", "panel")
+
+GUILD_ID = 900000000000000001
+TEXT_CHANNEL_ID = 900000000000000002
+TICKET_CHANNEL_ID = 900000000000000003
+BOT_USER_ID = 900000000000000004
+GUILD_PREFIX = "?"
+FAMILY_PREFIX = "!f"
+
+# ================= OBJETOS FALSOS DO DISCORD =================
+class FakeUser:
+    """Autor de mensagens (membro ou o próprio bot)"""
+
+    def __init__(self, user_id, name, bot=False):
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.global_name = name
+        self.mention = f"<@{user_id}>"
+        self.bot = bot
+        self.roles = []
+
+class FakeGuild:
+    def __init__(self, guild_id, name):
+        self.id = guild_id
+        self.name = name
+
+class FakeChannel:
+    """Canal de texto que só conta as mensagens enviadas pelo bot"""
+
+    def __init__(self, channel_id, name, guild):
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+
+class FakeMessage:
+    """Subconjunto de discord.Message usado por on_message e pelo Context"""
+
+    def __init__(self, state, message_id, content, author, channel):
+        self._state = state
+        self.id = message_id
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.created_at = datetime.now(timezone.utc)
+        self.edited_at = None
+        self.attachments = []
+        self.mentions = []
+
+# ================= PREPARAÇÃO =================
+def parse_mix(text):
+    """Converte 'chat=70,ticket=15,...' em pesos por tipo de mensagem"""
+    weights = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in MESSAGE_KINDS:
+            raise argparse.ArgumentTypeError(f"tipo de mensagem inválido: {kind!r} (use {', '.join(MESSAGE_KINDS)})")
+        weights[kind] = float(weight or 0)
+    if not any(weights.values()):
+        raise argparse.ArgumentTypeError("a mistura precisa de pelo menos um peso positivo")
+    return weights
+
+def build_messages(state, count, mix, seed):
+    """Gera a sequência de mensagens a reproduzir (determinística pela seed)"""
+    rng = random.Random(seed)
+    guild = FakeGuild(GUILD_ID, "Servidor de Benchmark")
+    text_channel = FakeChannel(TEXT_CHANNEL_ID, "geral", guild)
+    ticket_channel = FakeChannel(TICKET_CHANNEL_ID, "suporte-bench", guild)
+    members = [FakeUser(800000000000000000 + i, f"membro{i}") for i in range(50)]
+
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    messages = []
+    for message_id in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        author = rng.choice(members)
+        if kind == "chat":
+            content, channel = f"mensagem comum {message_id}", text_channel
+        elif kind == "ticket":
+            content, channel = f"preciso de ajuda {message_id}", ticket_channel
+        elif kind == "command":
+            content, channel = f"{GUILD_PREFIX}benchping {message_id}", text_channel
+        else:
+            content, channel = rng.choice((GUILD_PREFIX, FAMILY_PREFIX)), text_channel
+        messages.append((kind, FakeMessage(state, message_id, content, author, channel)))
+    return messages, (text_channel, ticket_channel)
+
+def percentile(sorted_values, fraction):
+    """Percentil (0..1) de uma lista já ordenada"""
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+# ================= EXECUÇÃO =================
+async def run_benchmark(main, args):
+    bot = main.bot
+
+    # Comando sem efeitos colaterais: mede o despacho, não o comando em si
+    @bot.command(name="benchping")
+    async def benchping(ctx, *, rest: str = ""):
+        await ctx.channel.send("pong")
+
+    async with bot:
+        # Sem login: o bot só precisa saber quem ele mesmo é
+        bot._connection.user = FakeUser(BOT_USER_ID, "bot", bot=True)
+
+        main.init_db()
+        await main.guild_settings.update(GUILD_ID, {"prefix": GUILD_PREFIX, "family_prefix": FAMILY_PREFIX})
+        await main.db.execute(
+            "INSERT OR REPLACE INTO active_tickets (guild_id, channel_id, user_id, ticket_type, created_at, last_activity) "
+            "VALUES (?, ?, ?, ?, datetime('now'), CURRENT_TIMESTAMP)",
+            (str(GUILD_ID), str(TICKET_CHANNEL_ID), "800000000000000000", "suporte")
+        )
+        await main.ticket_activity.load()
+        # last_activity como o default CURRENT_TIMESTAMP dos bancos antigos (UTC sem fuso): em qualquer TZ
+        # do host a atividade carregada tem que ser de agora, senão o auto-fechamento erra
+        # pelo fuso (rode também com TZ=Asia/Tokyo, por exemplo)
+        loaded_age = datetime.now(timezone.utc) - main.ticket_activity.get(TICKET_CHANNEL_ID)
+        if abs(loaded_age.total_seconds()) > 60:
+            raise SystemExit(f"atividade do ticket carregada com {loaded_age} de diferença (fuso errado?)")
+
+        messages, channels = build_messages(bot._connection, args.warmup + args.messages, args.mix, args.seed)
+        warmup, measured = messages[:args.warmup], messages[args.warmup:]
+
+        latencies = {kind: [] for kind in MESSAGE_KINDS}
+        # Os logs dos handlers passam pela fila do bot_logging: o custo de emiti-los entra na medição
+        for _, message in warmup:
+            await main.on_message(message)
+
+        started = time.perf_counter()
+        for kind, message in measured:
+            t0 = time.perf_counter()
+            await main.on_message(message)
+            latencies[kind].append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+
+        # Inclui o custo da gravação em lote pendente
+        flush_started = time.perf_counter()
+        flushed = await main.ticket_activity.flush()
+        flush_elapsed = time.perf_counter() - flush_started
+
+    report(latencies, elapsed, flushed, flush_elapsed, sum(channel.sent for channel in channels))
+
+def report(latencies, elapsed, flushed, flush_elapsed, replies):
+    all_latencies = sorted(value for values in latencies.values() for value in values)
+    total = len(all_latencies)
+    print(f"\n📊 {total} mensagens em {elapsed:.3f}s -> {total / elapsed:,.0f} msg/s ({replies} respostas do bot)")
+    print(f"{'tipo':<10}{'qtd':>8}{'p50 (µs)':>12}{'p99 (µs)':>12}{'máx (µs)':>12}")
+    rows = [(kind, sorted(values)) for kind, values in latencies.items() if values]
+    rows.append(("total", all_latencies))
+    for kind, values in rows:
+        print(
+            f"{kind:<10}{len(values):>8}"
+            f"{percentile(values, 0.50) * 1e6:>12.1f}"
+            f"{percentile(values, 0.99) * 1e6:>12.1f}"
+            f"{values[-1] * 1e6:>12.1f}"
+        )
+    print(f"flush de atividade dos tickets: {flushed} linha(s) em {flush_elapsed * 1e3:.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20000, help="mensagens medidas")
+    parser.add_argument("--warmup", type=int, default=1000, help="mensagens descartadas antes da medição")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"pesos por tipo de mensagem (padrão: {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=1234, help="seed da sequência de mensagens")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Banco e log temporários precisam estar definidos antes de importar o bot
+        os.environ["BOT_DB_PATH"] = str(Path(tmp) / "config.db")
+        os.environ["BOT_LOG_FILE"] = str(Path(tmp) / "bot.log")
+        sys.path.insert(0, str(Path(__file__).parent))
+        import main as bot_main
+
+        try:
+            asyncio.run(run_benchmark(bot_main, args))
+        finally:
+            bot_main.db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from pathlib import Path
+
+# ================= LOGGING =================
+# Os handlers do bot e da API só enfileiram o registro; uma thread (QueueListener)
+# escreve no console e no bot.log com rotação, fora do event loop.
+
+LOG_FILE = Path(os.getenv("BOT_LOG_FILE") or Path(__file__).parent / "bot.log")
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# Nível padrão por subsistema; LOG_LEVELS="bot.messages=DEBUG,discord=WARNING" sobrescreve
+DEFAULT_LEVELS = {
+    "bot.messages": "INFO",   # linhas por mensagem ficam em DEBUG
+    "bot.events": "INFO",     # linhas por evento de cargo/canal/membro ficam em DEBUG
+    "bot.sync": "INFO",
+    "werkzeug": "WARNING",    # uma linha por requisição da API local
+}
+
+# Atributos padrão do LogRecord; o que sobrar veio de extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class StructuredFormatter(logging.Formatter):
+    """Formato do bot.log com os campos passados em extra={...} no final (chave=valor)"""
+
+    def format(self, record):
+        line = super().format(record)
+        fields = [
+            f"{key}={value}" for key, value in vars(record).items()
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_")
+        ]
+        if fields:
+            line = f"{line} | {' '.join(fields)}"
+        return line
+
+def parse_levels(text):
+    """Converte 'logger=NIVEL,logger=NIVEL' em dicionário"""
+    levels = {}
+    for part in (text or "").split(","):
+        name, _, level = part.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+_listener = None
+
+def setup_logging(level=None, levels=None, log_file=LOG_FILE):
+    """Configura o logging com fila (idempotente) e retorna o QueueListener"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    formatter = StructuredFormatter(LOG_FORMAT)
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+    )
+    console_handler = logging.StreamHandler(sys.stdout)
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel((level or os.getenv("LOG_LEVEL") or "INFO").upper())
+
+    subsystem_levels = dict(DEFAULT_LEVELS)
+    subsystem_levels.update(parse_levels(os.getenv("LOG_LEVELS")))
+    subsystem_levels.update(levels or {})
+    for name, subsystem_level in subsystem_levels.items():
+        logging.getLogger(name).setLevel(subsystem_level)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, console_handler, file_handler, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+def stop_logging():
+    """Escreve o que ainda está na fila e para a thread de logging"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,236 @@
+import asyncio
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from metrics import metrics
+
+logger = logging.getLogger("bot.db")
+
+# ================= CAMINHOS DOS BANCOS =================
+# BOT_DB_PATH permite apontar para outro arquivo (ex.: banco temporário do benchmark)
+DB_PATH = Path(os.getenv("BOT_DB_PATH") or Path(__file__).parent / "config.db")
+CONFIG_DB_PATH = Path(__file__).parent / "perm_config.db"
+
+# ================= HORÁRIOS =================
+def parse_utc_datetime(value):
+    """Horário gravado no banco em datetime com fuso UTC
+
+    Textos sem fuso (datetime('now'), CURRENT_TIMESTAMP) já estão em UTC.
+    Levanta TypeError/ValueError para valores vazios ou inválidos.
+    """
+    when = datetime.fromisoformat(value)
+    if when.tzinfo is None:
+        return when.replace(tzinfo=timezone.utc)
+    return when.astimezone(timezone.utc)
+
+def parse_utc_timestamp(value):
+    """Horário gravado no banco (ver parse_utc_datetime) em timestamp"""
+    return parse_utc_datetime(value).timestamp()
+
+# ================= CONEXÕES =================
+# Aplicados uma única vez, quando cada conexão é aberta
+BUSY_TIMEOUT_MS = 5000        # espera por lock antes de falhar com "database is locked"
+CACHE_SIZE_KIB = 16384        # cache de páginas por conexão (valor negativo = KiB)
+CACHED_STATEMENTS = 256       # statements preparados reaproveitados por conexão
+
+def connect(path=DB_PATH):
+    """Abre uma conexão configurada com o banco (WAL + pragmas de desempenho)"""
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=CACHED_STATEMENTS,
+        # Cada conexão continua presa à sua thread (ver ConnectionPool); isso só
+        # permite que o pool feche todas a partir da thread principal no desligamento
+        check_same_thread=False,
+    )
+    conn.row_factory = sqlite3.Row
+    # WAL permite leituras simultâneas a uma escrita; NORMAL é seguro em WAL
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+class _ThreadConnections:
+    """Conexões de uma thread; quando a thread termina, o pool fecha todas (ver ConnectionPool)"""
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.connections = {}
+
+class ConnectionPool:
+    """Mantém uma conexão aberta por thread e por banco
+
+    sqlite3 não permite compartilhar uma conexão entre threads, então cada
+    thread (event loop, executor do banco, API do dashboard) recebe a sua e a
+    reutiliza em todas as operações seguintes, junto com o cache de statements.
+    As conexões de uma thread são fechadas quando ela termina (o servidor da
+    API abre uma thread por requisição).
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all = set()
+        # Incrementado por close_all para que cada thread descarte as conexões fechadas
+        self._generation = 0
+
+    def get(self, path=DB_PATH):
+        """Retorna a conexão da thread atual para o banco informado"""
+        holder = getattr(self._local, "holder", None)
+        if holder is None or holder.generation != self._generation:
+            holder = self._local.holder = _ThreadConnections(self._generation)
+            # Roda quando o thread-local é descartado, ao fim da thread
+            weakref.finalize(holder, self._release, holder.connections)
+        key = str(path)
+        conn = holder.connections.get(key)
+        if conn is None:
+            conn = connect(path)
+            holder.connections[key] = conn
+            with self._lock:
+                self._all.add(conn)
+        return conn
+
+    def _release(self, connections):
+        """Fecha as conexões de uma thread que terminou"""
+        with self._lock:
+            self._all.difference_update(connections.values())
+        self._close(connections.values())
+
+    @staticmethod
+    def _close(connections):
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.error(f"Erro ao fechar conexão do banco: {e}")
+
+    def close_all(self):
+        """Fecha todas as conexões abertas pelo pool (desligamento do bot)"""
+        with self._lock:
+            connections, self._all = self._all, set()
+            self._generation += 1
+        self._close(connections)
+
+pool = ConnectionPool()
+
+def get_db(path=DB_PATH):
+    """Retorna a conexão reutilizável da thread atual (uso síncrono, fora do event loop)
+
+    A conexão pertence ao pool: use `with conn:` para commit/rollback e não a feche.
+    """
+    try:
+        return pool.get(path)
+    except sqlite3.Error as e:
+        logger.error(f"Erro ao conectar ao banco: {e}")
+        raise
+
+# ================= ACESSO ASSÍNCRONO =================
+QUERY_LABEL_LENGTH = 80
+
+@functools.lru_cache(maxsize=512)
+def query_label(sql):
+    """Nome da consulta nas métricas: o SQL em uma linha, truncado"""
+    label = " ".join(sql.split())
+    return label if len(label) <= QUERY_LABEL_LENGTH else label[:QUERY_LABEL_LENGTH - 3] + "..."
+
+class AsyncDatabase:
+    """Executa as operações do SQLite em threads dedicadas, fora do event loop
+
+    Todas as consultas passam pelo mesmo executor, então nenhuma espera por disco
+    ou por lock do banco trava os heartbeats do gateway nem os outros servidores.
+    """
+
+    def __init__(self, path=DB_PATH, max_workers=4):
+        self.path = path
+        # Com WAL, várias leituras rodam em paralelo; escritas se serializam pelo lock do SQLite
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sqlite")
+
+    def _connection(self):
+        """Conexão do pool para a thread atual do executor"""
+        return pool.get(self.path)
+
+    def _call(self, func, args):
+        return func(self._connection(), *args)
+
+    async def run(self, func, *args, name=None):
+        """Executa func(conn, *args) na thread do banco e retorna o resultado
+
+        O tempo (incluindo a espera por uma thread livre) vai para as métricas
+        "db" com o nome `name`, ou o nome da função.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, self._call, func, args)
+        finally:
+            metrics.observe("db", name or func.__name__, time.perf_counter() - started)
+
+    async def fetchone(self, sql, params=()):
+        """Retorna a primeira linha da consulta (ou None)"""
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone(), name=query_label(sql))
+
+    async def fetchall(self, sql, params=()):
+        """Retorna todas as linhas da consulta"""
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall(), name=query_label(sql))
+
+    async def fetchval(self, sql, params=(), default=None):
+        """Retorna a primeira coluna da primeira linha da consulta"""
+        row = await self.fetchone(sql, params)
+        return row[0] if row is not None else default
+
+    async def execute(self, sql, params=()):
+        """Executa um comando de escrita com commit e retorna o número de linhas afetadas"""
+        def _execute(conn):
+            with conn:
+                return conn.execute(sql, params).rowcount
+        return await self.run(_execute, name=query_label(sql))
+
+    async def execute_returning(self, sql, params=()):
+        """Executa um comando de escrita com RETURNING, com commit, e retorna a linha (ou None)"""
+        def _execute_returning(conn):
+            with conn:
+                return conn.execute(sql, params).fetchone()
+        return await self.run(_execute_returning, name=query_label(sql))
+
+    async def executemany(self, sql, seq_of_params):
+        """Executa o mesmo comando para vários parâmetros em uma única transação"""
+        def _executemany(conn):
+            with conn:
+                return conn.executemany(sql, seq_of_params).rowcount
+        return await self.run(_executemany, name=query_label(sql))
+
+    async def transaction(self, func, *args):
+        """Executa func(conn, *args) dentro de uma transação (commit ou rollback automático)
+
+        Use para fluxos de verificação + escrita: toda a função roda na thread do
+        banco, sem outras operações intercaladas.
+        """
+        def _transaction(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(conn, *args)
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+            return result
+        return await self.run(_transaction, name=func.__name__)
+
+    def close(self):
+        """Conclui as operações pendentes, encerra o executor e fecha as conexões"""
+        self._executor.shutdown(wait=True)
+        pool.close_all()
+
+# Instância compartilhada usada pelo bot
+db = AsyncDatabase(DB_PATH)
@@ -0,0 +1,267 @@
+import random
+import time
+from bisect import bisect_right
+from datetime import datetime
+
+from database import db
+from leaderboard import leaderboard
+
+# ================= ECONOMIA =================
+# Cada operação de saldo é um único comando (UPSERT ou UPDATE com a condição no
+# WHERE) com RETURNING: cria o usuário se preciso, altera e devolve o resultado
+# numa só ida ao banco e numa só transação. Nada é lido antes para ser escrito
+# depois, então comandos simultâneos do mesmo usuário não perdem atualizações.
+# Toda mudança de total (money + bank) é repassada ao ranking (leaderboard.py).
+
+# Valores de um usuário que ainda não tem linha em users
+DEFAULT_PROFILE = {"money": 0, "bank": 0, "rep": 0, "xp": 0, "level": 1, "about_me": None}
+
+# Colunas de horário que podem ser gravadas junto com um crédito
+TIMESTAMP_COLUMNS = ("last_daily", "last_work")
+
+_CREDIT_SQL = {
+    column: f"""
+        INSERT INTO users (user_id, money, {column}) VALUES (?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            money = money + excluded.money,
+            {column} = excluded.{column}
+        RETURNING money, bank
+    """
+    for column in TIMESTAMP_COLUMNS
+}
+
+class EconomyLedger:
+    """Operações de saldo, reputação e perfil sobre a tabela users"""
+
+    def __init__(self, database=db):
+        self.db = database
+
+    async def profile(self, user_id):
+        """Dinheiro, banco, reputação, XP, nível e descrição (padrões se o usuário não existir)"""
+        row = await self.db.fetchone(
+            "SELECT money, bank, rep, xp, level, about_me FROM users WHERE user_id = ?", (user_id,)
+        )
+        return dict(row) if row else dict(DEFAULT_PROFILE)
+
+    async def credit(self, user_id, amount, timestamp_column):
+        """Soma `amount` ao dinheiro e grava o horário em `timestamp_column`; retorna (dinheiro, banco)"""
+        money, bank = await self.db.execute_returning(
+            _CREDIT_SQL[timestamp_column], (user_id, amount, datetime.now().isoformat())
+        )
+        leaderboard.changed(money + bank - amount, money + bank)
+        return money, bank
+
+    async def deposit(self, user_id, amount):
+        """Move `amount` do dinheiro para o banco; retorna (dinheiro, banco) ou None sem saldo
+
+        O total não muda, então o ranking não é afetado.
+        """
+        row = await self.db.execute_returning("""
+            UPDATE users SET money = money - ?, bank = bank + ?
+            WHERE user_id = ? AND money >= ?
+            RETURNING money, bank
+        """, (amount, amount, user_id, amount))
+        return tuple(row) if row else None
+
+    async def give_rep(self, giver_id, user_id):
+        """Dá um ponto de reputação a `user_id` e grava o horário em quem deu; retorna a reputação nova"""
+        return await self.db.transaction(_give_rep, giver_id, user_id, datetime.now().isoformat())
+
+    async def set_about_me(self, user_id, text):
+        """Define a descrição do perfil"""
+        await self.db.execute("""
+            INSERT INTO users (user_id, about_me) VALUES (?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET about_me = excluded.about_me
+        """, (user_id, text))
+
+def _give_rep(conn, giver_id, user_id, given_at):
+    rep = conn.execute("""
+        INSERT INTO users (user_id, rep) VALUES (?, 1)
+        ON CONFLICT(user_id) DO UPDATE SET rep = rep + 1
+        RETURNING rep
+    """, (user_id,)).fetchone()[0]
+    conn.execute("""
+        INSERT INTO users (user_id, last_rep) VALUES (?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET last_rep = excluded.last_rep
+    """, (giver_id, given_at))
+    return rep
+
+# Instância compartilhada pelos comandos de economia
+economy = EconomyLedger()
+
+# ================= COOLDOWNS DA ECONOMIA =================
+# Intervalo de cada ação, pela coluna de users que guarda o último uso
+COOLDOWN_SECONDS = {
+    "last_daily": 24 * 3600,
+    "last_work": 3600,
+    "last_rep": 24 * 3600,
+}
+COOLDOWN_SWEEP_SECONDS = 600   # intervalo mínimo entre limpezas dos cooldowns vencidos
+
+class EconomyCooldowns:
+    """Cooldowns de daily, trabalhar e rep que sobrevivem a reinícios
+
+    O vencimento de cada (usuário, ação) fica num dicionário em memória; na
+    primeira verificação de um usuário depois da inicialização ele vem da coluna
+    last_* de users (uma leitura pela chave primária) e daí em diante a
+    verificação é só uma consulta ao dicionário. Vencimentos passados saem do
+    dicionário (na verificação e numa limpeza a cada COOLDOWN_SWEEP_SECONDS);
+    se o usuário voltar, a coluna é lida de novo.
+    """
+
+    def __init__(self, database=db):
+        self.db = database
+        self._expires = {}   # (user_id, coluna) -> vencimento (timestamp)
+        self._next_sweep = time.time() + COOLDOWN_SWEEP_SECONDS
+
+    async def _warm(self, user_id, column):
+        last_used = await self.db.fetchval(f"SELECT {column} FROM users WHERE user_id = ?", (user_id,))
+        expires = 0
+        if last_used:
+            try:
+                # Gravado por datetime.now().isoformat() (horário local)
+                expires = datetime.fromisoformat(last_used).timestamp() + COOLDOWN_SECONDS[column]
+            except ValueError:
+                pass
+        return self._expires.get((user_id, column), expires)
+
+    def _sweep(self, now):
+        """Remove os cooldowns já vencidos"""
+        self._expires = {key: expires for key, expires in self._expires.items() if expires > now}
+        self._next_sweep = now + COOLDOWN_SWEEP_SECONDS
+
+    async def acquire(self, user_id, column):
+        """Reserva a ação se o cooldown já venceu
+
+        Retorna 0 se a reserva foi feita (a ação pode continuar) ou os segundos
+        que ainda faltam. Se a ação falhar depois, chamar release().
+        """
+        key = (user_id, column)
+        expires = self._expires.get(key)
+        if expires is None:
+            expires = await self._warm(user_id, column)
+        now = time.time()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        if expires > now:
+            self._expires[key] = expires
+            return expires - now
+        # Vencido (ou sem cooldown): a entrada antiga dá lugar à reserva
+        self._expires[key] = now + COOLDOWN_SECONDS[column]
+        return 0
+
+    def release(self, user_id, column):
+        """Desfaz a reserva de uma ação que não foi concluída (a coluna no banco não mudou)"""
+        self._expires.pop((user_id, column), None)
+
+def format_cooldown(seconds):
+    """Tempo restante legível (ex.: 5h 3min, 12min, 40s)"""
+    seconds = int(seconds + 0.999)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours}h {minutes}min"
+    if minutes:
+        return f"{minutes}min"
+    return f"{seconds}s"
+
+# Instância compartilhada pelos comandos de economia
+cooldowns = EconomyCooldowns()
+
+# ================= XP POR MENSAGEM =================
+XP_PER_MESSAGE = (15, 25)           # XP sorteado por mensagem válida
+XP_MESSAGE_INTERVAL_SECONDS = 60    # só uma mensagem por usuário rende XP nesse intervalo
+XP_FLUSH_SECONDS = 30               # intervalo entre gravações em lote
+MAX_LEVEL = 200
+XP_LEVEL_QUERY_CHUNK = 500          # usuários por SELECT ao recalcular os níveis
+
+def _build_level_thresholds():
+    """XP total necessário para cada nível (índice 0 = nível 1)"""
+    thresholds, total = [0], 0
+    for level in range(1, MAX_LEVEL):
+        total += 5 * level * level + 50 * level + 100
+        thresholds.append(total)
+    return tuple(thresholds)
+
+LEVEL_THRESHOLDS = _build_level_thresholds()
+
+def level_for_xp(xp):
+    """Nível correspondente a um total de XP (busca binária na tabela)"""
+    return bisect_right(LEVEL_THRESHOLDS, xp)
+
+class XpAccumulator:
+    """XP ganho por mensagens, somado em memória e gravado em lote
+
+    Cada mensagem só consulta e atualiza dicionários; a cada XP_FLUSH_SECONDS os
+    incrementos vão para users num executemany e os níveis dos usuários
+    afetados são recalculados pela tabela LEVEL_THRESHOLDS na mesma transação.
+    """
+
+    def __init__(self, database=db):
+        self.db = database
+        self._last_award = {}   # user_id -> horário da última mensagem que rendeu XP
+        self._pending = {}      # user_id -> XP ainda não gravado
+        self._channels = {}     # user_id -> canal da última mensagem (aviso de nível)
+
+    def message(self, user_id, channel_id, now=None):
+        """Mensagem de um usuário; retorna o XP ganho (0 dentro do intervalo anti-farm)"""
+        now = time.monotonic() if now is None else now
+        last = self._last_award.get(user_id)
+        if last is not None and now - last < XP_MESSAGE_INTERVAL_SECONDS:
+            return 0
+        self._last_award[user_id] = now
+        amount = random.randint(*XP_PER_MESSAGE)
+        self._pending[user_id] = self._pending.get(user_id, 0) + amount
+        self._channels[user_id] = channel_id
+        return amount
+
+    def pending(self, user_id):
+        """XP ganho e ainda não gravado"""
+        return self._pending.get(user_id, 0)
+
+    async def flush(self):
+        """Grava o XP acumulado; retorna [(user_id, channel_id, nível novo)] de quem subiu de nível"""
+        if not self._pending:
+            return []
+        pending, self._pending = self._pending, {}
+        channels, self._channels = self._channels, {}
+        # Quem não manda mensagem há mais que o intervalo não precisa mais ser lembrado
+        cutoff = time.monotonic() - XP_MESSAGE_INTERVAL_SECONDS
+        self._last_award = {user_id: last for user_id, last in self._last_award.items() if last > cutoff}
+        try:
+            level_ups = await self.db.transaction(_apply_xp, list(pending.items()))
+        except Exception:
+            # Devolve os incrementos para a próxima gravação
+            for user_id, amount in pending.items():
+                self._pending[user_id] = self._pending.get(user_id, 0) + amount
+            for user_id, channel_id in channels.items():
+                self._channels.setdefault(user_id, channel_id)
+            raise
+        return [(user_id, channels.get(user_id), level) for user_id, level in level_ups]
+
+def _apply_xp(conn, increments):
+    """Soma os incrementos de XP e atualiza os níveis; retorna [(user_id, nível novo)] de quem subiu"""
+    conn.executemany("""
+        INSERT INTO users (user_id, xp) VALUES (?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET xp = xp + excluded.xp
+    """, ((user_id, amount) for user_id, amount in increments))
+
+    user_ids = [user_id for user_id, _ in increments]
+    changed, level_ups = [], []
+    for start in range(0, len(user_ids), XP_LEVEL_QUERY_CHUNK):
+        chunk = user_ids[start:start + XP_LEVEL_QUERY_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        for user_id, xp, level in conn.execute(
+            f"SELECT user_id, xp, level FROM users WHERE user_id IN ({placeholders})", chunk
+        ):
+            new_level = level_for_xp(xp)
+            if new_level != level:
+                changed.append((new_level, user_id))
+                # Um nível menor só acontece se a tabela mudar: corrige sem avisar
+                if new_level > level:
+                    level_ups.append((user_id, new_level))
+    conn.executemany("UPDATE users SET level = ? WHERE user_id = ?", changed)
+    return level_ups
+
+# Instância compartilhada pelo on_message
+xp_accumulator = XpAccumulator()
@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+from database import get_db, db
+
+logger = logging.getLogger("bot.settings")
+
+# ================= CONFIGURAÇÕES POR SERVIDOR =================
+# Fonte única: tabela server_configs do config.db. O bot e a API do dashboard
+# leem e gravam somente por aqui, então o cache em memória nunca fica velho.
+
+DEFAULT_PREFIX = '!'
+DEFAULT_FAMILY_COMMAND = 'f'
+
+# Campos com coluna própria em server_configs; o restante do dashboard fica em settings_data
+COLUMN_FIELDS = ('prefix', 'family_command', 'family_prefix')
+
+class GuildSettings:
+    """Configurações de um servidor (instância imutável guardada no cache)"""
+
+    __slots__ = ('guild_id', 'prefix', 'family_command', 'family_prefix', 'sections', 'bare_prefixes')
+
+    def __init__(self, guild_id, prefix=None, family_command=None, family_prefix=None, sections=None):
+        self.guild_id = str(guild_id)
+        self.prefix = prefix or DEFAULT_PREFIX
+        self.family_command = family_command or DEFAULT_FAMILY_COMMAND
+        self.family_prefix = family_prefix or None
+        self.sections = sections or {}
+        # Tabela de correspondência exata: mensagem contendo só um prefixo -> painel
+        # (o prefixo de comandos tem prioridade se os dois forem iguais)
+        self.bare_prefixes = {}
+        if self.family_prefix:
+            self.bare_prefixes[self.family_prefix] = 'family'
+        self.bare_prefixes[self.prefix] = 'prefix'
+
+    def replace(self, fields=None, sections=None):
+        """Retorna uma cópia com os campos e seções informados alterados"""
+        values = {name: getattr(self, name) for name in COLUMN_FIELDS}
+        values.update(fields or {})
+        merged = dict(self.sections)
+        merged.update(sections or {})
+        return GuildSettings(self.guild_id, sections=merged, **values)
+
+    def to_dashboard(self) -> dict:
+        """Formato usado pela API local: seções do dashboard + seção 'prefix'"""
+        config = dict(self.sections)
+        config['prefix'] = {name: getattr(self, name) for name in COLUMN_FIELDS}
+        return config
+
+def split_dashboard_config(config: dict):
+    """Separa um dicionário do dashboard em (campos de coluna, seções livres)"""
+    fields = {}
+    sections = dict(config)
+    prefix_section = sections.pop('prefix', None)
+    if isinstance(prefix_section, dict):
+        fields.update({k: v for k, v in prefix_section.items() if k in COLUMN_FIELDS})
+    elif isinstance(prefix_section, str):
+        # Formato antigo do config_data/<guild>.json
+        fields['prefix'] = prefix_section
+    legacy_family_command = sections.pop('comando_familia', None)
+    if legacy_family_command and 'family_command' not in fields:
+        fields['family_command'] = legacy_family_command
+    return fields, sections
+
+class GuildSettingsService:
+    """Cache write-through das configurações de todos os servidores
+
+    Leituras são uma consulta ao dicionário; toda escrita grava primeiro no banco
+    e só então troca a instância em cache. Escritas do bot e da API (outra thread)
+    passam pelo mesmo lock, então não se sobrescrevem.
+    """
+
+    def __init__(self):
+        self._cache: Dict[str, GuildSettings] = {}
+        self._lock = threading.Lock()
+
+    # ---------- leitura ----------
+    def get(self, guild_id) -> GuildSettings:
+        """Configurações do servidor (padrões se ele nunca foi configurado)"""
+        guild_id = str(guild_id)
+        settings = self._cache.get(guild_id)
+        if settings is None:
+            settings = GuildSettings(guild_id)
+        return settings
+
+    def find(self, guild_id) -> Optional[GuildSettings]:
+        """Configurações salvas do servidor, ou None se ele nunca foi configurado"""
+        return self._cache.get(str(guild_id))
+
+    def get_prefix(self, guild_id) -> str:
+        """Prefixo de comandos do servidor"""
+        return self.get(guild_id).prefix
+
+    def all(self):
+        """Todas as configurações salvas"""
+        return list(self._cache.values())
+
+    # ---------- carga ----------
+    def load_all(self):
+        """Carrega server_configs inteira para o cache (chamar na inicialização)"""
+        rows = get_db().execute(
+            "SELECT guild_id, prefix, family_command, family_prefix, settings_data FROM server_configs"
+        ).fetchall()
+        cache = {}
+        for guild_id, prefix, family_command, family_prefix, settings_data in rows:
+            try:
+                sections = json.loads(settings_data) if settings_data else {}
+            except json.JSONDecodeError as e:
+                logger.error(f"settings_data inválido para o servidor {guild_id}: {e}")
+                sections = {}
+            cache[str(guild_id)] = GuildSettings(guild_id, prefix, family_command, family_prefix, sections)
+        with self._lock:
+            self._cache = cache
+        logger.info(f"⚙️ Configurações de {len(cache)} servidores carregadas")
+
+    def import_legacy_files(self, config_dir):
+        """Importa os arquivos config_data/<guild>.json antigos para o banco
+
+        Só importa seções que o servidor ainda não tem; prefixo e comando de
+        família continuam valendo o que já está em server_configs.
+        """
+        if not os.path.isdir(config_dir):
+            return
+        for filename in os.listdir(config_dir):
+            if not filename.endswith('.json'):
+                continue
+            guild_id = filename[:-5]
+            try:
+                with open(os.path.join(config_dir, filename), 'r', encoding='utf-8') as f:
+                    fields, sections = split_dashboard_config(json.load(f))
+                current = self._cache.get(guild_id)
+                if current is not None:
+                    fields = {}
+                    sections = {k: v for k, v in sections.items() if k not in current.sections}
+                if fields or sections:
+                    self.update_sync(guild_id, fields, sections)
+            except Exception as e:
+                logger.error(f"Erro ao importar {filename}: {e}")
+
+    # ---------- escrita ----------
+    def _write(self, conn, guild_id, fields=None, sections=None):
+        """Grava no banco e atualiza o cache (roda fora do event loop)"""
+        guild_id = str(guild_id)
+        with self._lock:
+            settings = self.get(guild_id).replace(fields, sections)
+            with conn:
+                conn.execute("""
+                    INSERT INTO server_configs (guild_id, prefix, family_command, family_prefix, settings_data, updated_at)
+                    VALUES (?, ?, ?, ?, ?, datetime('now'))
+                    ON CONFLICT(guild_id) DO UPDATE SET
+                        prefix = excluded.prefix,
+                        family_command = excluded.family_command,
+                        family_prefix = excluded.family_prefix,
+                        settings_data = excluded.settings_data,
+                        updated_at = excluded.updated_at
+                """, (
+                    guild_id, settings.prefix, settings.family_command, settings.family_prefix,
+                    json.dumps(settings.sections, ensure_ascii=False),
+                ))
+            self._cache[guild_id] = settings
+        return settings
+
+    def update_sync(self, guild_id, fields: Optional[dict] = None, sections: Optional[dict] = None) -> GuildSettings:
+        """Altera configurações a partir de uma thread comum (API do dashboard, inicialização)"""
+        return self._write(get_db(), guild_id, fields, sections)
+
+    async def update(self, guild_id, fields: Optional[dict] = None, sections: Optional[dict] = None) -> GuildSettings:
+        """Altera configurações a partir do event loop do bot"""
+        return await db.run(self._write, guild_id, fields, sections)
+
+    def save_dashboard_config(self, guild_id, config: dict) -> GuildSettings:
+        """Aplica um dicionário no formato do dashboard (seção 'prefix' vira coluna)"""
+        fields, sections = split_dashboard_config(config)
+        return self.update_sync(guild_id, fields, sections)
+
+# Instância compartilhada pelo bot e pela API local
+guild_settings = GuildSettingsService()
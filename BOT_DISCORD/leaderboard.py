@@ -0,0 +1,80 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+
+# ================= RANKING DE DINHEIRO =================
+# O total (money + bank) de cada usuário com saldo positivo fica numa lista
+# ordenada em memória: a posição de um total é uma busca binária, sem COUNT(*)
+# nem ordenar a tabela. A página do topo vem do índice idx_users_wealth (LIMIT
+# direto no índice) e fica num cache curto, descartado quando um saldo muda o
+# topo. A economia informa cada mudança de saldo (ver economy.py).
+
+LEADERBOARD_TOP_SIZE = 10
+LEADERBOARD_CACHE_SECONDS = 30
+
+class MoneyLeaderboard:
+    """Posições no ranking de dinheiro total (carteira + banco)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = []        # totais positivos, em ordem crescente
+        self._top = None         # (expira em, linhas do topo)
+
+    def load(self, conn):
+        """Monta a lista a partir de users (executa na thread do banco)"""
+        totals = [
+            row[0] for row in conn.execute(
+                "SELECT money + bank FROM users WHERE money + bank > 0 ORDER BY money + bank"
+            )
+        ]
+        with self._lock:
+            self._totals = totals
+            self._top = None
+
+    def changed(self, old_total, new_total):
+        """Um saldo passou de old_total para new_total"""
+        if old_total == new_total:
+            return
+        with self._lock:
+            if old_total > 0:
+                index = bisect_left(self._totals, old_total)
+                if index < len(self._totals) and self._totals[index] == old_total:
+                    del self._totals[index]
+            if new_total > 0:
+                insort(self._totals, new_total)
+            # O topo em cache só muda se algum dos totais chega nele
+            if self._top is not None:
+                floor = self._top[1][-1]["total"] if len(self._top[1]) >= LEADERBOARD_TOP_SIZE else 0
+                if max(old_total, new_total) >= floor:
+                    self._top = None
+
+    def rank(self, total):
+        """Posição de quem tem `total` (empates dividem a posição) e o número de usuários no ranking"""
+        with self._lock:
+            count = len(self._totals)
+            return count - bisect_right(self._totals, total) + 1, count
+
+    def cached_top(self):
+        """Linhas do topo ainda válidas no cache, ou None"""
+        cached = self._top
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        return None
+
+    def load_top(self, conn):
+        """Busca as linhas do topo {user_id, money, bank, total} e guarda no cache (executa na thread do banco)"""
+        rows = [
+            {"user_id": row[0], "money": row[1], "bank": row[2], "total": row[3]}
+            for row in conn.execute("""
+                SELECT user_id, money, bank, money + bank FROM users
+                WHERE money + bank > 0
+                ORDER BY money + bank DESC, user_id
+                LIMIT ?
+            """, (LEADERBOARD_TOP_SIZE,))
+        ]
+        with self._lock:
+            self._top = (time.monotonic() + LEADERBOARD_CACHE_SECONDS, rows)
+        return rows
+
+# Instância compartilhada pela economia e pelos comandos
+leaderboard = MoneyLeaderboard()
@@ -1,43 +1,33 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import json
 import os
 from threading import Thread
 import logging
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+from guild_settings import guild_settings
+from bot_logging import setup_logging
+from metrics import metrics, KINDS
+from database import get_db
+from transcript_archive import search_transcripts
+from ticket_analytics import ticket_analytics
+
+# Logger da API (handlers configurados por bot_logging.setup_logging)
+logger = logging.getLogger("api")
 
 app = Flask(__name__)
 CORS(app)  # Permitir requisições do frontend
 
-# Diretório para armazenar configurações
+# Diretório dos arquivos JSON antigos (importados para o banco na inicialização do bot)
 CONFIG_DIR = "config_data"
-if not os.path.exists(CONFIG_DIR):
-    os.makedirs(CONFIG_DIR)
-
-def get_config_file_path(guild_id: str) -> str:
-    """Retorna o caminho do arquivo de configuração para um servidor"""
-    return os.path.join(CONFIG_DIR, f"{guild_id}.json")
 
 def load_guild_config(guild_id: str) -> dict:
-    """Carrega a configuração de um servidor"""
-    config_file = get_config_file_path(guild_id)
-    if os.path.exists(config_file):
-        try:
-            with open(config_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Erro ao carregar config do servidor {guild_id}: {e}")
-    return {}
+    """Carrega a configuração de um servidor (cache de guild_settings)"""
+    return guild_settings.get(guild_id).to_dashboard()
 
 def save_guild_config(guild_id: str, config: dict) -> bool:
-    """Salva a configuração de um servidor"""
-    config_file = get_config_file_path(guild_id)
+    """Salva a configuração de um servidor em server_configs"""
     try:
-        with open(config_file, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=2, ensure_ascii=False)
+        guild_settings.save_dashboard_config(guild_id, config)
         logger.info(f"✅ Configuração salva para servidor {guild_id}")
         return True
     except Exception as e:
@@ -109,14 +99,8 @@ def save_config(guild_id: str):
                 'error': 'Seção e configuração são obrigatórias'
             }), 400
         
-        # Carregar configuração existente
-        current_config = load_guild_config(guild_id)
-        
-        # Atualizar a seção específica
-        current_config[section] = new_config
-        
-        # Salvar configuração atualizada
-        if save_guild_config(guild_id, current_config):
+        # Atualizar somente a seção específica
+        if save_guild_config(guild_id, {section: new_config}):
             logger.info(f"📝 Configuração atualizada: {guild_id}/{section}")
             return jsonify({
                 'success': True,
@@ -142,16 +126,13 @@ def list_guilds():
     """Lista todos os servidores configurados"""
     try:
         guilds = []
-        if os.path.exists(CONFIG_DIR):
-            for filename in os.listdir(CONFIG_DIR):
-                if filename.endswith('.json'):
-                    guild_id = filename[:-5]  # Remove .json
-                    config = load_guild_config(guild_id)
-                    guilds.append({
-                        'id': guild_id,
-                        'name': config.get('guild_name', f'Servidor {guild_id}'),
-                        'config_sections': list(config.keys())
-                    })
+        for settings in guild_settings.all():
+            config = settings.to_dashboard()
+            guilds.append({
+                'id': settings.guild_id,
+                'name': config.get('guild_name', f'Servidor {settings.guild_id}'),
+                'config_sections': list(config.keys())
+            })
         
         return jsonify({
             'success': True,
@@ -310,6 +291,68 @@ def get_guild_logs(guild_id: str):
             'error': str(e)
         }), 500
 
+@app.route('/api/guilds/<guild_id>/transcripts', methods=['GET'])
+def get_guild_transcripts(guild_id: str):
+    """Busca paginada nas transcrições arquivadas dos tickets de um servidor"""
+    try:
+        result = search_transcripts(
+            get_db(), guild_id,
+            query=request.args.get('q'),
+            page=request.args.get('page', 1, type=int),
+            per_page=request.args.get('per_page', type=int),
+            opener_id=request.args.get('user_id'),
+            ticket_type=request.args.get('type'),
+        )
+        return jsonify({
+            'success': True,
+            **result
+        })
+    except Exception as e:
+        logger.error(f"Erro ao buscar transcrições do servidor {guild_id}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/guilds/<guild_id>/tickets/stats', methods=['GET'])
+def get_guild_ticket_stats(guild_id: str):
+    """Estatísticas de tickets do servidor: abertos, criações por hora, tempo até a primeira resposta e até o fechamento"""
+    try:
+        return jsonify({
+            'success': True,
+            'stats': ticket_analytics.guild_summary(guild_id, request.args.get('hours', 24, type=int))
+        })
+    except Exception as e:
+        logger.error(f"Erro ao buscar estatísticas de tickets do servidor {guild_id}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Latência p50/p95/p99 e número de chamadas por comando, evento e consulta ao banco"""
+    try:
+        kind = request.args.get('kind')
+        if kind is not None and kind not in KINDS:
+            return jsonify({
+                'success': False,
+                'error': f"Tipo inválido. Use: {', '.join(KINDS)}"
+            }), 400
+        limit = request.args.get('limit', type=int)
+        
+        return jsonify({
+            'success': True,
+            'since': metrics.started_at,
+            'metrics': metrics.snapshot(kind, limit=limit)
+        })
+    except Exception as e:
+        logger.error(f"Erro ao buscar métricas: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/bot/sync-guilds', methods=['POST'])
 def sync_guilds():
     """Endpoint para receber sincronização de servidores do bot"""
@@ -338,10 +381,8 @@ def sync_guilds():
                     'bot_present': guild.get('bot_present', True)
                 }
                 
-                # Carregar configuração existente e atualizar
-                existing_config = load_guild_config(guild_id)
-                existing_config.update(guild_config)
-                save_guild_config(guild_id, existing_config)
+                # Atualizar somente os dados básicos na configuração existente
+                save_guild_config(guild_id, guild_config)
         
         return jsonify({
             'success': True,
@@ -372,4 +413,6 @@ def run_api_in_background():
     return api_thread
 
 if __name__ == '__main__':
+    setup_logging()
+    guild_settings.load_all()
     start_api_server()
\ No newline at end of file
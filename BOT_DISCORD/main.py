@@ -4,30 +4,50 @@ from discord.ext import commands, tasks
 from discord.ui import Button, View, Modal, TextInput, Select
 import os
 import sys
-import sqlite3
 import asyncio
 import random
 import logging
 import time
 from datetime import timedelta, datetime, timezone
 from discord.ext.commands import BucketType, cooldown
-from pathlib import Path
 from dotenv import load_dotenv
 import collections
+import copy
+import heapq
 import json
-from typing import Optional, Dict, Any
+from typing import Optional, Dict
 
 # Comentado temporariamente para resolver problemas de compilação no SquareCloud
 # import aiohttp
 # import aiohttp_cors
 # from aiohttp import web
 # import threading
-from local_api import run_api_in_background
 
-
-# Load environment variables
+# Variáveis do .env antes dos módulos do bot: o logging (LOG_LEVEL/LOG_LEVELS) e o banco as leem
 load_dotenv()
 
+from local_api import run_api_in_background, CONFIG_DIR
+from database import CONFIG_DB_PATH, get_db, db, parse_utc_datetime, parse_utc_timestamp
+from migrations import run_migrations
+from guild_settings import guild_settings, DEFAULT_PREFIX
+from bot_logging import setup_logging
+from metrics import metrics
+from ticket_backups import BACKUP_DIR, BACKUP_SUFFIX, write_backup, shutdown_backup_writer
+from transcript_archive import index_transcript, import_backup_directory, load_transcript, search_transcripts
+from ticket_analytics import ticket_analytics
+from economy import economy, cooldowns, format_cooldown, xp_accumulator, XP_FLUSH_SECONDS
+from leaderboard import leaderboard, LEADERBOARD_TOP_SIZE
+
+# Logging com fila (não bloqueia o event loop) e nível por subsistema (ver bot_logging.py)
+setup_logging()
+logger = logging.getLogger("bot")
+sync_logger = logging.getLogger("bot.sync")
+db_logger = logging.getLogger("bot.db")
+tickets_logger = logging.getLogger("bot.tickets")
+commands_logger = logging.getLogger("bot.commands")
+events_logger = logging.getLogger("bot.events")
+messages_logger = logging.getLogger("bot.messages")
+
 # ================= CONFIGURAÇÕES DO SISTEMA DE TICKETS =================
 # Configurações padrão para o sistema de tickets
 STAFF_ROLE_NAMES = [
@@ -92,12 +112,16 @@ TICKET_DEFAULTS = {
     "settings": {
         "auto_close_hours": 48,
         "rate_limit_hours": 24,
+        "tickets_per_window": 1,
         "max_tickets_per_user": 3,
         "require_reason": True,
         "backup_enabled": True
     }
 }
 
+# Servidores com configuração de tickets decodificada em memória (os menos usados saem primeiro)
+TICKET_CONFIG_CACHE_SIZE = 256
+
 # ================= CONFIGURAÇÕES =================
 # URL do backend Node.js
 # Detectar se está rodando no SquareCloud
@@ -105,10 +129,10 @@ IS_SQUARECLOUD = os.getenv('SQUARECLOUD', 'false').lower() == 'true'
 if IS_SQUARECLOUD:
     # No SquareCloud, desabilitar sincronização com backend local
     BACKEND_URL = None
-    print("🔧 Executando no SquareCloud - Sincronização com backend local desabilitada")
+    logger.info("🔧 Executando no SquareCloud - Sincronização com backend local desabilitada")
 else:
     BACKEND_URL = os.getenv('BACKEND_URL', 'http://localhost:3002')
-    print(f"🔧 Executando localmente - Backend URL: {BACKEND_URL}")
+    logger.info(f"🔧 Executando localmente - Backend URL: {BACKEND_URL}")
 intents = discord.Intents.default()
 intents.members = True
 intents.message_content = True
@@ -116,40 +140,36 @@ intents.presences = True
 intents.voice_states = True
 
 # Função para obter o prefixo personalizado de cada servidor
+# (servido do cache de guild_settings, sem consultar o banco)
 async def get_prefix(bot, message):
     if message.guild is None:
-        return '!'  # Prefixo padrão para DMs
-    
-    try:
-        # Conectar ao banco de dados principal (mesmo que o dashboard usa)
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Buscar o prefixo personalizado do servidor na tabela server_configs
-        cursor.execute("SELECT prefix FROM server_configs WHERE guild_id = ?", (str(message.guild.id),))
-        result = cursor.fetchone()
-        
-        conn.close()
-        
-        if result and result[0]:
-            prefix = result[0]
-            print(f"🔍 Prefixo encontrado para servidor {message.guild.id}: '{prefix}'")
-            return prefix
-        else:
-            print(f"⚠️ Nenhum prefixo encontrado para servidor {message.guild.id}, usando padrão '!'")
-            return '!'  # Prefixo padrão
-    except Exception as e:
-        print(f"❌ Erro ao carregar prefixo: {e}")
-        return '!'  # Prefixo padrão em caso de erro
+        return DEFAULT_PREFIX  # Prefixo padrão para DMs
+    return guild_settings.get_prefix(message.guild.id)
 
 bot = commands.Bot(command_prefix=get_prefix, intents=intents, help_command=None)
 
+# ================= MÉTRICAS =================
+# Tempo de cada comando (ganchos before/after invoke) e de cada handler de evento
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.metrics_started_at = time.perf_counter()
+
+@bot.after_invoke
+async def record_command_time(ctx):
+    started = getattr(ctx, "metrics_started_at", None)
+    if started is not None:
+        metrics.observe("command", ctx.command.qualified_name, time.perf_counter() - started)
+
+def timed_event(coro):
+    """Registra um handler de evento do gateway no bot medindo cada execução"""
+    return bot.event(metrics.timed("event")(coro))
+
 # ================= SINCRONIZAÇÃO COM BACKEND =================
 async def sync_guilds_with_backend():
     """Sincroniza dados dos servidores com o backend Node.js"""
     # Verificar se a sincronização com backend está habilitada
     if BACKEND_URL is None:
-        print("ℹ️ Sincronização com backend desabilitada (executando no SquareCloud)")
+        sync_logger.info("ℹ️ Sincronização com backend desabilitada (executando no SquareCloud)")
         return
     
     try:
@@ -160,11 +180,10 @@ async def sync_guilds_with_backend():
                 icon_key = guild.icon.key if guild.icon else None
                 icon_animated = guild.icon.is_animated() if guild.icon else False
                 
-                print(f"🏰 Processando servidor: {guild.name}")
-                print(f"   - ID: {guild.id}")
-                print(f"   - Ícone key: {icon_key}")
-                print(f"   - Ícone animado: {icon_animated}")
-                print(f"   - Membros: {guild.member_count}")
+                sync_logger.debug(
+                    "🏰 Processando servidor: %s", guild.name,
+                    extra={"guild_id": guild.id, "icon": icon_key, "animated": icon_animated, "members": guild.member_count}
+                )
                 
                 guild_data = {
                     'guild_id': str(guild.id),
@@ -180,7 +199,7 @@ async def sync_guilds_with_backend():
                 }
                 guilds_data.append(guild_data)
             except Exception as e:
-                print(f"❌ Erro ao processar servidor {guild.name}: {e}")
+                sync_logger.error(f"❌ Erro ao processar servidor {guild.name}: {e}")
                 continue
         
         # Tentar sincronizar com o backend apenas se BACKEND_URL estiver definido
@@ -195,20 +214,20 @@ async def sync_guilds_with_backend():
                             headers={'Content-Type': 'application/json'}
                         ) as response:
                             if response.status == 200:
-                                print(f"✅ Sincronização concluída: {len(guilds_data)} servidores enviados")
+                                sync_logger.info(f"✅ Sincronização concluída: {len(guilds_data)} servidores enviados")
                             else:
-                                print(f"❌ Erro na sincronização: {response.status}")
+                                sync_logger.error(f"❌ Erro na sincronização: {response.status}")
                                 text = await response.text()
-                                print(f"Resposta: {text}")
+                                sync_logger.error(f"Resposta: {text}")
                     except Exception as e:
-                        print(f"❌ Erro ao conectar com backend: {e}")
+                        sync_logger.error(f"❌ Erro ao conectar com backend: {e}")
             except ImportError:
-                print(f"✅ Dados de {len(guilds_data)} servidores preparados (aiohttp não disponível - modo offline)")
+                sync_logger.info(f"✅ Dados de {len(guilds_data)} servidores preparados (aiohttp não disponível - modo offline)")
         else:
-            print(f"✅ Dados de {len(guilds_data)} servidores preparados (sincronização com backend desabilitada)")
+            sync_logger.info(f"✅ Dados de {len(guilds_data)} servidores preparados (sincronização com backend desabilitada)")
                 
     except Exception as e:
-        print(f"❌ Erro na sincronização: {e}")
+        sync_logger.error(f"❌ Erro na sincronização: {e}")
 
 # ================= FUNÇÕES DE SINCRONIZAÇÃO EM TEMPO REAL =================
 
@@ -245,7 +264,7 @@ async def sync_guilds_with_backend():
 
 async def sync_role_with_backend(guild_id, action, role):
     """Sincronização temporariamente desabilitada"""
-    print(f"📝 Cargo {role.name} ({action}) - sincronização desabilitada")
+    sync_logger.debug("📝 Cargo %s (%s) - sincronização desabilitada", role.name, action, extra={"guild_id": guild_id})
     pass
 
 # async def sync_member_with_backend(guild_id, action, member):
@@ -285,7 +304,7 @@ async def sync_role_with_backend(guild_id, action, role):
 
 async def sync_member_with_backend(guild_id, action, member):
     """Sincronização temporariamente desabilitada"""
-    print(f"📝 Membro {member.display_name} ({action}) - sincronização desabilitada")
+    sync_logger.debug("📝 Membro %s (%s) - sincronização desabilitada", member.display_name, action, extra={"guild_id": guild_id})
     pass
 
 # async def sync_channel_with_backend(guild_id, action, channel):
@@ -338,7 +357,7 @@ async def sync_member_with_backend(guild_id, action, member):
 
 async def sync_channel_with_backend(guild_id, action, channel):
     """Sincronização temporariamente desabilitada"""
-    print(f"📝 Canal {channel.name} ({action}) - sincronização desabilitada")
+    sync_logger.debug("📝 Canal %s (%s) - sincronização desabilitada", channel.name, action, extra={"guild_id": guild_id})
     pass
 
 # ================= SISTEMA ANTI-DUPLICAÇÃO =================
@@ -376,235 +395,201 @@ async def check_mod(ctx):
     ]
 
 # ================= BANCO DE DADOS =================
-DB_PATH = Path(__file__).parent / "config.db"
-CONFIG_DB_PATH = Path(__file__).parent / "perm_config.db"
-
-def get_db():
-    """Retorna conexão com banco de dados"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA foreign_keys = ON")
-        return conn
-    except sqlite3.Error as e:
-        print(f"Erro ao conectar ao banco: {e}")
-        raise
+# DB_PATH, CONFIG_DB_PATH, get_db() e o acesso assíncrono (db) ficam em database.py;
+# o schema de config.db é definido pelas migrações versionadas de migrations.py
 
 def init_db():
-    """Inicializa banco de dados"""
+    """Inicializa banco de dados (aplica as migrações pendentes de migrations.py)"""
     try:
-        conn = get_db()
-        
-        # Tabela de usuários
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY,
-            money INTEGER DEFAULT 0,
-            bank INTEGER DEFAULT 0,
-            rep INTEGER DEFAULT 0,
-            xp INTEGER DEFAULT 0,
-            level INTEGER DEFAULT 1,
-            last_daily TEXT,
-            last_rep TEXT,
-            last_work TEXT,
-            about_me TEXT,
-            vip INTEGER DEFAULT 0,
-            vip_level INTEGER DEFAULT 0,
-            family_id INTEGER,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-        
-        # Tabela de famílias
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS families (
-            family_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL,
-            leader_id INTEGER NOT NULL,
-            description TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            member_count INTEGER DEFAULT 1
-        )
-        """)
-        
-        # Tabela de advertências
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS warns (
-            warn_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            moderator_id INTEGER NOT NULL,
-            reason TEXT NOT NULL,
-            timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
-            server_id INTEGER NOT NULL,
-            active INTEGER DEFAULT 1
-        )
-        """)
-        
-        # Tabela de staff
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS staff (
-            user_id INTEGER PRIMARY KEY,
-            role TEXT NOT NULL,
-            permissions TEXT,
-            join_date TEXT DEFAULT CURRENT_TIMESTAMP,
-            server_id INTEGER NOT NULL,
-            points INTEGER DEFAULT 0
-        )
-        """)
-        
-        # Tabela de primeira dama
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS primeira_dama (
-            server_id INTEGER NOT NULL,
-            user_id INTEGER NOT NULL,
-            cargo_name TEXT DEFAULT 'Primeira Dama',
-            data_indicacao TEXT DEFAULT CURRENT_TIMESTAMP,
-            active INTEGER DEFAULT 1,
-            PRIMARY KEY (server_id, user_id)
-        )
-        """)
-        
-        # Tabela de trabalhos
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS jobs (
-            job_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            emoji TEXT,
-            min_pay INTEGER NOT NULL,
-            max_pay INTEGER NOT NULL,
-            description TEXT,
-            cooldown INTEGER DEFAULT 3600,
-            required_level INTEGER DEFAULT 1
-        )
-        """)
-        
-        # Tabela de configurações de servidor (para prefixos personalizados)
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS server_configs (
-            guild_id TEXT PRIMARY KEY,
-            prefix TEXT DEFAULT '!',
-            family_command TEXT DEFAULT 'f',
-            family_prefix TEXT DEFAULT NULL,
-            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-        
-        # ================= TABELAS DO SISTEMA DE TICKETS =================
-        # Tabela de configurações de tickets por servidor
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS ticket_configs (
-            guild_id TEXT PRIMARY KEY,
-            config_data TEXT NOT NULL,
-            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-        
-        # Tabela de tickets ativos
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS active_tickets (
-            channel_id TEXT PRIMARY KEY,
-            guild_id TEXT NOT NULL,
-            user_id TEXT NOT NULL,
-            ticket_type TEXT NOT NULL,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            voice_channel_id TEXT,
-            priority TEXT DEFAULT 'normal',
-            staff_assigned TEXT
-        )
-        """)
-        
-        # Tabela de logs de tickets
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS ticket_logs (
-            log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            guild_id TEXT NOT NULL,
-            channel_id TEXT NOT NULL,
-            user_id TEXT NOT NULL,
-            action TEXT NOT NULL,
-            details TEXT,
-            timestamp TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-        
-        # Tabela de controle de rate limit de tickets por usuário
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS user_tickets (
-            user_id TEXT NOT NULL,
-            guild_id TEXT NOT NULL,
-            last_ticket TEXT DEFAULT CURRENT_TIMESTAMP,
-            ticket_count INTEGER DEFAULT 0,
-            PRIMARY KEY (user_id, guild_id)
-        )
-        """)
-        
-        conn.commit()
-        conn.close()
-        print("✅ Banco de dados inicializado!")
+        applied = run_migrations(get_db())
+        if applied:
+            db_logger.info(f"🗄️ Migrações aplicadas: {', '.join(map(str, applied))}")
+        db_logger.info("✅ Banco de dados inicializado!")
         
     except Exception as e:
-        print(f"❌ Erro ao inicializar banco: {e}")
+        db_logger.error(f"❌ Erro ao inicializar banco: {e}")
 
 def init_perm_db():
     """Inicializa banco de permissões"""
     try:
-        conn = sqlite3.connect(CONFIG_DB_PATH)
+        conn = get_db(CONFIG_DB_PATH)
+        # O prefixo não fica aqui: a fonte única é server_configs (config.db), via guild_settings
         conn.execute("""
         CREATE TABLE IF NOT EXISTS server_config (
             server_id INTEGER PRIMARY KEY,
             admin_role_id INTEGER DEFAULT NULL,
             mod_role_id INTEGER DEFAULT NULL,
             dono_bot_role_id INTEGER DEFAULT NULL,
-            pd_role_id INTEGER DEFAULT NULL,
-            prefix TEXT DEFAULT '!'
+            pd_role_id INTEGER DEFAULT NULL
         )
         """)
         conn.commit()
-        conn.close()
-        print("✅ Banco de permissões inicializado!")
+        db_logger.info("✅ Banco de permissões inicializado!")
     except Exception as e:
-        print(f"❌ Erro ao inicializar permissões: {e}")
+        db_logger.error(f"❌ Erro ao inicializar permissões: {e}")
 
 # ================= SISTEMA DE TICKETS - CLASSES E FUNÇÕES =================
+class StaffRoleIndex:
+    """IDs dos cargos de staff de cada servidor (nome contendo um de STAFF_ROLE_NAMES)
+
+    Montado uma vez por servidor e mantido pelos eventos de cargo, então as
+    verificações de staff e as permissões dos tickets não percorrem guild.roles.
+    """
+    
+    def __init__(self, staff_names=STAFF_ROLE_NAMES):
+        self._names = tuple(name.lower() for name in staff_names)
+        self._roles: Dict[int, set] = {}
+    
+    def is_staff_name(self, role_name):
+        role_name = role_name.lower()
+        return any(name in role_name for name in self._names)
+    
+    def build(self, guild):
+        """(Re)monta o índice de um servidor a partir dos cargos atuais"""
+        role_ids = {role.id for role in guild.roles if self.is_staff_name(role.name)}
+        self._roles[guild.id] = role_ids
+        return role_ids
+    
+    def build_all(self, guilds):
+        for guild in guilds:
+            self.build(guild)
+    
+    def forget(self, guild_id):
+        self._roles.pop(guild_id, None)
+    
+    def role_ids(self, guild):
+        """Conjunto de IDs dos cargos de staff do servidor"""
+        role_ids = self._roles.get(guild.id)
+        if role_ids is None:
+            role_ids = self.build(guild)
+        return role_ids
+    
+    def roles(self, guild):
+        """Objetos Role dos cargos de staff (para montar permissões de canais)"""
+        return [role for role in map(guild.get_role, self.role_ids(guild)) if role is not None]
+    
+    def is_staff(self, member):
+        """Se o membro tem algum cargo de staff"""
+        role_ids = self.role_ids(member.guild)
+        return any(role.id in role_ids for role in getattr(member, "roles", ()))
+    
+    # ---------- eventos de cargo ----------
+    def role_saved(self, role):
+        """Cargo criado ou atualizado (o nome pode ter deixado de ser de staff)"""
+        role_ids = self.role_ids(role.guild)
+        if self.is_staff_name(role.name):
+            role_ids.add(role.id)
+        else:
+            role_ids.discard(role.id)
+    
+    def role_deleted(self, role):
+        self.role_ids(role.guild).discard(role.id)
+
+staff_roles = StaffRoleIndex()
+
+class TicketConfigCache:
+    """Configurações de ticket já decodificadas, por servidor, com versão e despejo LRU
+
+    Cada servidor tem um número de versão que save_config troca por um novo (de um
+    contador único, sempre crescente). Uma carga do banco só entra no cache se a
+    versão não mudou enquanto ela estava em andamento, então uma leitura lenta nunca
+    sobrescreve uma configuração recém-salva. O despejo LRU leva junto a versão do
+    servidor; servidores sem versão guardada ficam no piso, que sobe até a versão
+    de cada servidor despejado (assim uma carga antiga não volta a valer).
+    Os dicionários em cache são tratados como imutáveis (set_field copia antes de alterar).
+    """
+    
+    def __init__(self, max_guilds=TICKET_CONFIG_CACHE_SIZE):
+        self.max_guilds = max_guilds
+        self._entries = collections.OrderedDict()  # guild_id -> (versão, config)
+        self._versions = {}
+        self._clock = 0   # última versão emitida
+        self._floor = 0   # versão dos servidores sem entrada em _versions
+    
+    def version(self, guild_id):
+        return self._versions.get(guild_id, self._floor)
+    
+    def get(self, guild_id):
+        """Config em cache se ainda estiver na versão atual (ou None)"""
+        entry = self._entries.get(guild_id)
+        if entry is None:
+            return None
+        if entry[0] != self.version(guild_id):
+            del self._entries[guild_id]
+            return None
+        self._entries.move_to_end(guild_id)
+        return entry[1]
+    
+    def put(self, guild_id, version, config):
+        """Guarda a config lida na versão informada (ignorada se já ficou velha)"""
+        if version != self.version(guild_id):
+            return
+        self._versions[guild_id] = version
+        self._entries[guild_id] = (version, config)
+        self._entries.move_to_end(guild_id)
+        while len(self._entries) > self.max_guilds:
+            evicted_id, (evicted_version, _) = self._entries.popitem(last=False)
+            self._versions.pop(evicted_id, None)
+            self._floor = max(self._floor, evicted_version)
+    
+    def bump(self, guild_id):
+        """Nova versão da config do servidor; as entradas anteriores deixam de valer"""
+        self._clock += 1
+        version = self._versions[guild_id] = self._clock
+        self._entries.pop(guild_id, None)
+        return version
+    
+    def invalidate(self, guild_id):
+        self.bump(str(guild_id))
+
+ticket_config_cache = TicketConfigCache()
+
 class TicketConfig:
     """Classe para gerenciar configurações de tickets por servidor"""
     
-    def __init__(self, guild_id):
+    def __init__(self, guild_id, config=None):
         self.guild_id = str(guild_id)
-        self.config = self._load_config()
+        self.config = config if config is not None else TICKET_DEFAULTS
     
-    def _load_config(self):
-        """Carrega configuração do banco de dados"""
+    @classmethod
+    async def load(cls, guild_id):
+        """Carrega a configuração (do cache em memória; do banco só na primeira vez)"""
+        guild_id = str(guild_id)
+        config = ticket_config_cache.get(guild_id)
+        if config is not None:
+            return cls(guild_id, config)
+        
+        version = ticket_config_cache.version(guild_id)
         try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("SELECT config_data FROM ticket_configs WHERE guild_id = ?", (self.guild_id,))
-            result = cursor.fetchone()
-            conn.close()
-            
-            if result:
-                return json.loads(result[0])
-            else:
-                # Usar configuração padrão
-                return TICKET_DEFAULTS.copy()
+            config_data = await db.fetchval(
+                "SELECT config_data FROM ticket_configs WHERE guild_id = ?", (guild_id,)
+            )
+            # Usar configuração padrão se o servidor nunca salvou a sua
+            config = json.loads(config_data) if config_data else TICKET_DEFAULTS
         except Exception as e:
-            print(f"Erro ao carregar config de tickets: {e}")
-            return TICKET_DEFAULTS.copy()
+            tickets_logger.error(f"Erro ao carregar config de tickets: {e}")
+            return cls(guild_id)
+        ticket_config_cache.put(guild_id, version, config)
+        return cls(guild_id, config)
     
-    def save_config(self):
+    async def save_config(self):
         """Salva configuração no banco de dados"""
         try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("""
+            await db.execute("""
                 INSERT OR REPLACE INTO ticket_configs (guild_id, config_data, updated_at)
                 VALUES (?, ?, datetime('now'))
             """, (self.guild_id, json.dumps(self.config)))
-            conn.commit()
-            conn.close()
-            return True
         except Exception as e:
-            print(f"Erro ao salvar config de tickets: {e}")
+            tickets_logger.error(f"Erro ao salvar config de tickets: {e}")
+            ticket_config_cache.invalidate(self.guild_id)
             return False
+        version = ticket_config_cache.bump(self.guild_id)
+        ticket_config_cache.put(self.guild_id, version, self.config)
+        # auto_close_hours pode ter mudado
+        auto_close_scheduler.reschedule_guild(
+            self.guild_id, self.get_field(["settings", "auto_close_hours"]) or 48
+        )
+        return True
     
     def get_field(self, path):
         """Obtém um campo específico da configuração usando path (lista)"""
@@ -616,94 +601,320 @@ class TicketConfig:
                 return None
         return current
     
-    def set_field(self, path, value):
+    async def set_field(self, path, value):
         """Define um campo específico da configuração usando path (lista)"""
+        # Cópia: o dicionário atual pode ser o mesmo que está no cache
+        self.config = copy.deepcopy(self.config)
         current = self.config
         for key in path[:-1]:
             if key not in current:
                 current[key] = {}
             current = current[key]
         current[path[-1]] = value
-        return self.save_config()
+        return await self.save_config()
 
-async def log_ticket_action(guild_id, channel_id, user_id, action, details=None):
-    """Registra uma ação de ticket no log"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO ticket_logs (guild_id, channel_id, user_id, action, details)
-            VALUES (?, ?, ?, ?, ?)
-        """, (str(guild_id), str(channel_id), str(user_id), action, details))
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Erro ao registrar log de ticket: {e}")
+# ================= LOG DE AÇÕES DOS TICKETS =================
+TICKET_LOG_FLUSH_SECONDS = 2    # intervalo máximo entre gravações do ticket_logs
+TICKET_LOG_BATCH_SIZE = 100     # ações na fila que disparam uma gravação antes do intervalo
 
-async def check_rate_limit(user_id, guild_id):
-    """Verifica se o usuário pode criar um novo ticket"""
-    try:
-        config = TicketConfig(guild_id)
-        rate_limit_hours = config.get_field(["settings", "rate_limit_hours"]) or 24
-        max_tickets = config.get_field(["settings", "max_tickets_per_user"]) or 3
-        
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+class TicketLogQueue:
+    """Fila em memória das ações de tickets, gravada em lote (executemany) no ticket_logs
+
+    put() só acrescenta uma tupla à lista; a gravação acontece no loop periódico,
+    quando a fila chega a TICKET_LOG_BATCH_SIZE e no desligamento. O horário é o
+    do registro da ação, não o da gravação.
+    """
+    
+    def __init__(self, batch_size=TICKET_LOG_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._pending = []
+        self._flush_task = None
+    
+    def __len__(self):
+        return len(self._pending)
+    
+    def put(self, guild_id, channel_id, user_id, action, details=None):
+        """Enfileira uma ação (não espera pelo banco)"""
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        self._pending.append((str(guild_id), str(channel_id), str(user_id), action, details, timestamp))
+        if len(self._pending) >= self.batch_size and (self._flush_task is None or self._flush_task.done()):
+            try:
+                self._flush_task = asyncio.get_running_loop().create_task(self._flush_logged())
+            except RuntimeError:
+                pass  # fora do event loop: fica para o próximo flush
+    
+    async def flush(self):
+        """Grava as ações pendentes numa transação e retorna quantas foram gravadas"""
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, []
+        try:
+            await db.executemany("""
+                INSERT INTO ticket_logs (guild_id, channel_id, user_id, action, details, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, batch)
+        except Exception:
+            # Tentar de novo no próximo flush, mantendo a ordem
+            self._pending[:0] = batch
+            raise
+        return len(batch)
+    
+    async def _flush_logged(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            tickets_logger.error(f"Erro ao registrar log de ticket: {e}")
+
+ticket_log = TicketLogQueue()
+
+def log_ticket_action(guild_id, channel_id, user_id, action, details=None):
+    """Registra uma ação de ticket no log (gravada em lote por ticket_log)"""
+    ticket_log.put(guild_id, channel_id, user_id, action, details)
+
+# ================= RATE LIMIT DE TICKETS =================
+TICKET_RATE_LIMIT_SNAPSHOT_SECONDS = 60   # intervalo entre gravações do estado em user_tickets
+
+class TicketRateLimiter:
+    """Rate limit de criação de tickets por (servidor, usuário), inteiramente em memória
+
+    Guarda os tickets abertos de cada usuário (canal -> tipo) e os horários das
+    criações recentes (janela deslizante de rate_limit_hours). É montado na
+    inicialização a partir de active_tickets e user_tickets; o último ticket e o
+    total de cada usuário voltam para user_tickets em snapshots periódicos.
+    """
+    
+    def __init__(self):
+        self._active: Dict[tuple, Dict[str, str]] = {}
+        self._owners: Dict[str, tuple] = {}
+        self._recent: Dict[tuple, collections.deque] = {}
+        self._counts: Dict[tuple, int] = {}
+        self._dirty = set()
+    
+    @staticmethod
+    def _key(guild_id, user_id):
+        return (str(guild_id), str(user_id))
+    
+    async def load(self):
+        """Reconstrói o estado a partir do banco (chamar na inicialização)"""
+        active_rows = await db.fetchall("SELECT guild_id, user_id, channel_id, ticket_type FROM active_tickets")
+        user_rows = await db.fetchall("SELECT guild_id, user_id, last_ticket, ticket_count FROM user_tickets")
+        self._active, self._owners, self._recent, self._counts = {}, {}, {}, {}
+        for guild_id, user_id, channel_id, ticket_type in active_rows:
+            key = self._key(guild_id, user_id)
+            self._active.setdefault(key, {})[str(channel_id)] = ticket_type
+            self._owners[str(channel_id)] = key
+        for guild_id, user_id, last_ticket, ticket_count in user_rows:
+            key = self._key(guild_id, user_id)
+            self._counts[key] = ticket_count or 0
+            try:
+                self._recent[key] = collections.deque([parse_utc_timestamp(last_ticket)])
+            except (TypeError, ValueError):
+                pass
+    
+    def check(self, guild_id, user_id, rate_limit_hours, max_tickets, tickets_per_window=1):
+        """Motivo para recusar um novo ticket, ou None se o usuário pode criar"""
+        key = self._key(guild_id, user_id)
         
         # Verificar tickets ativos do usuário
-        cursor.execute("""
-            SELECT COUNT(*) FROM active_tickets 
-            WHERE user_id = ? AND guild_id = ?
-        """, (str(user_id), str(guild_id)))
-        active_count = cursor.fetchone()[0]
-        
+        active_count = len(self._active.get(key, ()))
         if active_count >= max_tickets:
-            conn.close()
-            return False, f"Você já possui {active_count} tickets ativos. Limite: {max_tickets}"
-        
-        # Verificar rate limit
-        cursor.execute("""
-            SELECT last_ticket, ticket_count FROM user_tickets 
-            WHERE user_id = ? AND guild_id = ?
-        """, (str(user_id), str(guild_id)))
-        result = cursor.fetchone()
-        
-        if result:
-            last_ticket_str, ticket_count = result
-            last_ticket = datetime.fromisoformat(last_ticket_str)
-            hours_since = (datetime.now() - last_ticket).total_seconds() / 3600
-            
-            if hours_since < rate_limit_hours:
-                conn.close()
-                remaining = rate_limit_hours - hours_since
-                return False, f"Aguarde {remaining:.1f}h para criar outro ticket"
-        
-        conn.close()
+            return f"Você já possui {active_count} tickets ativos. Limite: {max_tickets}"
+        
+        # Verificar rate limit (criações dentro da janela)
+        recent = self._recent.get(key)
+        if recent:
+            window = rate_limit_hours * 3600
+            now = time.time()
+            while len(recent) > 1 and now - recent[0] >= window:
+                recent.popleft()
+            in_window = [t for t in recent if now - t < window]
+            if len(in_window) >= tickets_per_window:
+                remaining = (in_window[0] + window - now) / 3600
+                return f"Aguarde {remaining:.1f}h para criar outro ticket"
+        return None
+    
+    def active_ticket(self, guild_id, user_id, ticket_type):
+        """Canal do ticket aberto do usuário com este tipo (ou None)"""
+        for channel_id, active_type in self._active.get(self._key(guild_id, user_id), {}).items():
+            if active_type == ticket_type:
+                return channel_id
+        return None
+    
+    def record(self, guild_id, user_id, channel_id, ticket_type):
+        """Registra um ticket recém-criado"""
+        key = self._key(guild_id, user_id)
+        self._active.setdefault(key, {})[str(channel_id)] = ticket_type
+        self._owners[str(channel_id)] = key
+        self._recent.setdefault(key, collections.deque()).append(time.time())
+        self._counts[key] = self._counts.get(key, 0) + 1
+        self._dirty.add(key)
+    
+    def release(self, channel_id):
+        """O ticket do canal foi fechado: deixa de contar como ativo"""
+        key = self._owners.pop(str(channel_id), None)
+        if key is None:
+            return
+        active = self._active.get(key)
+        if active is not None:
+            active.pop(str(channel_id), None)
+            if not active:
+                del self._active[key]
+    
+    async def flush(self):
+        """Grava em user_tickets o último ticket e o total dos usuários alterados"""
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, set()
+        batch = [
+            (
+                user_id, guild_id,
+                datetime.fromtimestamp(self._recent[(guild_id, user_id)][-1], timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                self._counts.get((guild_id, user_id), 0),
+            )
+            for guild_id, user_id in dirty if self._recent.get((guild_id, user_id))
+        ]
+        try:
+            await db.executemany("""
+                INSERT INTO user_tickets (user_id, guild_id, last_ticket, ticket_count)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(user_id, guild_id) DO UPDATE SET
+                    last_ticket = excluded.last_ticket,
+                    ticket_count = excluded.ticket_count
+            """, batch)
+        except Exception:
+            # Tentar de novo no próximo snapshot
+            self._dirty.update(dirty)
+            raise
+        return len(batch)
+
+ticket_rate_limiter = TicketRateLimiter()
+
+async def check_rate_limit(user_id, guild_id):
+    """Verifica se o usuário pode criar um novo ticket (sem consultar o banco)"""
+    try:
+        config = await TicketConfig.load(guild_id)
+        error = ticket_rate_limiter.check(
+            guild_id, user_id,
+            config.get_field(["settings", "rate_limit_hours"]) or 24,
+            config.get_field(["settings", "max_tickets_per_user"]) or 3,
+            config.get_field(["settings", "tickets_per_window"]) or 1,
+        )
+        if error:
+            return False, error
         return True, "OK"
         
     except Exception as e:
-        print(f"Erro ao verificar rate limit: {e}")
+        tickets_logger.error(f"Erro ao verificar rate limit: {e}")
         return True, "OK"  # Em caso de erro, permitir
 
-async def add_rate_limit(user_id, guild_id):
-    """Adiciona/atualiza rate limit do usuário"""
+def _remove_active_ticket(conn, channel_id):
+    """Remove o ticket do canal e retorna (user_id, ticket_type, voice_channel_id), ou None"""
+    ticket = conn.execute(
+        "SELECT user_id, ticket_type, voice_channel_id FROM active_tickets WHERE channel_id = ?",
+        (str(channel_id),)
+    ).fetchone()
+    if ticket:
+        conn.execute("DELETE FROM active_tickets WHERE channel_id = ?", (str(channel_id),))
+    return ticket
+
+async def delete_ticket_voice_channel(guild, voice_channel_id):
+    """Apaga o canal de voz do ticket pelo ID registrado (se ainda existir)"""
+    if not voice_channel_id:
+        return False
+    channel = guild.get_channel(int(voice_channel_id))
+    if channel is None:
+        return False
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT OR REPLACE INTO user_tickets (user_id, guild_id, last_ticket, ticket_count)
-            VALUES (?, ?, datetime('now'), 
-                COALESCE((SELECT ticket_count FROM user_tickets WHERE user_id = ? AND guild_id = ?), 0) + 1)
-        """, (str(user_id), str(guild_id), str(user_id), str(guild_id)))
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Erro ao adicionar rate limit: {e}")
+        await channel.delete()
+        return True
+    except discord.HTTPException as e:
+        tickets_logger.error(f"Erro ao apagar canal de voz do ticket: {e}")
+        return False
+
+# Canais de voz de ticket sem ticket aberto são apagados depois deste tempo de vida
+# (evita apagar um canal criado há pouco cujo ticket ainda está sendo registrado)
+ORPHAN_VOICE_MIN_AGE = timedelta(minutes=10)
+ORPHAN_VOICE_SWEEP_MINUTES = 30
+
+def ticket_voice_name_prefixes(config):
+    """Início fixo dos nomes dos canais de voz de ticket (parte antes de {user})"""
+    prefixes = []
+    for voice_config in (config.get_field(["voice"]) or {}).values():
+        prefix = (voice_config.get("name") or "").split("{user}")[0]
+        if prefix.strip():
+            prefixes.append(prefix)
+    return tuple(prefixes)
+
+async def reclaim_orphan_voice_channels(guilds):
+    """Apaga canais de voz de ticket vazios que não pertencem a nenhum ticket aberto"""
+    rows = await db.fetchall(
+        "SELECT guild_id, channel_id, voice_channel_id FROM active_tickets WHERE voice_channel_id IS NOT NULL"
+    )
+    tickets_by_guild = collections.defaultdict(list)
+    for guild_id, channel_id, voice_channel_id in rows:
+        tickets_by_guild[str(guild_id)].append((channel_id, voice_channel_id))
+    
+    reclaimed = 0
+    now = datetime.now(timezone.utc)
+    for guild in guilds:
+        # Só conta como dono o ticket cujo canal de texto ainda existe
+        owned = {
+            int(voice_channel_id) for channel_id, voice_channel_id in tickets_by_guild.get(str(guild.id), ())
+            if guild.get_channel(int(channel_id))
+        }
+        prefixes = ticket_voice_name_prefixes(await TicketConfig.load(guild.id))
+        if not prefixes:
+            continue
+        for channel in guild.voice_channels:
+            if channel.id in owned or channel.members or not channel.name.startswith(prefixes):
+                continue
+            if now - channel.created_at < ORPHAN_VOICE_MIN_AGE:
+                continue
+            if await delete_ticket_voice_channel(guild, channel.id):
+                reclaimed += 1
+    return reclaimed
+
+# ================= CICLO DE VIDA DOS TICKETS EM MEMÓRIA =================
+TICKET_ANALYTICS_SNAPSHOT_SECONDS = 300   # intervalo entre gravações das estatísticas
+
+def track_new_ticket(guild_id, user_id, channel_id, ticket_type):
+    """Ticket recém-gravado: rate limit, atividade, auto-fechamento e estatísticas"""
+    ticket_rate_limiter.record(guild_id, user_id, channel_id, ticket_type)
+    ticket_activity.open(channel_id)
+    auto_close_scheduler.schedule(channel_id, guild_id)
+    ticket_analytics.ticket_opened(guild_id, channel_id, ticket_type, user_id)
+    ticket_queue.add(guild_id, channel_id)
+
+def untrack_ticket(channel_id):
+    """Ticket fechado (a linha já saiu de active_tickets): remove das estruturas em memória"""
+    ticket_activity.close(channel_id)
+    ticket_rate_limiter.release(channel_id)
+    ticket_analytics.ticket_closed(channel_id)
+    # O atendente ficou com uma vaga: passa o próximo ticket da fila para a staff
+    guild_id = ticket_queue.remove(channel_id)
+    guild = guild_id and ticket_queue.waiting(guild_id) and bot.get_guild(int(guild_id))
+    if guild:
+        asyncio.create_task(dispatch_ticket_queue(guild))
+
+# ================= CRIAÇÃO DE TICKETS =================
+# (guild_id, user_id) com criação em andamento: cliques repetidos não criam canais duplicados
+tickets_being_created = set()
+
+def _register_new_ticket(conn, guild_id, channel_id, user_id, ticket_type, voice_channel_id=None):
+    """Grava o ticket e o log de criação numa só transação"""
+    conn.execute("""
+        INSERT INTO active_tickets (guild_id, channel_id, user_id, ticket_type, voice_channel_id, created_at, last_activity)
+        VALUES (?, ?, ?, ?, ?, datetime('now'), datetime('now'))
+    """, (guild_id, channel_id, user_id, ticket_type, voice_channel_id))
+    conn.execute("""
+        INSERT INTO ticket_logs (guild_id, channel_id, user_id, action, details)
+        VALUES (?, ?, ?, ?, ?)
+    """, (guild_id, channel_id, user_id, "created", ticket_type))
 
 async def create_voice_channel(guild, ticket_type, user, category=None):
     """Cria canal de voz para o ticket"""
     try:
-        config = TicketConfig(guild.id)
+        config = await TicketConfig.load(guild.id)
         voice_config = config.get_field(["voice", ticket_type])
         
         if not voice_config:
@@ -720,9 +931,8 @@ async def create_voice_channel(guild, ticket_type, user, category=None):
         }
         
         # Adicionar permissões para staff
-        for role in guild.roles:
-            if any(staff_name.lower() in role.name.lower() for staff_name in STAFF_ROLE_NAMES):
-                overwrites[role] = discord.PermissionOverwrite(view_channel=True, connect=True, speak=True)
+        for role in staff_roles.roles(guild):
+            overwrites[role] = discord.PermissionOverwrite(view_channel=True, connect=True, speak=True)
         
         # Criar canal
         voice_channel = await guild.create_voice_channel(
@@ -736,43 +946,541 @@ async def create_voice_channel(guild, ticket_type, user, category=None):
         return voice_channel
         
     except Exception as e:
-        print(f"Erro ao criar canal de voz: {e}")
+        tickets_logger.error(f"Erro ao criar canal de voz: {e}")
         return None
 
-async def backup_ticket_messages(channel):
-    """Faz backup das mensagens do ticket"""
+# Intervalo entre gravações em lote da última atividade dos tickets
+TICKET_ACTIVITY_FLUSH_SECONDS = 5
+
+class TicketActivityTracker:
+    """Última atividade de cada ticket aberto, mantida em memória (write-behind)
+
+    on_message só atualiza o dicionário; flush() grava as entradas alteradas em
+    uma única transação (executemany) a cada poucos segundos e no desligamento.
+    Os horários ficam em UTC (com fuso), como o created_at de datetime('now').
+    """
+    
+    def __init__(self):
+        self._last_activity: Dict[str, datetime] = {}
+        self._dirty = set()
+    
+    async def load(self):
+        """Carrega os tickets abertos do banco (chamar na inicialização)"""
+        rows = await db.fetchall("SELECT channel_id, last_activity, created_at FROM active_tickets")
+        for channel_id, last_activity_str, created_at in rows:
+            try:
+                # Sem fuso = UTC (CURRENT_TIMESTAMP e datetime('now'))
+                last_activity = parse_utc_datetime(last_activity_str or created_at)
+            except (TypeError, ValueError):
+                last_activity = datetime.now(timezone.utc)
+            self._last_activity[str(channel_id)] = last_activity
+    
+    def __contains__(self, channel_id):
+        return str(channel_id) in self._last_activity
+    
+    def open(self, channel_id, when=None):
+        """Passa a acompanhar um ticket recém-criado"""
+        self._last_activity[str(channel_id)] = when or datetime.now(timezone.utc)
+    
+    def close(self, channel_id):
+        """Deixa de acompanhar um ticket fechado (a linha já foi removida do banco)"""
+        channel_id = str(channel_id)
+        self._last_activity.pop(channel_id, None)
+        self._dirty.discard(channel_id)
+    
+    def touch(self, channel_id, when=None):
+        """Registra atividade em um canal; ignora canais que não são tickets"""
+        channel_id = str(channel_id)
+        if channel_id not in self._last_activity:
+            return False
+        self._last_activity[channel_id] = when or datetime.now(timezone.utc)
+        self._dirty.add(channel_id)
+        return True
+    
+    def get(self, channel_id) -> Optional[datetime]:
+        """Última atividade conhecida do ticket (inclui o que ainda não foi gravado)"""
+        return self._last_activity.get(str(channel_id))
+    
+    async def flush(self):
+        """Grava de uma vez as atividades pendentes e retorna quantas foram gravadas"""
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, set()
+        batch = [
+            (self._last_activity[channel_id].isoformat(), channel_id)
+            for channel_id in dirty if channel_id in self._last_activity
+        ]
+        try:
+            await db.executemany(
+                "UPDATE active_tickets SET last_activity = ? WHERE channel_id = ?", batch
+            )
+        except Exception:
+            # Tentar de novo no próximo flush
+            self._dirty.update(channel_id for _, channel_id in batch)
+            raise
+        return len(batch)
+
+ticket_activity = TicketActivityTracker()
+
+# ================= AUTO-FECHAMENTO DE TICKETS =================
+AUTO_CLOSE_CONCURRENCY = 4          # tickets fechados ao mesmo tempo
+AUTO_CLOSE_MAX_SLEEP_SECONDS = 300  # o agendador acorda pelo menos a cada 5 minutos
+AUTO_CLOSE_RETRY_SECONDS = 3600     # nova tentativa quando o fechamento falha
+
+class TicketAutoCloseScheduler:
+    """Fila de prazos (min-heap) de fechamento por inatividade dos tickets abertos
+
+    Cada ticket entra uma vez com prazo = última atividade + auto_close_hours.
+    Mensagens não mexem no heap (on_message só atualiza ticket_activity): quando
+    um prazo vence, ele é recalculado com a atividade atual e, se o ticket ainda
+    estiver ativo, volta para o heap com o novo prazo. Tickets fechados por outro
+    caminho simplesmente deixam de estar em ticket_activity e são descartados.
+    Reagendar deixa a entrada antiga no heap; quando as antigas passam a ser
+    maioria, o heap é reconstruído só com as válidas.
+    """
+    
+    def __init__(self, activity, max_concurrency=AUTO_CLOSE_CONCURRENCY):
+        self._activity = activity
+        self._heap = []          # (prazo, channel_id)
+        self._deadlines = {}     # channel_id -> prazo válido no heap (entradas diferentes são antigas)
+        self._guilds = {}        # channel_id -> guild_id
+        self._by_guild = {}      # guild_id -> {channel_id}
+        self._guild_hours = {}   # guild_id -> auto_close_hours
+        self._loading_hours = set()
+        self._max_concurrency = max_concurrency
+        self._semaphore = None
+        self._wakeup = None
+        self._task = None
+        self._closing = set()
+    
+    @staticmethod
+    def _config_hours(guild_id, config):
+        return TicketConfig(guild_id, config).get_field(["settings", "auto_close_hours"]) or 48
+    
+    def _hours(self, guild_id):
+        """auto_close_hours do servidor, guardado aqui para não depender do cache LRU de configurações"""
+        guild_id = str(guild_id)
+        hours = self._guild_hours.get(guild_id)
+        if hours is None:
+            config = ticket_config_cache.get(guild_id)
+            if config is None:
+                # Configuração fora do cache: carrega e recalcula os prazos do servidor
+                if guild_id not in self._loading_hours:
+                    self._loading_hours.add(guild_id)
+                    asyncio.create_task(self._load_hours(guild_id))
+                return self._config_hours(guild_id, TICKET_DEFAULTS)
+            hours = self._guild_hours[guild_id] = self._config_hours(guild_id, config)
+        return hours
+    
+    async def _load_hours(self, guild_id):
+        try:
+            config = await TicketConfig.load(guild_id)
+            self.reschedule_guild(guild_id, config.get_field(["settings", "auto_close_hours"]) or 48)
+        finally:
+            self._loading_hours.discard(guild_id)
+    
+    def _track(self, channel_id, guild_id):
+        self._guilds[channel_id] = guild_id
+        self._by_guild.setdefault(guild_id, set()).add(channel_id)
+    
+    def _forget(self, channel_id):
+        self._deadlines.pop(channel_id, None)
+        guild_id = self._guilds.pop(channel_id, None)
+        channels = self._by_guild.get(guild_id)
+        if channels is not None:
+            channels.discard(channel_id)
+            if not channels:
+                del self._by_guild[guild_id]
+    
+    def _push(self, channel_id, deadline):
+        self._deadlines[channel_id] = deadline
+        # Muitas entradas antigas: reconstrói o heap só com os prazos válidos
+        if len(self._heap) > 2 * len(self._deadlines) + 32:
+            self._heap = [(d, c) for d, c in self._heap if self._deadlines.get(c) == d and c != channel_id]
+            heapq.heapify(self._heap)
+        heapq.heappush(self._heap, (deadline, channel_id))
+        # Acordar o loop se o novo prazo é o mais próximo
+        if self._wakeup is not None and self._heap[0][1] == channel_id:
+            self._wakeup.set()
+    
+    def schedule(self, channel_id, guild_id):
+        """Agenda o fechamento de um ticket acompanhado por ticket_activity"""
+        channel_id = str(channel_id)
+        last_activity = self._activity.get(channel_id) or datetime.now(timezone.utc)
+        self._track(channel_id, str(guild_id))
+        self._push(channel_id, last_activity + timedelta(hours=self._hours(guild_id)))
+    
+    def reschedule_guild(self, guild_id, hours):
+        """Recalcula os prazos de um servidor com um novo auto_close_hours"""
+        guild_id = str(guild_id)
+        self._guild_hours[guild_id] = hours
+        for channel_id in list(self._by_guild.get(guild_id, ())):
+            if channel_id in self._activity:
+                self.schedule(channel_id, guild_id)
+            else:
+                self._forget(channel_id)
+    
+    async def load(self):
+        """Agenda os tickets abertos do banco (depois de ticket_activity.load)"""
+        rows = await db.fetchall("SELECT channel_id, guild_id FROM active_tickets")
+        # auto_close_hours de cada servidor antes de calcular os prazos
+        for guild_id in {str(guild_id) for _, guild_id in rows}:
+            config = await TicketConfig.load(guild_id)
+            self._guild_hours[guild_id] = config.get_field(["settings", "auto_close_hours"]) or 48
+        for channel_id, guild_id in rows:
+            if channel_id in self._activity:
+                self.schedule(channel_id, guild_id)
+    
+    def _pop_due(self, now):
+        """Tira do heap os tickets vencidos que continuam valendo: [(channel_id, guild_id)]"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, channel_id = heapq.heappop(self._heap)
+            if self._deadlines.get(channel_id) != deadline:
+                continue
+            if channel_id not in self._activity:
+                # Fechado manualmente
+                self._forget(channel_id)
+                continue
+            guild_id = self._guilds[channel_id]
+            real_deadline = self._activity.get(channel_id) + timedelta(hours=self._hours(guild_id))
+            if real_deadline > now:
+                self._push(channel_id, real_deadline)
+            elif channel_id not in self._closing:
+                self._forget(channel_id)
+                due.append((channel_id, guild_id))
+        return due
+    
+    async def _close(self, close_ticket, channel_id, guild_id):
+        async with self._semaphore:
+            try:
+                await close_ticket(guild_id, channel_id)
+            except Exception as e:
+                tickets_logger.error(f"Erro ao processar ticket {channel_id}: {e}")
+            finally:
+                self._closing.discard(channel_id)
+        # Continua aberto (servidor indisponível ou erro): tentar de novo mais tarde
+        if channel_id in self._activity:
+            self._track(channel_id, guild_id)
+            self._push(channel_id, datetime.now(timezone.utc) + timedelta(seconds=AUTO_CLOSE_RETRY_SECONDS))
+    
+    async def _run(self, close_ticket):
+        while True:
+            now = datetime.now(timezone.utc)
+            for channel_id, guild_id in self._pop_due(now):
+                self._closing.add(channel_id)
+                asyncio.create_task(self._close(close_ticket, channel_id, guild_id))
+            
+            timeout = AUTO_CLOSE_MAX_SLEEP_SECONDS
+            if self._heap:
+                timeout = min(timeout, max(0.0, (self._heap[0][0] - now).total_seconds()))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+    
+    def start(self, close_ticket):
+        """Inicia o loop; close_ticket(guild_id, channel_id) fecha um ticket vencido"""
+        if self._task is not None and not self._task.done():
+            return
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(close_ticket))
+    
+    def is_running(self):
+        return self._task is not None and not self._task.done()
+    
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+auto_close_scheduler = TicketAutoCloseScheduler(ticket_activity)
+
+# ================= FILA DE ATENDIMENTO DOS TICKETS =================
+# Prioridades na ordem de atendimento
+TICKET_PRIORITIES = ("urgente", "alta", "normal", "baixa")
+TICKET_PRIORITY_LABELS = {
+    "urgente": "🔴 Urgente",
+    "alta": "🟠 Alta",
+    "normal": "🟢 Normal",
+    "baixa": "⚪ Baixa",
+}
+TICKET_DEFAULT_PRIORITY = "normal"
+TICKET_STAFF_MAX_LOAD = 3   # tickets abertos por atendente na distribuição automática
+
+class TicketQueue:
+    """Fila de tickets sem atendente por servidor, ordenada por prioridade e antiguidade
+
+    Cada servidor tem um heap (prioridade, criação, canal): pegar o próximo é
+    O(log n). Mudar a prioridade ou atribuir um ticket só invalida a entrada
+    antiga, descartada quando chega ao topo. A carga de cada atendente (tickets
+    abertos atribuídos a ele) também fica em memória, para distribuir os
+    tickets novos para quem está com menos.
+    """
+    
+    def __init__(self):
+        self._heaps: Dict[str, list] = {}
+        self._entries: Dict[str, list] = {}           # channel_id -> entrada válida no heap
+        self._waiting: Dict[str, int] = {}            # guild_id -> tickets em espera
+        self._tickets: Dict[str, list] = {}           # channel_id -> [guild_id, prioridade, criado em, atendente]
+        self._loads: Dict[str, Dict[str, int]] = {}   # guild_id -> {staff_id: tickets abertos}
+    
+    async def load(self):
+        """Reconstrói a fila e as cargas a partir de active_tickets (chamar na inicialização)"""
+        rows = await db.fetchall(
+            "SELECT guild_id, channel_id, priority, staff_assigned, created_at FROM active_tickets"
+        )
+        self._heaps, self._entries, self._waiting, self._tickets, self._loads = {}, {}, {}, {}, {}
+        for guild_id, channel_id, priority, staff_id, created_at in rows:
+            try:
+                created = parse_utc_timestamp(created_at)
+            except (TypeError, ValueError):
+                created = time.time()
+            self.add(guild_id, channel_id, priority, created, staff_id)
+    
+    # ---------- heap ----------
+    def _push(self, channel_id, ticket):
+        guild_id = ticket[0]
+        heap = self._heaps.setdefault(guild_id, [])
+        waiting = self._waiting.get(guild_id, 0) + 1
+        self._waiting[guild_id] = waiting
+        # Muitas entradas invalidadas: reconstrói o heap só com as válidas
+        if len(heap) > 2 * waiting + 32:
+            heap[:] = [entry for entry in heap if entry[3]]
+            heapq.heapify(heap)
+        entry = [TICKET_PRIORITIES.index(ticket[1]), ticket[2], channel_id, True]
+        self._entries[channel_id] = entry
+        heapq.heappush(heap, entry)
+    
+    def _unqueue(self, channel_id, guild_id):
+        entry = self._entries.pop(channel_id, None)
+        if entry is not None:
+            entry[3] = False
+            self._waiting[guild_id] -= 1
+    
+    # ---------- carga dos atendentes ----------
+    def _add_load(self, guild_id, staff_id, delta):
+        loads = self._loads.setdefault(guild_id, {})
+        count = loads.get(staff_id, 0) + delta
+        if count > 0:
+            loads[staff_id] = count
+        else:
+            loads.pop(staff_id, None)
+    
+    def _assign(self, channel_id, ticket, staff_id):
+        self._unqueue(channel_id, ticket[0])
+        if ticket[3] is not None:
+            self._add_load(ticket[0], ticket[3], -1)
+        ticket[3] = staff_id
+        self._add_load(ticket[0], staff_id, 1)
+    
+    # ---------- tickets ----------
+    def add(self, guild_id, channel_id, priority=TICKET_DEFAULT_PRIORITY, created=None, staff_id=None):
+        """Registra um ticket aberto: entra na fila, ou na carga do atendente se já tiver um"""
+        channel_id = str(channel_id)
+        self.remove(channel_id)
+        if priority not in TICKET_PRIORITIES:
+            priority = TICKET_DEFAULT_PRIORITY
+        ticket = [str(guild_id), priority, created or time.time(), None]
+        self._tickets[channel_id] = ticket
+        if staff_id:
+            self._assign(channel_id, ticket, str(staff_id))
+        else:
+            self._push(channel_id, ticket)
+    
+    def remove(self, channel_id):
+        """Tira um ticket fechado; retorna o guild_id se isso liberou um atendente"""
+        channel_id = str(channel_id)
+        ticket = self._tickets.pop(channel_id, None)
+        if ticket is None:
+            return None
+        self._unqueue(channel_id, ticket[0])
+        if ticket[3] is None:
+            return None
+        self._add_load(ticket[0], ticket[3], -1)
+        return ticket[0]
+    
+    def set_priority(self, channel_id, priority):
+        """Muda a prioridade de um ticket (reposicionando-o na fila se estiver esperando)"""
+        channel_id = str(channel_id)
+        ticket = self._tickets.get(channel_id)
+        if ticket is None:
+            return False
+        ticket[1] = priority
+        if channel_id in self._entries:
+            self._unqueue(channel_id, ticket[0])
+            self._push(channel_id, ticket)
+        return True
+    
+    def assign(self, channel_id, staff_id):
+        """Atribui (ou transfere) um ticket a um atendente"""
+        channel_id = str(channel_id)
+        ticket = self._tickets.get(channel_id)
+        if ticket is None:
+            return False
+        self._assign(channel_id, ticket, str(staff_id))
+        return True
+    
+    def claim_next(self, guild_id, staff_id, exists=None):
+        """Retira da fila o próximo ticket (maior prioridade, mais antigo) e o atribui a `staff_id`
+        
+        `exists(channel_id)` descarta tickets cujo canal não existe mais.
+        Retorna o channel_id, ou None se a fila estiver vazia.
+        """
+        guild_id = str(guild_id)
+        heap = self._heaps.get(guild_id)
+        while heap:
+            entry = heapq.heappop(heap)
+            if not entry[3]:
+                continue
+            channel_id = entry[2]
+            ticket = self._tickets[channel_id]
+            if exists is not None and not exists(channel_id):
+                # Canal apagado sem fechar o ticket: sai da fila
+                self._unqueue(channel_id, guild_id)
+                continue
+            self._assign(channel_id, ticket, str(staff_id))
+            return channel_id
+        return None
+    
+    def waiting(self, guild_id):
+        """Quantos tickets do servidor estão esperando atendente"""
+        return self._waiting.get(str(guild_id), 0)
+    
+    def priority(self, channel_id):
+        ticket = self._tickets.get(str(channel_id))
+        return ticket[1] if ticket else None
+    
+    def assignee(self, channel_id):
+        ticket = self._tickets.get(str(channel_id))
+        return ticket[3] if ticket else None
+    
+    def staff_load(self, guild_id, staff_id):
+        return self._loads.get(str(guild_id), {}).get(str(staff_id), 0)
+    
+    def distribute(self, guild_id, staff_ids, max_load=TICKET_STAFF_MAX_LOAD):
+        """Atribui os tickets em espera aos atendentes com menos tickets abertos
+        
+        Só recebe quem está abaixo de `max_load`. Retorna [(channel_id, staff_id)].
+        """
+        guild_id = str(guild_id)
+        loads = self._loads.get(guild_id, {})
+        available = [(loads.get(staff_id, 0), staff_id) for staff_id in map(str, staff_ids)]
+        available = [item for item in available if item[0] < max_load]
+        heapq.heapify(available)
+        assigned = []
+        while available and self.waiting(guild_id):
+            load, staff_id = heapq.heappop(available)
+            channel_id = self.claim_next(guild_id, staff_id)
+            if channel_id is None:
+                break
+            assigned.append((channel_id, staff_id))
+            if load + 1 < max_load:
+                heapq.heappush(available, (load + 1, staff_id))
+        return assigned
+
+ticket_queue = TicketQueue()
+
+def available_ticket_staff(guild):
+    """IDs dos membros da staff disponíveis (online ou ausentes) para receber tickets"""
+    available = set()
+    for role in staff_roles.roles(guild):
+        for member in role.members:
+            if not member.bot and member.status in (discord.Status.online, discord.Status.idle):
+                available.add(member.id)
+    return available
+
+async def announce_ticket_assignment(guild, channel_id, staff_id, action="assigned"):
+    """Grava o atendente do ticket e avisa no canal"""
+    await db.execute(
+        "UPDATE active_tickets SET staff_assigned = ? WHERE channel_id = ?",
+        (str(staff_id), str(channel_id))
+    )
+    log_ticket_action(guild.id, channel_id, staff_id, action, f"Atendente: {staff_id}")
+    channel = guild.get_channel(int(channel_id))
+    if channel:
+        await channel.send(f"👤 <@{staff_id}> vai atender este ticket.")
+
+async def dispatch_ticket_queue(guild):
+    """Distribui os tickets em espera do servidor entre a staff disponível"""
+    if not ticket_queue.waiting(guild.id):
+        return
+    for channel_id, staff_id in ticket_queue.distribute(guild.id, available_ticket_staff(guild)):
+        try:
+            await announce_ticket_assignment(guild, channel_id, staff_id)
+        except Exception as e:
+            tickets_logger.error(f"Erro ao atribuir ticket {channel_id}: {e}")
+
+def backup_message_record(message):
+    """Linha do backup de uma mensagem do ticket"""
+    return {
+        "id": str(message.id),
+        "author": str(message.author),
+        "author_id": str(message.author.id),
+        "content": message.content,
+        "timestamp": message.created_at.isoformat(),
+        "attachments": [att.url for att in message.attachments]
+    }
+
+async def index_ticket_backup(path, opener_id, ticket_type):
+    """Indexa um backup no arquivo de transcrições (leitura fora da transação de escrita)"""
+    try:
+        transcript = await asyncio.get_running_loop().run_in_executor(None, load_transcript, path)
+        await db.transaction(index_transcript, path, opener_id, ticket_type, transcript)
+    except Exception as e:
+        tickets_logger.error(f"Erro ao indexar backup {path.name}: {e}")
+
+async def backup_ticket_messages(channel, opener_id=None, ticket_type=None):
+    """Faz backup das mensagens do ticket (NDJSON compactado, gravado conforme o histórico chega)
+
+    A indexação no arquivo de transcrições roda em segundo plano. Sem
+    opener_id/ticket_type, eles vêm do ticket ainda registrado em active_tickets.
+    """
     try:
-        messages_data = []
-        async for message in channel.history(limit=None, oldest_first=True):
-            message_data = {
-                "author": str(message.author),
-                "content": message.content,
-                "timestamp": message.created_at.isoformat(),
-                "attachments": [att.url for att in message.attachments]
-            }
-            messages_data.append(message_data)
-        
-        # Salvar backup
-        backup_dir = Path(__file__).parent / "backups"
-        backup_dir.mkdir(exist_ok=True)
-        
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_file = backup_dir / f"ticket_{channel.id}_{timestamp}.json"
-        
-        with open(backup_file, 'w', encoding='utf-8') as f:
-            json.dump({
-                "channel_id": str(channel.id),
-                "channel_name": channel.name,
-                "guild_id": str(channel.guild.id),
-                "backup_date": datetime.now().isoformat(),
-                "messages": messages_data
-            }, f, ensure_ascii=False, indent=2)
-        
-        return backup_file
+        backup_file = BACKUP_DIR / f"ticket_{channel.id}_{timestamp}{BACKUP_SUFFIX}"
+        header = {
+            "channel_id": str(channel.id),
+            "channel_name": channel.name,
+            "guild_id": str(channel.guild.id),
+            "backup_date": datetime.now().isoformat(),
+        }
+        history = channel.history(limit=None, oldest_first=True)
+        writer = await write_backup(backup_file, header, (backup_message_record(m) async for m in history))
+        tickets_logger.debug(
+            "💾 Backup do ticket salvo: %s", writer.path.name,
+            extra={"guild_id": channel.guild.id, "messages": writer.count}
+        )
         
     except Exception as e:
-        print(f"Erro ao fazer backup: {e}")
+        tickets_logger.error(f"Erro ao fazer backup: {e}")
         return None
+    
+    # Registrar no arquivo pesquisável; quem abriu é lido agora, antes de o ticket sair de active_tickets
+    if opener_id is None or ticket_type is None:
+        try:
+            ticket = await db.fetchone(
+                "SELECT user_id, ticket_type FROM active_tickets WHERE channel_id = ?", (str(channel.id),)
+            )
+        except Exception as e:
+            tickets_logger.error(f"Erro ao buscar ticket do backup {writer.path.name}: {e}")
+            ticket = None
+        if ticket:
+            opener_id = opener_id or ticket[0]
+            ticket_type = ticket_type or ticket[1]
+    asyncio.create_task(index_ticket_backup(writer.path, opener_id, ticket_type))
+    return writer.path
+
+async def import_transcript_backups():
+    """Indexa backups gravados antes do arquivo de transcrições existir"""
+    try:
+        indexed = await db.run(import_backup_directory, BACKUP_DIR)
+        if indexed:
+            tickets_logger.info(f"🗂️ {indexed} backups de tickets adicionados ao arquivo de transcrições")
+    except Exception as e:
+        tickets_logger.error(f"Erro ao importar backups de tickets: {e}")
 
 def find_member_by_name(guild, name):
     """Busca um membro pelo nome ou apelido no servidor"""
@@ -1054,7 +1762,7 @@ def find_member_by_name(guild, name):
 #     await runner.setup()
 #     site = web.TCPSite(runner, '0.0.0.0', port)
 #     await site.start()
-    print(f"🌐 Servidor HTTP iniciado na porta {port}")
+#     print(f"🌐 Servidor HTTP iniciado na porta {port}")
 
 # ================= FAMILY SYSTEM =================
 class HelpCategoryView(View):
@@ -1176,17 +1884,14 @@ class CriarFamiliaModal(Modal):
         nome = self.nome_familia.value
         user_id = interaction.user.id
         
-        try:
-            conn = get_db()
-            
+        def criar(conn):
             # Check if user already has a family
             existing = conn.execute(
                 "SELECT family_id FROM users WHERE user_id = ?", (user_id,)
             ).fetchone()
             
             if existing and existing[0]:
-                await interaction.response.send_message("❌ Você já está em uma família!", ephemeral=True)
-                return
+                return "❌ Você já está em uma família!"
             
             # Check if family name exists
             name_exists = conn.execute(
@@ -1194,8 +1899,7 @@ class CriarFamiliaModal(Modal):
             ).fetchone()
             
             if name_exists:
-                await interaction.response.send_message("❌ Já existe uma família com este nome!", ephemeral=True)
-                return
+                return "❌ Já existe uma família com este nome!"
             
             # Create family
             cursor = conn.execute(
@@ -1206,12 +1910,17 @@ class CriarFamiliaModal(Modal):
             
             # Add user to family
             conn.execute(
-                "INSERT OR REPLACE INTO users (user_id, family_id) VALUES (?, ?)",
+                "INSERT INTO users (user_id, family_id) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET family_id = excluded.family_id",
                 (user_id, family_id)
             )
-            
-            conn.commit()
-            conn.close()
+            return None
+        
+        try:
+            error = await db.transaction(criar)
+            if error:
+                await interaction.response.send_message(error, ephemeral=True)
+                return
             
             embed = discord.Embed(
                 title="✅ Família Criada!",
@@ -1221,7 +1930,7 @@ class CriarFamiliaModal(Modal):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             
         except Exception as e:
-            print(f"Erro ao criar família: {e}")
+            commands_logger.error(f"Erro ao criar família: {e}")
             await interaction.response.send_message("❌ Erro ao criar família!", ephemeral=True)
 
 class EntrarFamiliaModal(Modal):
@@ -1240,17 +1949,14 @@ class EntrarFamiliaModal(Modal):
         nome = self.nome_familia.value
         user_id = interaction.user.id
         
-        try:
-            conn = get_db()
-            
+        def entrar(conn):
             # Check if user already has a family
             existing = conn.execute(
                 "SELECT family_id FROM users WHERE user_id = ?", (user_id,)
             ).fetchone()
             
             if existing and existing[0]:
-                await interaction.response.send_message("❌ Você já está em uma família!", ephemeral=True)
-                return
+                return "❌ Você já está em uma família!"
             
             # Find family
             family = conn.execute(
@@ -1258,17 +1964,21 @@ class EntrarFamiliaModal(Modal):
             ).fetchone()
             
             if not family:
-                await interaction.response.send_message("❌ Família não encontrada!", ephemeral=True)
-                return
+                return "❌ Família não encontrada!"
             
             # Add user to family
             conn.execute(
-                "INSERT OR REPLACE INTO users (user_id, family_id) VALUES (?, ?)",
+                "INSERT INTO users (user_id, family_id) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET family_id = excluded.family_id",
                 (user_id, family[0])
             )
-            
-            conn.commit()
-            conn.close()
+            return None
+        
+        try:
+            error = await db.transaction(entrar)
+            if error:
+                await interaction.response.send_message(error, ephemeral=True)
+                return
             
             embed = discord.Embed(
                 title="✅ Entrou na Família!",
@@ -1278,25 +1988,21 @@ class EntrarFamiliaModal(Modal):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             
         except Exception as e:
-            print(f"Erro ao entrar na família: {e}")
+            commands_logger.error(f"Erro ao entrar na família: {e}")
             await interaction.response.send_message("❌ Erro ao entrar na família!", ephemeral=True)
 
 async def mostrar_info_familia(interaction: discord.Interaction):
     user_id = interaction.user.id
     
     try:
-        conn = get_db()
-        
         # Get user's family info
-        family_info = conn.execute("""
+        family_info = await db.fetchone("""
             SELECT f.name, f.leader_id, f.created_at, COUNT(u.user_id) as member_count
             FROM users u
             JOIN families f ON u.family_id = f.family_id
             WHERE u.user_id = ?
             GROUP BY f.family_id, f.name, f.leader_id, f.created_at
-        """, (user_id,)).fetchone()
-        
-        conn.close()
+        """, (user_id,))
         
         if not family_info:
             await interaction.response.send_message("❌ Você não está em nenhuma família!", ephemeral=True)
@@ -1315,23 +2021,20 @@ async def mostrar_info_familia(interaction: discord.Interaction):
         await interaction.response.send_message(embed=embed, ephemeral=True)
         
     except Exception as e:
-        print(f"Erro ao buscar info da família: {e}")
+        commands_logger.error(f"Erro ao buscar info da família: {e}")
         await interaction.response.send_message("❌ Erro ao buscar informações da família!", ephemeral=True)
 
 async def deixar_familia(interaction: discord.Interaction):
     user_id = interaction.user.id
     
-    try:
-        conn = get_db()
-        
+    def sair(conn):
         # Check if user is in a family
         family_info = conn.execute(
             "SELECT family_id FROM users WHERE user_id = ?", (user_id,)
         ).fetchone()
         
         if not family_info or not family_info[0]:
-            await interaction.response.send_message("❌ Você não está em nenhuma família!", ephemeral=True)
-            return
+            return "❌ Você não está em nenhuma família!"
         
         family_id = family_info[0]
         
@@ -1342,16 +2045,19 @@ async def deixar_familia(interaction: discord.Interaction):
         ).fetchone()
         
         if is_leader:
-            await interaction.response.send_message("❌ Líderes não podem sair da família! Transfira a liderança primeiro.", ephemeral=True)
-            return
+            return "❌ Líderes não podem sair da família! Transfira a liderança primeiro."
         
         # Remove user from family
         conn.execute(
             "UPDATE users SET family_id = NULL WHERE user_id = ?", (user_id,)
         )
-        
-        conn.commit()
-        conn.close()
+        return None
+    
+    try:
+        error = await db.transaction(sair)
+        if error:
+            await interaction.response.send_message(error, ephemeral=True)
+            return
         
         embed = discord.Embed(
             title="✅ Saiu da Família!",
@@ -1361,7 +2067,7 @@ async def deixar_familia(interaction: discord.Interaction):
         await interaction.response.send_message(embed=embed, ephemeral=True)
         
     except Exception as e:
-        print(f"Erro ao sair da família: {e}")
+        commands_logger.error(f"Erro ao sair da família: {e}")
         await interaction.response.send_message("❌ Erro ao sair da família!", ephemeral=True)
 
 # ================= FAMILIA COMMAND =================
@@ -1548,108 +2254,127 @@ class TicketPanelView(View):
         return callback
     
     async def create_ticket(self, interaction, ticket_type):
-        """Cria um novo ticket"""
+        """Cria um novo ticket
+        
+        As verificações são feitas em memória (ticket_rate_limiter) e a recusa
+        é respondida direto; senão a interação é adiada (defer) na hora, os
+        canais de texto e voz são criados ao mesmo tempo e uma transação grava
+        o ticket.
+        """
+        started = time.perf_counter()
+        guild, user = interaction.guild, interaction.user
+        key = (guild.id, user.id)
+        if key in tickets_being_created:
+            await interaction.response.send_message("⏳ Seu ticket já está sendo criado!", ephemeral=True)
+            return
+        
+        tickets_being_created.add(key)
+        ticket_channel = voice_channel = None
+        registered = False
         try:
-            # Verificar rate limit
-            can_create, message = await check_rate_limit(interaction.user.id, interaction.guild.id)
-            if not can_create:
-                await interaction.response.send_message(f"❌ {message}", ephemeral=True)
-                return
-            
             # Verificar se já existe um ticket ativo deste tipo
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT channel_id FROM active_tickets 
-                WHERE user_id = ? AND guild_id = ? AND ticket_type = ?
-            """, (str(interaction.user.id), str(interaction.guild.id), ticket_type))
-            existing = cursor.fetchone()
-            conn.close()
-            
-            if existing:
-                channel = interaction.guild.get_channel(int(existing[0]))
+            existing_id = ticket_rate_limiter.active_ticket(guild.id, user.id, ticket_type)
+            if existing_id:
+                channel = guild.get_channel(int(existing_id))
                 if channel:
                     await interaction.response.send_message(
                         f"❌ Você já possui um ticket de {ticket_type} ativo: {channel.mention}", 
                         ephemeral=True
                     )
                     return
+                # O canal foi apagado: fecha o ticket antigo como os outros caminhos de fechamento
+                ticket_info = await db.transaction(_remove_active_ticket, existing_id)
+                untrack_ticket(existing_id)
+                if ticket_info:
+                    # Sem esperar pela API: a interação ainda precisa ser respondida
+                    asyncio.create_task(delete_ticket_voice_channel(guild, ticket_info[2]))
+            
+            # Verificar rate limit
+            can_create, message = await check_rate_limit(user.id, guild.id)
+            if not can_create:
+                await interaction.response.send_message(f"❌ {message}", ephemeral=True)
+                return
             
-            # Criar canal do ticket
+            await interaction.response.defer(ephemeral=True, thinking=True)
+            
+            # Categoria dos tickets
             category = None
-            if hasattr(interaction.guild, 'categories'):
-                for cat in interaction.guild.categories:
+            if hasattr(guild, 'categories'):
+                for cat in guild.categories:
                     if 'ticket' in cat.name.lower():
                         category = cat
                         break
             
             # Configurar permissões
             overwrites = {
-                interaction.guild.default_role: discord.PermissionOverwrite(view_channel=False),
-                interaction.user: discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True),
-                interaction.guild.me: discord.PermissionOverwrite(view_channel=True, send_messages=True, manage_channels=True)
+                guild.default_role: discord.PermissionOverwrite(view_channel=False),
+                user: discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True),
+                guild.me: discord.PermissionOverwrite(view_channel=True, send_messages=True, manage_channels=True)
             }
             
             # Adicionar permissões para staff
-            for role in interaction.guild.roles:
-                if any(staff_name.lower() in role.name.lower() for staff_name in STAFF_ROLE_NAMES):
-                    overwrites[role] = discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True)
+            for role in staff_roles.roles(guild):
+                overwrites[role] = discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True)
             
-            # Criar canal
-            channel_name = f"{ticket_type}-{interaction.user.name}".lower().replace(" ", "-")
-            ticket_channel = await interaction.guild.create_text_channel(
-                name=channel_name,
-                category=category,
-                overwrites=overwrites,
-                topic=f"Ticket de {ticket_type} - {interaction.user.mention}"
+            # Criar os canais de texto e de voz (se configurado) ao mesmo tempo
+            channel_name = f"{ticket_type}-{user.name}".lower().replace(" ", "-")
+            channels_started = time.perf_counter()
+            ticket_channel, voice_channel = await asyncio.gather(
+                guild.create_text_channel(
+                    name=channel_name,
+                    category=category,
+                    overwrites=overwrites,
+                    topic=f"Ticket de {ticket_type} - {user.mention}"
+                ),
+                create_voice_channel(guild, ticket_type, user, category),
+                return_exceptions=True
             )
+            metrics.observe("ticket", "create_channels", time.perf_counter() - channels_started)
+            if isinstance(ticket_channel, BaseException):
+                error, ticket_channel = ticket_channel, None
+                raise error
             
-            # Registrar ticket no banco
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO active_tickets (guild_id, channel_id, user_id, ticket_type, created_at)
-                VALUES (?, ?, ?, ?, datetime('now'))
-            """, (str(interaction.guild.id), str(ticket_channel.id), str(interaction.user.id), ticket_type))
-            conn.commit()
-            conn.close()
-            
-            # Adicionar rate limit
-            await add_rate_limit(interaction.user.id, interaction.guild.id)
+            # Registrar ticket e log numa transação
+            await db.transaction(
+                _register_new_ticket, str(guild.id), str(ticket_channel.id), str(user.id), ticket_type,
+                str(voice_channel.id) if voice_channel else None
+            )
+            registered = True
+            track_new_ticket(guild.id, user.id, ticket_channel.id, ticket_type)
             
             # Criar embed de boas-vindas
             embed = discord.Embed(
                 title=f"🎫 Ticket de {ticket_type.title()}",
-                description=f"Olá {interaction.user.mention}! Seu ticket foi criado com sucesso.\n\nDescreva seu problema ou dúvida e nossa equipe irá ajudá-lo em breve.",
+                description=f"Olá {user.mention}! Seu ticket foi criado com sucesso.\n\nDescreva seu problema ou dúvida e nossa equipe irá ajudá-lo em breve.",
                 color=0x00ff00
             )
             embed.add_field(name="📋 Tipo", value=ticket_type.title(), inline=True)
-            embed.add_field(name="👤 Usuário", value=interaction.user.mention, inline=True)
+            embed.add_field(name="👤 Usuário", value=user.mention, inline=True)
             embed.add_field(name="🕒 Criado em", value=datetime.now().strftime("%d/%m/%Y %H:%M"), inline=True)
-            
-            # Criar view com botões do ticket
-            ticket_view = TicketView(ticket_type)
-            
-            # Enviar mensagem no canal do ticket
-            await ticket_channel.send(embed=embed, view=ticket_view)
-            
-            # Criar canal de voz se configurado
-            voice_channel = await create_voice_channel(interaction.guild, ticket_type, interaction.user, category)
             if voice_channel:
                 embed.add_field(name="🔊 Canal de Voz", value=voice_channel.mention, inline=False)
-                await ticket_channel.send(f"🔊 Canal de voz criado: {voice_channel.mention}")
-            
-            # Log da ação
-            await log_ticket_action(interaction.guild.id, ticket_channel.id, interaction.user.id, "created", ticket_type)
             
-            await interaction.response.send_message(
-                f"✅ Ticket criado com sucesso! {ticket_channel.mention}", 
-                ephemeral=True
+            # Mensagem no canal do ticket e resposta ao usuário ao mesmo tempo
+            await asyncio.gather(
+                ticket_channel.send(embed=embed, view=TicketView(ticket_type)),
+                interaction.followup.send(f"✅ Ticket criado com sucesso! {ticket_channel.mention}", ephemeral=True)
             )
+            await dispatch_ticket_queue(guild)
+            metrics.observe("ticket", "create", time.perf_counter() - started)
             
         except Exception as e:
-            print(f"Erro ao criar ticket: {e}")
-            await interaction.response.send_message("❌ Erro ao criar ticket!", ephemeral=True)
+            tickets_logger.error(f"Erro ao criar ticket: {e}")
+            if not registered:
+                await asyncio.gather(
+                    *(channel.delete() for channel in (ticket_channel, voice_channel) if channel),
+                    return_exceptions=True
+                )
+            if interaction.response.is_done():
+                await interaction.followup.send("❌ Erro ao criar ticket!", ephemeral=True)
+            else:
+                await interaction.response.send_message("❌ Erro ao criar ticket!", ephemeral=True)
+        finally:
+            tickets_being_created.discard(key)
 
 class TicketView(View):
     """View para gerenciar tickets individuais"""
@@ -1662,16 +2387,12 @@ class TicketView(View):
     async def close_ticket(self, interaction: discord.Interaction, button: Button):
         """Fecha o ticket atual"""
         # Verificar se é staff ou dono do ticket
-        is_staff = any(role.name in STAFF_ROLE_NAMES for role in interaction.user.roles)
+        is_staff = staff_roles.is_staff(interaction.user)
         
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
+        result = await db.fetchone(
             "SELECT user_id FROM active_tickets WHERE channel_id = ?", 
             (str(interaction.channel.id),)
         )
-        result = cursor.fetchone()
-        conn.close()
         
         is_owner = result and str(interaction.user.id) == result[0]
         
@@ -1691,7 +2412,7 @@ class TicketView(View):
     async def add_member(self, interaction: discord.Interaction, button: Button):
         """Adiciona um membro ao ticket"""
         # Verificar se é staff
-        is_staff = any(role.name in STAFF_ROLE_NAMES for role in interaction.user.roles)
+        is_staff = staff_roles.is_staff(interaction.user)
         if not is_staff:
             await interaction.response.send_message("❌ Apenas staff pode adicionar membros!", ephemeral=True)
             return
@@ -1704,19 +2425,23 @@ class TicketView(View):
         """Cria um canal de voz para o ticket"""
         try:
             # Verificar se já existe canal de voz
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT user_id FROM active_tickets WHERE channel_id = ?", 
+            result = await db.fetchone(
+                "SELECT user_id, voice_channel_id FROM active_tickets WHERE channel_id = ?", 
                 (str(interaction.channel.id),)
             )
-            result = cursor.fetchone()
-            conn.close()
             
             if not result:
                 await interaction.response.send_message("❌ Ticket não encontrado!", ephemeral=True)
                 return
             
+            existing_voice = result[1] and interaction.guild.get_channel(int(result[1]))
+            if existing_voice:
+                await interaction.response.send_message(
+                    f"🔊 Este ticket já tem um canal de voz: {existing_voice.mention}", 
+                    ephemeral=True
+                )
+                return
+            
             user = interaction.guild.get_member(int(result[0]))
             if not user:
                 await interaction.response.send_message("❌ Usuário não encontrado!", ephemeral=True)
@@ -1731,6 +2456,10 @@ class TicketView(View):
             )
             
             if voice_channel:
+                await db.execute(
+                    "UPDATE active_tickets SET voice_channel_id = ? WHERE channel_id = ?",
+                    (str(voice_channel.id), str(interaction.channel.id))
+                )
                 await interaction.response.send_message(
                     f"🔊 Canal de voz criado: {voice_channel.mention}", 
                     ephemeral=False
@@ -1742,8 +2471,60 @@ class TicketView(View):
                 )
                 
         except Exception as e:
-            print(f"Erro ao criar call: {e}")
+            tickets_logger.error(f"Erro ao criar call: {e}")
             await interaction.response.send_message("❌ Erro ao criar canal de voz!", ephemeral=True)
+    
+    @discord.ui.button(label="📈 Prioridade", style=discord.ButtonStyle.blurple, emoji="📈")
+    async def set_priority(self, interaction: discord.Interaction, button: Button):
+        """Muda a prioridade do ticket na fila de atendimento"""
+        if not staff_roles.is_staff(interaction.user):
+            await interaction.response.send_message("❌ Apenas staff pode mudar a prioridade!", ephemeral=True)
+            return
+        
+        current = ticket_queue.priority(interaction.channel.id)
+        if current is None:
+            await interaction.response.send_message("❌ Ticket não encontrado!", ephemeral=True)
+            return
+        
+        await interaction.response.send_message(
+            f"📈 Prioridade atual: **{TICKET_PRIORITY_LABELS[current]}**",
+            view=TicketPriorityView(current),
+            ephemeral=True
+        )
+
+class TicketPriorityView(View):
+    """Seleção da prioridade de um ticket"""
+    
+    def __init__(self, current):
+        super().__init__(timeout=60)
+        select = Select(
+            placeholder="Escolha a prioridade",
+            options=[
+                discord.SelectOption(label=label, value=priority, default=priority == current)
+                for priority, label in TICKET_PRIORITY_LABELS.items()
+            ]
+        )
+        select.callback = self.select_priority
+        self.select = select
+        self.add_item(select)
+    
+    async def select_priority(self, interaction: discord.Interaction):
+        priority = self.select.values[0]
+        try:
+            if not ticket_queue.set_priority(interaction.channel.id, priority):
+                await interaction.response.edit_message(content="❌ Ticket não encontrado!", view=None)
+                return
+            await db.execute(
+                "UPDATE active_tickets SET priority = ? WHERE channel_id = ?",
+                (priority, str(interaction.channel.id))
+            )
+            log_ticket_action(interaction.guild.id, interaction.channel.id, interaction.user.id, "priority", priority)
+            await interaction.response.edit_message(
+                content=f"✅ Prioridade alterada para **{TICKET_PRIORITY_LABELS[priority]}**", view=None
+            )
+        except Exception as e:
+            tickets_logger.error(f"Erro ao mudar prioridade do ticket: {e}")
+            await interaction.response.send_message("❌ Erro ao mudar a prioridade!", ephemeral=True)
 
 class ConfirmCloseView(View):
     """View para confirmar fechamento de ticket"""
@@ -1754,32 +2535,20 @@ class ConfirmCloseView(View):
     @discord.ui.button(label="✅ Confirmar", style=discord.ButtonStyle.red, emoji="✅")
     async def confirm(self, interaction: discord.Interaction, button: Button):
         """Confirma o fechamento do ticket"""
+        # Responder antes do backup: o histórico pode demorar mais que o prazo da interação
+        await interaction.response.defer()
         try:
-            # Fazer backup das mensagens
-            backup_file = await backup_ticket_messages(interaction.channel)
-            
             # Remover do banco de dados
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
+            ticket_info = await db.transaction(_remove_active_ticket, interaction.channel.id)
+            untrack_ticket(interaction.channel.id)
+            user_id, ticket_type, voice_channel_id = ticket_info or (None, None, None)
             
-            # Buscar informações do ticket
-            cursor.execute(
-                "SELECT user_id, ticket_type FROM active_tickets WHERE channel_id = ?", 
-                (str(interaction.channel.id),)
-            )
-            ticket_info = cursor.fetchone()
+            # Fazer backup das mensagens em segundo plano (termina antes de o canal ser apagado)
+            backup = asyncio.create_task(backup_ticket_messages(interaction.channel, user_id, ticket_type))
             
             if ticket_info:
-                user_id, ticket_type = ticket_info
-                
-                # Remover ticket ativo
-                cursor.execute(
-                    "DELETE FROM active_tickets WHERE channel_id = ?", 
-                    (str(interaction.channel.id),)
-                )
-                
                 # Log da ação
-                await log_ticket_action(
+                log_ticket_action(
                     interaction.guild.id, 
                     interaction.channel.id, 
                     interaction.user.id, 
@@ -1787,22 +2556,17 @@ class ConfirmCloseView(View):
                     f"Ticket de {ticket_type} fechado"
                 )
             
-            conn.commit()
-            conn.close()
+                # Deletar canal de voz relacionado
+                await delete_ticket_voice_channel(interaction.guild, voice_channel_id)
             
-            # Buscar e deletar canal de voz relacionado
-            for channel in interaction.guild.voice_channels:
-                if f"{ticket_type}-{interaction.guild.get_member(int(user_id)).name}" in channel.name.lower():
-                    await channel.delete()
-                    break
-            
-            await interaction.response.send_message("🔒 Ticket será fechado em 5 segundos...")
+            await interaction.followup.send("🔒 Ticket será fechado em 5 segundos...")
             await asyncio.sleep(5)
+            await backup
             await interaction.channel.delete()
             
         except Exception as e:
-            print(f"Erro ao fechar ticket: {e}")
-            await interaction.response.send_message("❌ Erro ao fechar ticket!", ephemeral=True)
+            tickets_logger.error(f"Erro ao fechar ticket: {e}")
+            await interaction.followup.send("❌ Erro ao fechar ticket!", ephemeral=True)
     
     @discord.ui.button(label="❌ Cancelar", style=discord.ButtonStyle.gray, emoji="❌")
     async def cancel(self, interaction: discord.Interaction, button: Button):
@@ -1858,7 +2622,7 @@ class AddMemberModal(Modal):
             )
             
             # Log da ação
-            await log_ticket_action(
+            log_ticket_action(
                 interaction.guild.id, 
                 interaction.channel.id, 
                 interaction.user.id, 
@@ -1867,7 +2631,7 @@ class AddMemberModal(Modal):
             )
             
         except Exception as e:
-            print(f"Erro ao adicionar membro: {e}")
+            tickets_logger.error(f"Erro ao adicionar membro: {e}")
             await interaction.response.send_message("❌ Erro ao adicionar membro!", ephemeral=True)
 
 class MigrationModal(Modal):
@@ -1917,18 +2681,6 @@ class MigrationModal(Modal):
         await interaction.response.send_message(embed=embed)
 
 # ================= ECONOMIA COMMANDS =================
-def ensure_user_exists(user_id):
-    """Garante que o usuário existe no banco"""
-    try:
-        conn = get_db()
-        conn.execute(
-            "INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,)
-        )
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Erro ao criar usuário: {e}")
-
 @bot.command(name='carteira', aliases=['wallet', 'bal', 'balance'])
 @cooldown(1, 3, BucketType.user)
 async def carteira(ctx, user: discord.Member = None):
@@ -1936,20 +2688,9 @@ async def carteira(ctx, user: discord.Member = None):
     if user is None:
         user = ctx.author
     
-    ensure_user_exists(user.id)
-    
     try:
-        conn = get_db()
-        user_data = conn.execute(
-            "SELECT money, bank, rep, level FROM users WHERE user_id = ?", (user.id,)
-        ).fetchone()
-        conn.close()
-        
-        if not user_data:
-            money = bank = rep = 0
-            level = 1
-        else:
-            money, bank, rep, level = user_data
+        profile = await economy.profile(user.id)
+        money, bank, rep, level = profile["money"], profile["bank"], profile["rep"], profile["level"]
         
         total = money + bank
         
@@ -1967,27 +2708,22 @@ async def carteira(ctx, user: discord.Member = None):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro na carteira: {e}")
+        commands_logger.error(f"Erro na carteira: {e}")
         await ctx.send("❌ Erro ao buscar informações da carteira!")
 
 @bot.command(name='daily', aliases=['diario'])
-@cooldown(1, 86400, BucketType.user)  # 24 horas
 async def daily(ctx):
-    """Recompensa diária"""
-    user_id = ctx.author.id
-    ensure_user_exists(user_id)
+    """Recompensa diária (a cada 24 horas)"""
+    remaining = await cooldowns.acquire(ctx.author.id, "last_daily")
+    if remaining:
+        await ctx.send(f"⏳ Você já coletou o daily! Volte em **{format_cooldown(remaining)}**.")
+        return
     
     # Valor aleatório entre 100-500
     amount = random.randint(100, 500)
     
     try:
-        conn = get_db()
-        conn.execute(
-            "UPDATE users SET money = money + ?, last_daily = ? WHERE user_id = ?",
-            (amount, datetime.now().isoformat(), user_id)
-        )
-        conn.commit()
-        conn.close()
+        await economy.credit(ctx.author.id, amount, "last_daily")
         
         embed = discord.Embed(
             title="💰 Daily Coletado!",
@@ -1997,7 +2733,8 @@ async def daily(ctx):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro no daily: {e}")
+        cooldowns.release(ctx.author.id, "last_daily")
+        commands_logger.error(f"Erro no daily: {e}")
         await ctx.send("❌ Erro ao coletar daily!")
 
 @bot.command(name='depositar', aliases=['dep'])
@@ -2008,26 +2745,11 @@ async def depositar(ctx, amount: int):
         await ctx.send("❌ Quantidade inválida!")
         return
     
-    user_id = ctx.author.id
-    ensure_user_exists(user_id)
-    
     try:
-        conn = get_db()
-        user_data = conn.execute(
-            "SELECT money FROM users WHERE user_id = ?", (user_id,)
-        ).fetchone()
-        
-        if not user_data or user_data[0] < amount:
+        if not await economy.deposit(ctx.author.id, amount):
             await ctx.send("❌ Você não tem dinheiro suficiente!")
             return
         
-        conn.execute(
-            "UPDATE users SET money = money - ?, bank = bank + ? WHERE user_id = ?",
-            (amount, amount, user_id)
-        )
-        conn.commit()
-        conn.close()
-        
         embed = discord.Embed(
             title="🏦 Depósito Realizado!",
             description=f"Você depositou **${amount:,}** no banco!",
@@ -2036,9 +2758,63 @@ async def depositar(ctx, amount: int):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro no depósito: {e}")
+        commands_logger.error(f"Erro no depósito: {e}")
         await ctx.send("❌ Erro ao depositar!")
 
+@bot.command(name='top', aliases=['ricos', 'leaderboard'])
+@cooldown(1, 5, BucketType.user)
+async def top(ctx):
+    """Ranking de dinheiro total (carteira + banco)"""
+    try:
+        rows = leaderboard.cached_top()
+        if rows is None:
+            rows = await db.run(leaderboard.load_top)
+        
+        medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+        lines = [
+            f"{medals.get(position, f'**{position}.**')} <@{row['user_id']}> — ${row['total']:,}"
+            for position, row in enumerate(rows, start=1)
+        ]
+        embed = discord.Embed(
+            title=f"🏆 Top {LEADERBOARD_TOP_SIZE} - Mais Ricos",
+            description="\n".join(lines) or "Ninguém tem dinheiro ainda!",
+            color=0xf1c40f
+        )
+        embed.set_footer(text=f"Use {ctx.prefix}rank para ver sua posição")
+        await ctx.send(embed=embed)
+        
+    except Exception as e:
+        commands_logger.error(f"Erro no ranking: {e}")
+        await ctx.send("❌ Erro ao buscar o ranking!")
+
+@bot.command(name='rank', aliases=['posicao'])
+@cooldown(1, 3, BucketType.user)
+async def rank(ctx, user: discord.Member = None):
+    """Mostra a posição do usuário no ranking de dinheiro"""
+    if user is None:
+        user = ctx.author
+    
+    try:
+        profile = await economy.profile(user.id)
+        total = profile["money"] + profile["bank"]
+        if total <= 0:
+            await ctx.send(f"📉 {user.display_name} ainda não está no ranking!")
+            return
+        
+        position, count = leaderboard.rank(total)
+        embed = discord.Embed(
+            title=f"🏆 Ranking de {user.display_name}",
+            description=f"Posição **#{position:,}** de {count:,}",
+            color=0xf1c40f
+        )
+        embed.add_field(name="💎 Total", value=f"${total:,}", inline=True)
+        embed.set_thumbnail(url=user.display_avatar.url)
+        await ctx.send(embed=embed)
+        
+    except Exception as e:
+        commands_logger.error(f"Erro no rank: {e}")
+        await ctx.send("❌ Erro ao buscar a posição!")
+
 @bot.command(name='empregos', aliases=['jobs'])
 @cooldown(1, 5, BucketType.user)
 async def empregos(ctx):
@@ -2067,11 +2843,12 @@ async def empregos(ctx):
     await ctx.send(embed=embed)
 
 @bot.command(name='trabalhar', aliases=['work'])
-@cooldown(1, 3600, BucketType.user)  # 1 hora
 async def trabalhar(ctx):
-    """Trabalha para ganhar dinheiro"""
-    user_id = ctx.author.id
-    ensure_user_exists(user_id)
+    """Trabalha para ganhar dinheiro (a cada 1 hora)"""
+    remaining = await cooldowns.acquire(ctx.author.id, "last_work")
+    if remaining:
+        await ctx.send(f"⏳ Você está cansado! Volte a trabalhar em **{format_cooldown(remaining)}**.")
+        return
     
     jobs = [
         {"name": "🍕 Entregou pizzas", "pay": (50, 150)},
@@ -2085,13 +2862,7 @@ async def trabalhar(ctx):
     payment = random.randint(*job["pay"])
     
     try:
-        conn = get_db()
-        conn.execute(
-            "UPDATE users SET money = money + ?, last_work = ? WHERE user_id = ?",
-            (payment, datetime.now().isoformat(), user_id)
-        )
-        conn.commit()
-        conn.close()
+        await economy.credit(ctx.author.id, payment, "last_work")
         
         embed = discord.Embed(
             title="💼 Trabalho Concluído!",
@@ -2101,7 +2872,8 @@ async def trabalhar(ctx):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro no trabalho: {e}")
+        cooldowns.release(ctx.author.id, "last_work")
+        commands_logger.error(f"Erro no trabalho: {e}")
         await ctx.send("❌ Erro ao trabalhar!")
 
 # ================= MODERAÇÃO COMMANDS =================
@@ -2110,13 +2882,10 @@ async def trabalhar(ctx):
 async def warn(ctx, user: discord.Member, *, reason: str = "Sem motivo especificado"):
     """Adverte um usuário"""
     try:
-        conn = get_db()
-        conn.execute(
-            "INSERT INTO warnings (user_id, server_id, moderator_id, reason, timestamp) VALUES (?, ?, ?, ?, ?)",
+        await db.execute(
+            "INSERT INTO warnings (user_id, server_id, moderator_id, reason, warned_at) VALUES (?, ?, ?, ?, ?)",
             (user.id, ctx.guild.id, ctx.author.id, reason, datetime.now().isoformat())
         )
-        conn.commit()
-        conn.close()
         
         embed = discord.Embed(
             title="⚠️ Usuário Advertido",
@@ -2141,7 +2910,7 @@ async def warn(ctx, user: discord.Member, *, reason: str = "Sem motivo especific
             pass
             
     except Exception as e:
-        print(f"Erro ao advertir: {e}")
+        commands_logger.error(f"Erro ao advertir: {e}")
         await ctx.send("❌ Erro ao advertir usuário!")
 
 @bot.command(name='kick', aliases=['expulsar'])
@@ -2162,7 +2931,7 @@ async def kick(ctx, user: discord.Member, *, reason: str = "Sem motivo especific
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao expulsar: {e}")
+        commands_logger.error(f"Erro ao expulsar: {e}")
         await ctx.send("❌ Erro ao expulsar usuário!")
 
 @bot.command(name='ban', aliases=['banir'])
@@ -2183,7 +2952,7 @@ async def ban(ctx, user: discord.Member, *, reason: str = "Sem motivo especifica
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao banir: {e}")
+        commands_logger.error(f"Erro ao banir: {e}")
         await ctx.send("❌ Erro ao banir usuário!")
 
 @bot.command(name='unban')
@@ -2202,7 +2971,7 @@ async def unban(ctx, *, user_id: int):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao desbanir: {e}")
+        commands_logger.error(f"Erro ao desbanir: {e}")
         await ctx.send("❌ Erro ao desbanir usuário!")
 
 @bot.command(name='unbanall')
@@ -2225,7 +2994,7 @@ async def unban_all(ctx):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao desbanir todos: {e}")
+        commands_logger.error(f"Erro ao desbanir todos: {e}")
         await ctx.send("❌ Erro ao desbanir usuários!")
 
 @bot.command(name='mute')
@@ -2262,7 +3031,7 @@ async def mute(ctx, user: discord.Member, duration: int = None, *, reason: str =
             await user.remove_roles(mute_role)
             
     except Exception as e:
-        print(f"Erro ao mutar: {e}")
+        commands_logger.error(f"Erro ao mutar: {e}")
         await ctx.send("❌ Erro ao mutar usuário!")
 
 @bot.command(name='unmute')
@@ -2284,7 +3053,7 @@ async def unmute(ctx, user: discord.Member):
             await ctx.send("❌ Usuário não está mutado!")
             
     except Exception as e:
-        print(f"Erro ao desmutar: {e}")
+        commands_logger.error(f"Erro ao desmutar: {e}")
         await ctx.send("❌ Erro ao desmutar usuário!")
 
 @bot.command(name='mutecall', aliases=['vmute'])
@@ -2302,7 +3071,7 @@ async def mute_call(ctx, user: discord.Member):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao mutar na call: {e}")
+        commands_logger.error(f"Erro ao mutar na call: {e}")
         await ctx.send("❌ Erro ao mutar usuário na call!")
 
 @bot.command(name='unmutecall', aliases=['vunmute'])
@@ -2320,7 +3089,7 @@ async def unmute_call(ctx, user: discord.Member):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao desmutar na call: {e}")
+        commands_logger.error(f"Erro ao desmutar na call: {e}")
         await ctx.send("❌ Erro ao desmutar usuário na call!")
 
 @bot.command(name='clear', aliases=['cl'])
@@ -2328,18 +3097,14 @@ async def clear(ctx, amount: int = None):
     """Limpa mensagens do canal ou abre painel de famílias"""
     # Verificar se este comando está sendo usado como family_command personalizado
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT family_command FROM server_configs WHERE guild_id = ?", (ctx.guild.id,))
-        result = cursor.fetchone()
-        conn.close()
+        family_command = guild_settings.get(ctx.guild.id).family_command
         
         # Se o family_command configurado for 'cl' e não foi passado amount, abrir painel
-        if result and result[0] == 'cl' and amount is None:
+        if family_command == 'cl' and amount is None:
             await familia_panel(ctx)
             return
     except Exception as e:
-        print(f"Erro ao verificar configuração: {e}")
+        commands_logger.error(f"Erro ao verificar configuração: {e}")
     
     # Verificar permissões para limpeza de mensagens
     if not ctx.author.guild_permissions.manage_messages:
@@ -2367,7 +3132,7 @@ async def clear(ctx, amount: int = None):
         await msg.delete()
         
     except Exception as e:
-        print(f"Erro ao limpar: {e}")
+        commands_logger.error(f"Erro ao limpar: {e}")
         await ctx.send("❌ Erro ao limpar mensagens!")
 
 @bot.command(name='nuke')
@@ -2395,15 +3160,13 @@ async def nuke(ctx):
         await new_channel.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao recriar canal: {e}")
+        commands_logger.error(f"Erro ao recriar canal: {e}")
 
 @bot.command(name='setprefix')
 @commands.has_permissions(administrator=True)
 async def setprefix(ctx, novo_prefixo: str, comando_familia: str = None):
     """Define um novo prefixo para o servidor"""
     try:
-        from local_api import load_guild_config, save_guild_config
-        
         # Validar o prefixo
         if len(novo_prefixo) > 5:
             await ctx.send("❌ O prefixo não pode ter mais de 5 caracteres!")
@@ -2413,43 +3176,37 @@ async def setprefix(ctx, novo_prefixo: str, comando_familia: str = None):
             await ctx.send("❌ O prefixo não pode conter espaços!")
             return
         
-        # Carregar configuração atual
-        config = load_guild_config(str(ctx.guild.id))
+        # Definir novo prefixo (e o comando de família, se especificado)
+        fields = {'prefix': novo_prefixo}
+        if comando_familia:
+            fields['family_command'] = comando_familia
         
-        # Definir novo prefixo
-        config['prefix'] = novo_prefixo
+        # Salvar no banco e no cache usado pelo get_prefix
+        await guild_settings.update(ctx.guild.id, fields)
         
-        # Se foi especificado um comando para família, salvar também
-        if comando_familia:
-            config['comando_familia'] = comando_familia
+        embed = discord.Embed(
+            title="✅ Prefixo Alterado!",
+            description=f"Novo prefixo: `{novo_prefixo}`",
+            color=0x00ff00
+        )
         
-        # Salvar configuração
-        if save_guild_config(str(ctx.guild.id), config):
-            embed = discord.Embed(
-                title="✅ Prefixo Alterado!",
-                description=f"Novo prefixo: `{novo_prefixo}`",
-                color=0x00ff00
-            )
-            
-            if comando_familia:
-                embed.add_field(
-                    name="Comando Família",
-                    value=f"`{novo_prefixo}{comando_familia}`",
-                    inline=False
-                )
-            
+        if comando_familia:
             embed.add_field(
-                name="Exemplo de uso",
-                value=f"`{novo_prefixo}help` - Ver comandos\n`{novo_prefixo}f` - Painel de famílias",
+                name="Comando Família",
+                value=f"`{novo_prefixo}{comando_familia}`",
                 inline=False
             )
-            
-            await ctx.send(embed=embed)
-        else:
-            await ctx.send("❌ Erro ao salvar o novo prefixo!")
+        
+        embed.add_field(
+            name="Exemplo de uso",
+            value=f"`{novo_prefixo}help` - Ver comandos\n`{novo_prefixo}f` - Painel de famílias",
+            inline=False
+        )
+        
+        await ctx.send(embed=embed)
             
     except Exception as e:
-        print(f"Erro ao definir prefixo: {e}")
+        commands_logger.error(f"Erro ao definir prefixo: {e}")
         await ctx.send("❌ Erro ao definir o novo prefixo!")
 
 @bot.command(name='lock')
@@ -2467,7 +3224,7 @@ async def lock(ctx):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao trancar canal: {e}")
+        commands_logger.error(f"Erro ao trancar canal: {e}")
         await ctx.send("❌ Erro ao trancar canal!")
 
 @bot.command(name='unlock')
@@ -2485,7 +3242,7 @@ async def unlock(ctx):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao destrancar canal: {e}")
+        commands_logger.error(f"Erro ao destrancar canal: {e}")
         await ctx.send("❌ Erro ao destrancar canal!")
 
 # ================= SOCIAL COMMANDS =================
@@ -2509,23 +3266,10 @@ async def perfil(ctx, user: discord.Member = None):
     if user is None:
         user = ctx.author
     
-    ensure_user_exists(user.id)
-    
     try:
-        conn = get_db()
-        user_data = conn.execute(
-            "SELECT money, bank, rep, level, about_me FROM users WHERE user_id = ?", (user.id,)
-        ).fetchone()
-        conn.close()
-        
-        if not user_data:
-            money = bank = rep = 0
-            level = 1
-            about_me = "Nenhuma descrição definida."
-        else:
-            money, bank, rep, level, about_me = user_data
-            if not about_me:
-                about_me = "Nenhuma descrição definida."
+        profile = await economy.profile(user.id)
+        money, bank, rep, level = profile["money"], profile["bank"], profile["rep"], profile["level"]
+        about_me = profile["about_me"] or "Nenhuma descrição definida."
         
         total = money + bank
         
@@ -2542,27 +3286,23 @@ async def perfil(ctx, user: discord.Member = None):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro no perfil: {e}")
+        commands_logger.error(f"Erro no perfil: {e}")
         await ctx.send("❌ Erro ao buscar perfil!")
 
 @bot.command(name='rep', aliases=['reputacao'])
-@cooldown(1, 86400, BucketType.user)  # 24 horas
 async def rep(ctx, user: discord.Member):
-    """Dá reputação para um usuário"""
+    """Dá reputação para um usuário (uma vez a cada 24 horas)"""
     if user.id == ctx.author.id:
         await ctx.send("❌ Você não pode dar reputação para si mesmo!")
         return
     
-    ensure_user_exists(user.id)
+    remaining = await cooldowns.acquire(ctx.author.id, "last_rep")
+    if remaining:
+        await ctx.send(f"⏳ Você já deu reputação hoje! Tente de novo em **{format_cooldown(remaining)}**.")
+        return
     
     try:
-        conn = get_db()
-        conn.execute(
-            "UPDATE users SET rep = rep + 1, last_rep = ? WHERE user_id = ?",
-            (datetime.now().isoformat(), user.id)
-        )
-        conn.commit()
-        conn.close()
+        await economy.give_rep(ctx.author.id, user.id)
         
         embed = discord.Embed(
             title="⭐ Reputação Dada!",
@@ -2572,7 +3312,8 @@ async def rep(ctx, user: discord.Member):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro na reputação: {e}")
+        cooldowns.release(ctx.author.id, "last_rep")
+        commands_logger.error(f"Erro na reputação: {e}")
         await ctx.send("❌ Erro ao dar reputação!")
 
 @bot.command(name='sobremim', aliases=['aboutme'])
@@ -2582,17 +3323,8 @@ async def sobremim(ctx, *, texto: str):
         await ctx.send("❌ A descrição deve ter no máximo 200 caracteres!")
         return
     
-    user_id = ctx.author.id
-    ensure_user_exists(user_id)
-    
     try:
-        conn = get_db()
-        conn.execute(
-            "UPDATE users SET about_me = ? WHERE user_id = ?",
-            (texto, user_id)
-        )
-        conn.commit()
-        conn.close()
+        await economy.set_about_me(ctx.author.id, texto)
         
         embed = discord.Embed(
             title="✅ Descrição Atualizada!",
@@ -2602,7 +3334,7 @@ async def sobremim(ctx, *, texto: str):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao atualizar descrição: {e}")
+        commands_logger.error(f"Erro ao atualizar descrição: {e}")
         await ctx.send("❌ Erro ao atualizar descrição!")
 
 @bot.command(name='membersrole')
@@ -2872,9 +3604,7 @@ async def remove_role(ctx, user: discord.Member, *, role_name: str):
 @commands.check(check_admin)
 async def primeira_dama(ctx, user: discord.Member, *, cargo_name: str = "Primeira Dama"):
     """Define primeira dama do servidor"""
-    try:
-        conn = get_db()
-        
+    def definir_pd(conn):
         # Remove current PD
         conn.execute(
             "UPDATE primeira_dama SET active = 0 WHERE server_id = ?", (ctx.guild.id,)
@@ -2885,9 +3615,9 @@ async def primeira_dama(ctx, user: discord.Member, *, cargo_name: str = "Primeir
             "INSERT OR REPLACE INTO primeira_dama (server_id, user_id, cargo_name) VALUES (?, ?, ?)",
             (ctx.guild.id, user.id, cargo_name)
         )
-        
-        conn.commit()
-        conn.close()
+    
+    try:
+        await db.transaction(definir_pd)
         
         embed = discord.Embed(
             title="👑 Primeira Dama Definida!",
@@ -2897,24 +3627,45 @@ async def primeira_dama(ctx, user: discord.Member, *, cargo_name: str = "Primeir
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao definir PD: {e}")
+        commands_logger.error(f"Erro ao definir PD: {e}")
         await ctx.send("❌ Erro ao definir primeira dama!")
 
 # ================= VIP SYSTEM =================
+# Status VIP (users.vip) guardado por alguns minutos: o prefixo de família o consulta a cada uso
+VIP_CACHE_TTL = 300
+VIP_CACHE_SWEEP_SECONDS = 600   # intervalo mínimo entre limpezas das entradas vencidas
+vip_status_cache: Dict[str, tuple] = {}
+_vip_cache_next_sweep = time.monotonic() + VIP_CACHE_SWEEP_SECONDS
+
+async def is_vip_user(user_id) -> bool:
+    """Retorna se o usuário tem VIP, consultando o banco no máximo uma vez por VIP_CACHE_TTL"""
+    global _vip_cache_next_sweep
+    user_id = str(user_id)
+    cached = vip_status_cache.get(user_id)
+    now = time.monotonic()
+    if cached is not None and cached[1] > now:
+        return cached[0]
+    vip = await db.fetchval("SELECT vip FROM users WHERE user_id = ?", (user_id,))
+    is_vip = vip == 1
+    if now >= _vip_cache_next_sweep:
+        # Quem não usa o prefixo há mais de VIP_CACHE_TTL sai do cache
+        for key in [key for key, (_, expires) in vip_status_cache.items() if expires <= now]:
+            del vip_status_cache[key]
+        _vip_cache_next_sweep = now + VIP_CACHE_SWEEP_SECONDS
+    vip_status_cache[user_id] = (is_vip, now + VIP_CACHE_TTL)
+    return is_vip
+
 @bot.command(name='addvip')
 @commands.check(check_admin)
 async def add_vip(ctx, user: discord.Member, days: int = 30):
     """Adiciona VIP a um usuário"""
     try:
-        conn = get_db()
         expiry_date = datetime.now() + timedelta(days=days)
         
-        conn.execute(
+        await db.execute(
             "INSERT OR REPLACE INTO vip_users (user_id, server_id, expiry_date) VALUES (?, ?, ?)",
             (user.id, ctx.guild.id, expiry_date.isoformat())
         )
-        conn.commit()
-        conn.close()
         
         embed = discord.Embed(
             title="💎 VIP Adicionado!",
@@ -2924,7 +3675,7 @@ async def add_vip(ctx, user: discord.Member, days: int = 30):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao adicionar VIP: {e}")
+        commands_logger.error(f"Erro ao adicionar VIP: {e}")
         await ctx.send("❌ Erro ao adicionar VIP!")
 
 @bot.command(name='removevip')
@@ -2932,13 +3683,10 @@ async def add_vip(ctx, user: discord.Member, days: int = 30):
 async def remove_vip(ctx, user: discord.Member):
     """Remove VIP de um usuário"""
     try:
-        conn = get_db()
-        conn.execute(
+        await db.execute(
             "DELETE FROM vip_users WHERE user_id = ? AND server_id = ?",
             (user.id, ctx.guild.id)
         )
-        conn.commit()
-        conn.close()
         
         embed = discord.Embed(
             title="❌ VIP Removido!",
@@ -2948,7 +3696,7 @@ async def remove_vip(ctx, user: discord.Member):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao remover VIP: {e}")
+        commands_logger.error(f"Erro ao remover VIP: {e}")
         await ctx.send("❌ Erro ao remover VIP!")
 
 @bot.command(name='addvipc')
@@ -2956,15 +3704,12 @@ async def remove_vip(ctx, user: discord.Member):
 async def add_vip_config(ctx, user: discord.Member, days: int = 30, *, config: str = "default"):
     """Adiciona VIP com configurações"""
     try:
-        conn = get_db()
         expiry_date = datetime.now() + timedelta(days=days)
         
-        conn.execute(
+        await db.execute(
             "INSERT OR REPLACE INTO vip_users (user_id, server_id, expiry_date, config) VALUES (?, ?, ?, ?)",
             (user.id, ctx.guild.id, expiry_date.isoformat(), config)
         )
-        conn.commit()
-        conn.close()
         
         embed = discord.Embed(
             title="💎 VIP Configurado!",
@@ -2974,7 +3719,7 @@ async def add_vip_config(ctx, user: discord.Member, days: int = 30, *, config: s
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao configurar VIP: {e}")
+        commands_logger.error(f"Erro ao configurar VIP: {e}")
         await ctx.send("❌ Erro ao configurar VIP!")
 
 @bot.command(name='removevipc')
@@ -2982,13 +3727,10 @@ async def add_vip_config(ctx, user: discord.Member, days: int = 30, *, config: s
 async def remove_vip_config(ctx, user: discord.Member):
     """Remove VIP com configurações"""
     try:
-        conn = get_db()
-        conn.execute(
+        await db.execute(
             "DELETE FROM vip_users WHERE user_id = ? AND server_id = ?",
             (user.id, ctx.guild.id)
         )
-        conn.commit()
-        conn.close()
         
         embed = discord.Embed(
             title="❌ VIP Removido!",
@@ -2998,7 +3740,7 @@ async def remove_vip_config(ctx, user: discord.Member):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao remover VIP: {e}")
+        commands_logger.error(f"Erro ao remover VIP: {e}")
         await ctx.send("❌ Erro ao remover VIP!")
 
 @bot.command(name='setvip')
@@ -3006,15 +3748,12 @@ async def remove_vip_config(ctx, user: discord.Member):
 async def set_vip(ctx, user: discord.Member, days: int, *, benefits: str = "Benefícios padrão"):
     """Configura VIP personalizado"""
     try:
-        conn = get_db()
         expiry_date = datetime.now() + timedelta(days=days)
         
-        conn.execute(
+        await db.execute(
             "INSERT OR REPLACE INTO vip_users (user_id, server_id, expiry_date, benefits) VALUES (?, ?, ?, ?)",
             (user.id, ctx.guild.id, expiry_date.isoformat(), benefits)
         )
-        conn.commit()
-        conn.close()
         
         embed = discord.Embed(
             title="💎 VIP Personalizado!",
@@ -3025,7 +3764,7 @@ async def set_vip(ctx, user: discord.Member, days: int, *, benefits: str = "Bene
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao configurar VIP: {e}")
+        commands_logger.error(f"Erro ao configurar VIP: {e}")
         await ctx.send("❌ Erro ao configurar VIP!")
 
 # ================= SISTEMA DE FAMÍLIAS =================
@@ -3034,13 +3773,10 @@ async def set_vip(ctx, user: discord.Member, days: int, *, benefits: str = "Bene
 async def add_family(ctx, *, family_name: str):
     """Cria uma nova família"""
     try:
-        conn = get_db()
-        conn.execute(
+        await db.execute(
             "INSERT INTO families (name, server_id, owner_id, created_at) VALUES (?, ?, ?, ?)",
             (family_name, ctx.guild.id, ctx.author.id, datetime.now().isoformat())
         )
-        conn.commit()
-        conn.close()
         
         embed = discord.Embed(
             title="👨‍👩‍👧‍👦 Família Criada!",
@@ -3050,16 +3786,14 @@ async def add_family(ctx, *, family_name: str):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao criar família: {e}")
+        commands_logger.error(f"Erro ao criar família: {e}")
         await ctx.send("❌ Erro ao criar família!")
 
 @bot.command(name='removefamily')
 @commands.check(check_admin)
 async def remove_family(ctx, *, family_name: str):
     """Remove uma família"""
-    try:
-        conn = get_db()
-        
+    def remover_familia(conn):
         # Remove family and all members
         conn.execute(
             "DELETE FROM family_members WHERE family_id IN (SELECT id FROM families WHERE name = ? AND server_id = ?)",
@@ -3070,9 +3804,9 @@ async def remove_family(ctx, *, family_name: str):
             "DELETE FROM families WHERE name = ? AND server_id = ?",
             (family_name, ctx.guild.id)
         )
-        
-        conn.commit()
-        conn.close()
+    
+    try:
+        await db.transaction(remover_familia)
         
         embed = discord.Embed(
             title="❌ Família Removida!",
@@ -3082,7 +3816,7 @@ async def remove_family(ctx, *, family_name: str):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao remover família: {e}")
+        commands_logger.error(f"Erro ao remover família: {e}")
         await ctx.send("❌ Erro ao remover família!")
 
 # ================= INTEGRAÇÕES SOCIAIS =================
@@ -3156,7 +3890,7 @@ async def ban_gif(ctx, user: discord.Member, *, reason: str = "Sem motivo especi
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro no bangif: {e}")
+        commands_logger.error(f"Erro no bangif: {e}")
         await ctx.send("❌ Erro ao banir usuário!")
 
 # ================= ADMINISTRAÇÃO =================
@@ -3202,7 +3936,7 @@ async def force_clear(ctx, amount: int = 100):
         await msg.delete()
         
     except Exception as e:
-        print(f"Erro na limpeza forçada: {e}")
+        commands_logger.error(f"Erro na limpeza forçada: {e}")
         await ctx.send("❌ Erro na limpeza forçada!")
 
 @bot.command(name='debug')
@@ -3221,6 +3955,73 @@ async def debug(ctx):
     
     await ctx.send(embed=embed)
 
+METRICS_KIND_TITLES = {"command": "⌨️ Comandos", "event": "📡 Eventos", "db": "🗄️ Banco de dados", "ticket": "🎫 Tickets"}
+
+@bot.command(name='metricas', aliases=['metrics', 'latencias'])
+@commands.check(check_admin)
+async def metricas(ctx, tipo: str = None, limite: int = 8):
+    """Latência p50/p95/p99 e número de chamadas por comando, evento e consulta"""
+    if tipo is not None and tipo not in METRICS_KIND_TITLES:
+        await ctx.send(f"❌ Tipo inválido! Use: {', '.join(METRICS_KIND_TITLES)}")
+        return
+    
+    limite = max(1, min(limite, 20))
+    snapshot = metrics.snapshot(tipo, limit=limite)
+    embed = discord.Embed(
+        title="⏱️ Métricas de Latência",
+        description=f"Maiores p99 desde <t:{int(metrics.started_at)}:R> (tempos em ms)",
+        color=0x9b59b6
+    )
+    for kind, rows in snapshot.items():
+        if not rows:
+            continue
+        lines = [f"{'nome':<24}{'qtd':>7}{'p50':>8}{'p95':>8}{'p99':>8}"]
+        for row in rows:
+            lines.append(
+                f"{row['name'][:23]:<24}{row['count']:>7}"
+                f"{row['p50_ms']:>8.1f}{row['p95_ms']:>8.1f}{row['p99_ms']:>8.1f}"
+            )
+        value = "```\n" + "\n".join(lines)[:1000] + "\n```"
+        embed.add_field(name=METRICS_KIND_TITLES.get(kind, kind), value=value, inline=False)
+    if not embed.fields:
+        embed.add_field(name="Sem dados", value="Nenhuma execução registrada ainda.", inline=False)
+    
+    await ctx.send(embed=embed)
+
+@bot.command(name='transcricoes', aliases=['transcripts', 'buscarticket'])
+@commands.check(check_admin)
+async def transcricoes(ctx, pagina: Optional[int] = 1, *, busca: str = None):
+    """Busca nas transcrições arquivadas dos tickets (sem busca, lista as mais recentes)"""
+    try:
+        result = await db.run(search_transcripts, ctx.guild.id, busca, pagina, 5)
+    except Exception as e:
+        tickets_logger.error(f"Erro ao buscar transcrições: {e}")
+        await ctx.send("❌ Erro ao buscar transcrições!")
+        return
+    
+    total_pages = max(1, -(-result["total"] // result["per_page"]))
+    embed = discord.Embed(
+        title="🗂️ Transcrições de Tickets" + (f" - \"{busca}\"" if busca else ""),
+        description=f"{result['total']} resultado(s) • Página {result['page']}/{total_pages}",
+        color=0x3498db
+    )
+    for item in result["results"]:
+        opener = f"<@{item['opener_id']}>" if item["opener_id"] else "desconhecido"
+        header = f"#{item['channel_name'] or item['channel_id']} ({item['ticket_type'] or 'ticket'})"
+        if busca:
+            value = f"**{item['author']}** em {(item['timestamp'] or '')[:16]}\n{item['snippet'][:900]}"
+        else:
+            value = (
+                f"Aberto por {opener} • {item['message_count']} mensagens\n"
+                f"{(item['started_at'] or '?')[:16]} → {(item['ended_at'] or '?')[:16]}"
+            )
+        embed.add_field(name=header, value=value or "-", inline=False)
+    if not result["results"]:
+        embed.add_field(name="Nada encontrado", value="Nenhuma transcrição corresponde à busca.", inline=False)
+    embed.set_footer(text=f"Use {ctx.prefix}transcricoes <página> <busca> para navegar")
+    
+    await ctx.send(embed=embed)
+
 # ================= ESTATÍSTICAS E REGISTROS =================
 @bot.command(name='migracoes', aliases=['migs'])
 async def migracoes(ctx, user: discord.Member = None):
@@ -3229,12 +4030,10 @@ async def migracoes(ctx, user: discord.Member = None):
         user = ctx.author
     
     try:
-        conn = get_db()
-        migrations = conn.execute(
+        migrations = await db.fetchval(
             "SELECT COUNT(*) FROM migrations WHERE user_id = ? AND server_id = ?",
             (user.id, ctx.guild.id)
-        ).fetchone()[0]
-        conn.close()
+        )
         
         embed = discord.Embed(
             title="📊 Migrações",
@@ -3244,7 +4043,7 @@ async def migracoes(ctx, user: discord.Member = None):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao buscar migrações: {e}")
+        commands_logger.error(f"Erro ao buscar migrações: {e}")
         await ctx.send("❌ Erro ao buscar migrações!")
 
 @bot.command(name='migrar')
@@ -3254,13 +4053,10 @@ async def migrar(ctx, user: discord.Member = None):
         user = ctx.author
     
     try:
-        conn = get_db()
-        conn.execute(
+        await db.execute(
             "INSERT INTO migrations (user_id, server_id, migrated_at) VALUES (?, ?, ?)",
             (user.id, ctx.guild.id, datetime.now().isoformat())
         )
-        conn.commit()
-        conn.close()
         
         embed = discord.Embed(
             title="✅ Migração Registrada!",
@@ -3270,7 +4066,7 @@ async def migrar(ctx, user: discord.Member = None):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao registrar migração: {e}")
+        commands_logger.error(f"Erro ao registrar migração: {e}")
         await ctx.send("❌ Erro ao registrar migração!")
 
 @bot.command(name='movchat', aliases=['mov'])
@@ -3280,12 +4076,10 @@ async def movchat(ctx, user: discord.Member = None):
         user = ctx.author
     
     try:
-        conn = get_db()
-        movements = conn.execute(
+        movements = await db.fetchval(
             "SELECT COUNT(*) FROM chat_movements WHERE user_id = ? AND server_id = ?",
             (user.id, ctx.guild.id)
-        ).fetchone()[0]
-        conn.close()
+        )
         
         embed = discord.Embed(
             title="💬 Movimentação no Chat",
@@ -3295,7 +4089,7 @@ async def movchat(ctx, user: discord.Member = None):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao buscar movimentações: {e}")
+        commands_logger.error(f"Erro ao buscar movimentações: {e}")
         await ctx.send("❌ Erro ao buscar movimentações!")
 
 @bot.command(name='movpoints')
@@ -3305,12 +4099,10 @@ async def movpoints(ctx, user: discord.Member = None):
         user = ctx.author
     
     try:
-        conn = get_db()
-        points = conn.execute(
+        points = await db.fetchval(
             "SELECT COALESCE(SUM(points), 0) FROM movement_points WHERE user_id = ? AND server_id = ?",
             (user.id, ctx.guild.id)
-        ).fetchone()[0]
-        conn.close()
+        )
         
         embed = discord.Embed(
             title="🎯 Pontos de Movimentação",
@@ -3320,7 +4112,7 @@ async def movpoints(ctx, user: discord.Member = None):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao buscar pontos: {e}")
+        commands_logger.error(f"Erro ao buscar pontos: {e}")
         await ctx.send("❌ Erro ao buscar pontos!")
 
 @bot.command(name='recrutamentos', aliases=['recs'])
@@ -3330,12 +4122,10 @@ async def recrutamentos(ctx, user: discord.Member = None):
         user = ctx.author
     
     try:
-        conn = get_db()
-        recruitments = conn.execute(
+        recruitments = await db.fetchval(
             "SELECT COUNT(*) FROM recruitments WHERE user_id = ? AND server_id = ?",
             (user.id, ctx.guild.id)
-        ).fetchone()[0]
-        conn.close()
+        )
         
         embed = discord.Embed(
             title="👥 Recrutamentos",
@@ -3345,20 +4135,17 @@ async def recrutamentos(ctx, user: discord.Member = None):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao buscar recrutamentos: {e}")
+        commands_logger.error(f"Erro ao buscar recrutamentos: {e}")
         await ctx.send("❌ Erro ao buscar recrutamentos!")
 
 @bot.command(name='recrutar')
 async def recrutar(ctx, user: discord.Member):
     """Registrar recrutamento"""
     try:
-        conn = get_db()
-        conn.execute(
+        await db.execute(
             "INSERT INTO recruitments (user_id, recruiter_id, server_id, recruited_at) VALUES (?, ?, ?, ?)",
             (user.id, ctx.author.id, ctx.guild.id, datetime.now().isoformat())
         )
-        conn.commit()
-        conn.close()
         
         embed = discord.Embed(
             title="✅ Recrutamento Registrado!",
@@ -3368,20 +4155,17 @@ async def recrutar(ctx, user: discord.Member):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao registrar recrutamento: {e}")
+        commands_logger.error(f"Erro ao registrar recrutamento: {e}")
         await ctx.send("❌ Erro ao registrar recrutamento!")
 
 @bot.command(name='register')
 async def register(ctx, *, activity: str):
     """Registrar atividade"""
     try:
-        conn = get_db()
-        conn.execute(
+        await db.execute(
             "INSERT INTO activity_logs (user_id, server_id, activity, registered_at) VALUES (?, ?, ?, ?)",
             (ctx.author.id, ctx.guild.id, activity, datetime.now().isoformat())
         )
-        conn.commit()
-        conn.close()
         
         embed = discord.Embed(
             title="✅ Atividade Registrada!",
@@ -3391,7 +4175,7 @@ async def register(ctx, *, activity: str):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao registrar atividade: {e}")
+        commands_logger.error(f"Erro ao registrar atividade: {e}")
         await ctx.send("❌ Erro ao registrar atividade!")
 
 @bot.command(name='registers')
@@ -3401,12 +4185,10 @@ async def registers(ctx, user: discord.Member = None):
         user = ctx.author
     
     try:
-        conn = get_db()
-        registers = conn.execute(
+        registers = await db.fetchval(
             "SELECT COUNT(*) FROM activity_logs WHERE user_id = ? AND server_id = ?",
             (user.id, ctx.guild.id)
-        ).fetchone()[0]
-        conn.close()
+        )
         
         embed = discord.Embed(
             title="📋 Registros de Atividade",
@@ -3416,20 +4198,17 @@ async def registers(ctx, user: discord.Member = None):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao buscar registros: {e}")
+        commands_logger.error(f"Erro ao buscar registros: {e}")
         await ctx.send("❌ Erro ao buscar registros!")
 
 @bot.command(name='verificar')
 async def verificar(ctx, user: discord.Member):
     """Verificar usuário"""
     try:
-        conn = get_db()
-        conn.execute(
+        await db.execute(
             "INSERT OR REPLACE INTO verifications (user_id, server_id, verified_by, verified_at) VALUES (?, ?, ?, ?)",
             (user.id, ctx.guild.id, ctx.author.id, datetime.now().isoformat())
         )
-        conn.commit()
-        conn.close()
         
         embed = discord.Embed(
             title="✅ Usuário Verificado!",
@@ -3439,7 +4218,7 @@ async def verificar(ctx, user: discord.Member):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao verificar usuário: {e}")
+        commands_logger.error(f"Erro ao verificar usuário: {e}")
         await ctx.send("❌ Erro ao verificar usuário!")
 
 @bot.command(name='tempo')
@@ -3449,12 +4228,10 @@ async def tempo(ctx, user: discord.Member = None):
         user = ctx.author
     
     try:
-        conn = get_db()
-        time_data = conn.execute(
+        time_data = await db.fetchval(
             "SELECT COALESCE(SUM(time_spent), 0) FROM user_time WHERE user_id = ? AND server_id = ?",
             (user.id, ctx.guild.id)
-        ).fetchone()[0]
-        conn.close()
+        )
         
         hours = time_data // 3600
         minutes = (time_data % 3600) // 60
@@ -3467,7 +4244,7 @@ async def tempo(ctx, user: discord.Member = None):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao buscar tempo: {e}")
+        commands_logger.error(f"Erro ao buscar tempo: {e}")
         await ctx.send("❌ Erro ao buscar tempo!")
 
 # ================= RESET DE DADOS =================
@@ -3476,10 +4253,7 @@ async def tempo(ctx, user: discord.Member = None):
 async def reset_migs(ctx):
     """Resetar migrações"""
     try:
-        conn = get_db()
-        conn.execute("DELETE FROM migrations WHERE server_id = ?", (ctx.guild.id,))
-        conn.commit()
-        conn.close()
+        await db.execute("DELETE FROM migrations WHERE server_id = ?", (ctx.guild.id,))
         
         embed = discord.Embed(
             title="🔄 Migrações Resetadas!",
@@ -3489,7 +4263,7 @@ async def reset_migs(ctx):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao resetar migrações: {e}")
+        commands_logger.error(f"Erro ao resetar migrações: {e}")
         await ctx.send("❌ Erro ao resetar migrações!")
 
 @bot.command(name='resetmovchat')
@@ -3497,10 +4271,7 @@ async def reset_migs(ctx):
 async def reset_movchat(ctx):
     """Resetar movimentação chat"""
     try:
-        conn = get_db()
-        conn.execute("DELETE FROM chat_movements WHERE server_id = ?", (ctx.guild.id,))
-        conn.commit()
-        conn.close()
+        await db.execute("DELETE FROM chat_movements WHERE server_id = ?", (ctx.guild.id,))
         
         embed = discord.Embed(
             title="🔄 Movimentações Resetadas!",
@@ -3510,7 +4281,7 @@ async def reset_movchat(ctx):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao resetar movimentações: {e}")
+        commands_logger.error(f"Erro ao resetar movimentações: {e}")
         await ctx.send("❌ Erro ao resetar movimentações!")
 
 @bot.command(name='resetmovs')
@@ -3518,10 +4289,7 @@ async def reset_movchat(ctx):
 async def reset_movs(ctx):
     """Resetar movimentações"""
     try:
-        conn = get_db()
-        conn.execute("DELETE FROM movement_points WHERE server_id = ?", (ctx.guild.id,))
-        conn.commit()
-        conn.close()
+        await db.execute("DELETE FROM movement_points WHERE server_id = ?", (ctx.guild.id,))
         
         embed = discord.Embed(
             title="🔄 Pontos de Movimentação Resetados!",
@@ -3531,7 +4299,7 @@ async def reset_movs(ctx):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao resetar pontos: {e}")
+        commands_logger.error(f"Erro ao resetar pontos: {e}")
         await ctx.send("❌ Erro ao resetar pontos!")
 
 @bot.command(name='resetrecs')
@@ -3539,10 +4307,7 @@ async def reset_movs(ctx):
 async def reset_recs(ctx):
     """Resetar recrutamentos"""
     try:
-        conn = get_db()
-        conn.execute("DELETE FROM recruitments WHERE server_id = ?", (ctx.guild.id,))
-        conn.commit()
-        conn.close()
+        await db.execute("DELETE FROM recruitments WHERE server_id = ?", (ctx.guild.id,))
         
         embed = discord.Embed(
             title="🔄 Recrutamentos Resetados!",
@@ -3552,7 +4317,7 @@ async def reset_recs(ctx):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao resetar recrutamentos: {e}")
+        commands_logger.error(f"Erro ao resetar recrutamentos: {e}")
         await ctx.send("❌ Erro ao resetar recrutamentos!")
 
 @bot.command(name='resetregisters')
@@ -3560,10 +4325,7 @@ async def reset_recs(ctx):
 async def reset_registers(ctx):
     """Resetar registros"""
     try:
-        conn = get_db()
-        conn.execute("DELETE FROM activity_logs WHERE server_id = ?", (ctx.guild.id,))
-        conn.commit()
-        conn.close()
+        await db.execute("DELETE FROM activity_logs WHERE server_id = ?", (ctx.guild.id,))
         
         embed = discord.Embed(
             title="🔄 Registros Resetados!",
@@ -3573,7 +4335,7 @@ async def reset_registers(ctx):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao resetar registros: {e}")
+        commands_logger.error(f"Erro ao resetar registros: {e}")
         await ctx.send("❌ Erro ao resetar registros!")
 
 @bot.command(name='resetverificacoes')
@@ -3581,10 +4343,7 @@ async def reset_registers(ctx):
 async def reset_verificacoes(ctx):
     """Resetar verificações"""
     try:
-        conn = get_db()
-        conn.execute("DELETE FROM verifications WHERE server_id = ?", (ctx.guild.id,))
-        conn.commit()
-        conn.close()
+        await db.execute("DELETE FROM verifications WHERE server_id = ?", (ctx.guild.id,))
         
         embed = discord.Embed(
             title="🔄 Verificações Resetadas!",
@@ -3594,7 +4353,7 @@ async def reset_verificacoes(ctx):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao resetar verificações: {e}")
+        commands_logger.error(f"Erro ao resetar verificações: {e}")
         await ctx.send("❌ Erro ao resetar verificações!")
 
 @bot.command(name='resettime')
@@ -3602,10 +4361,7 @@ async def reset_verificacoes(ctx):
 async def reset_time(ctx):
     """Resetar tempo"""
     try:
-        conn = get_db()
-        conn.execute("DELETE FROM user_time WHERE server_id = ?", (ctx.guild.id,))
-        conn.commit()
-        conn.close()
+        await db.execute("DELETE FROM user_time WHERE server_id = ?", (ctx.guild.id,))
         
         embed = discord.Embed(
             title="🔄 Tempo Resetado!",
@@ -3615,7 +4371,7 @@ async def reset_time(ctx):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao resetar tempo: {e}")
+        commands_logger.error(f"Erro ao resetar tempo: {e}")
         await ctx.send("❌ Erro ao resetar tempo!")
 
 # ================= SISTEMA DE ADVERTÊNCIAS =================
@@ -3623,21 +4379,20 @@ async def reset_time(ctx):
 @commands.has_permissions(manage_messages=True)
 async def advertence(ctx, user: discord.Member, *, reason: str = "Sem motivo especificado"):
     """Sistema de advertências"""
-    try:
-        conn = get_db()
+    def advertir(conn):
         conn.execute(
             "INSERT INTO warnings (user_id, server_id, moderator_id, reason, warned_at) VALUES (?, ?, ?, ?, ?)",
             (user.id, ctx.guild.id, ctx.author.id, reason, datetime.now().isoformat())
         )
-        conn.commit()
         
         # Count total warnings
-        warning_count = conn.execute(
+        return conn.execute(
             "SELECT COUNT(*) FROM warnings WHERE user_id = ? AND server_id = ?",
             (user.id, ctx.guild.id)
         ).fetchone()[0]
-        
-        conn.close()
+    
+    try:
+        warning_count = await db.transaction(advertir)
         
         embed = discord.Embed(
             title="⚠️ Usuário Advertido!",
@@ -3651,7 +4406,7 @@ async def advertence(ctx, user: discord.Member, *, reason: str = "Sem motivo esp
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao advertir: {e}")
+        commands_logger.error(f"Erro ao advertir: {e}")
         await ctx.send("❌ Erro ao advertir usuário!")
 
 @bot.command(name='removeadvertence', aliases=['removewarn'])
@@ -3659,24 +4414,22 @@ async def advertence(ctx, user: discord.Member, *, reason: str = "Sem motivo esp
 async def remove_advertence(ctx, user: discord.Member, warning_id: int = None):
     """Remover advertência"""
     try:
-        conn = get_db()
-        
         if warning_id:
             # Remove specific warning
-            conn.execute(
+            await db.execute(
                 "DELETE FROM warnings WHERE id = ? AND user_id = ? AND server_id = ?",
                 (warning_id, user.id, ctx.guild.id)
             )
         else:
             # Remove last warning
-            conn.execute(
-                "DELETE FROM warnings WHERE user_id = ? AND server_id = ? ORDER BY warned_at DESC LIMIT 1",
+            await db.execute(
+                """DELETE FROM warnings WHERE id = (
+                    SELECT id FROM warnings WHERE user_id = ? AND server_id = ?
+                    ORDER BY warned_at DESC LIMIT 1
+                )""",
                 (user.id, ctx.guild.id)
             )
         
-        conn.commit()
-        conn.close()
-        
         embed = discord.Embed(
             title="✅ Advertência Removida!",
             description=f"Advertência removida de {user.mention}!",
@@ -3685,7 +4438,7 @@ async def remove_advertence(ctx, user: discord.Member, warning_id: int = None):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao remover advertência: {e}")
+        commands_logger.error(f"Erro ao remover advertência: {e}")
         await ctx.send("❌ Erro ao remover advertência!")
 
 @bot.command(name='castigar')
@@ -3693,15 +4446,12 @@ async def remove_advertence(ctx, user: discord.Member, warning_id: int = None):
 async def castigar(ctx, user: discord.Member, duration: int, *, reason: str = "Sem motivo especificado"):
     """Aplicar castigo"""
     try:
-        conn = get_db()
         end_time = datetime.now() + timedelta(minutes=duration)
         
-        conn.execute(
+        await db.execute(
             "INSERT INTO punishments (user_id, server_id, moderator_id, reason, end_time, created_at) VALUES (?, ?, ?, ?, ?, ?)",
             (user.id, ctx.guild.id, ctx.author.id, reason, end_time.isoformat(), datetime.now().isoformat())
         )
-        conn.commit()
-        conn.close()
         
         embed = discord.Embed(
             title="⚖️ Castigo Aplicado!",
@@ -3715,7 +4465,7 @@ async def castigar(ctx, user: discord.Member, duration: int, *, reason: str = "S
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao castigar: {e}")
+        commands_logger.error(f"Erro ao castigar: {e}")
         await ctx.send("❌ Erro ao aplicar castigo!")
 
 @bot.command(name='removecastigo')
@@ -3723,13 +4473,10 @@ async def castigar(ctx, user: discord.Member, duration: int, *, reason: str = "S
 async def remove_castigo(ctx, user: discord.Member):
     """Remover castigo"""
     try:
-        conn = get_db()
-        conn.execute(
+        await db.execute(
             "DELETE FROM punishments WHERE user_id = ? AND server_id = ?",
             (user.id, ctx.guild.id)
         )
-        conn.commit()
-        conn.close()
         
         embed = discord.Embed(
             title="✅ Castigo Removido!",
@@ -3739,18 +4486,138 @@ async def remove_castigo(ctx, user: discord.Member):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        print(f"Erro ao remover castigo: {e}")
+        commands_logger.error(f"Erro ao remover castigo: {e}")
         await ctx.send("❌ Erro ao remover castigo!")
 
+# ================= EVENTO DE MENSAGENS =================
+# Fora do bloco principal para poder ser exercitado sem gateway (benchmark_on_message.py)
+@timed_event
+async def on_message(message):
+    """Evento para processar mensagens e detectar prefixo personalizado"""
+    # Ignorar mensagens do próprio bot
+    if message.author == bot.user:
+        return
+    
+    # Atualizar última atividade se for um canal de ticket (em memória; gravada em lote)
+    if ticket_activity.touch(message.channel.id) and not message.author.bot:
+        ticket_analytics.message(message.channel.id, message.author.id)
+    
+    # XP por mensagem (somado em memória; gravado em lote)
+    if message.guild and not message.author.bot:
+        xp_accumulator.message(message.author.id, message.channel.id)
+    
+    # Processar comandos normais primeiro
+    await bot.process_commands(message)
+    
+    # Verificar se a mensagem é apenas o prefixo personalizado ou prefixo de família
+    # (uma consulta ao cache de configurações; sem correspondência exata, nada a fazer)
+    if not message.guild:
+        return
+    settings = guild_settings.find(message.guild.id)
+    if settings is None:
+        return
+    content = message.content.strip()
+    matched = settings.bare_prefixes.get(content)
+    if matched is None:
+        return
+    
+    try:
+        custom_prefix = settings.prefix
+        family_prefix = settings.family_prefix
+        
+        # Se a mensagem for exatamente o prefixo personalizado
+        if matched == 'prefix':
+            messages_logger.debug("🎯 Prefixo personalizado detectado: %r", custom_prefix, extra={"guild_id": message.guild.id})
+            
+            # Abrir painel principal (mesmo do comando 'h')
+            embed = discord.Embed(
+                title="🤖 Painel do Bot - FOLK APP",
+                description="Bem-vindo ao painel de ajuda do bot!",
+                color=0x3498db
+            )
+            
+            embed.add_field(
+                name="🌐 Dashboard Web",
+                value="[Acesse o painel completo](http://localhost:5173)\nConfigure o bot de forma visual e intuitiva!",
+                inline=False
+            )
+            
+            embed.add_field(
+                name="📚 Comandos Principais",
+                value=f"• `{custom_prefix}f` ou `{custom_prefix}familia` - Painel de famílias\n• `{custom_prefix}ajuda` - Lista todos os comandos\n• `{custom_prefix}painel` - Configurações do bot",
+                inline=False
+            )
+            
+            embed.add_field(
+                name="⚙️ Configurações Rápidas",
+                value=f"• `{custom_prefix}setprefix <prefixo>` - Alterar prefixo\n• `{custom_prefix}cl <número>` - Limpar mensagens",
+                inline=False
+            )
+            
+            embed.set_footer(text=f"FOLK APP • Use {custom_prefix} para abrir este painel • {datetime.now().strftime('%d/%m/%Y %H:%M')}")
+            
+            await message.channel.send(embed=embed)
+            return
+        
+        # Se a mensagem for exatamente o prefixo de família personalizado
+        else:
+            messages_logger.debug("👨‍👩‍👧‍👦 Prefixo de família detectado: %r", family_prefix, extra={"guild_id": message.guild.id})
+            
+            # Verificar se o usuário tem VIP
+            if await is_vip_user(message.author.id):
+                # Abrir painel de famílias
+                embed = discord.Embed(
+                    title="👨‍👩‍👧‍👦 Painel de Famílias VIP",
+                    description="Gerencie sua família exclusiva!",
+                    color=0xFFD700
+                )
+                
+                embed.add_field(
+                    name="🏠 Comandos de Família",
+                    value=f"• `{family_prefix}criar` - Criar nova família\n• `{family_prefix}entrar <nome>` - Entrar em família\n• `{family_prefix}sair` - Sair da família\n• `{family_prefix}info` - Informações da família",
+                    inline=False
+                )
+                
+                embed.add_field(
+                    name="👑 Comandos de Líder",
+                    value=f"• `{family_prefix}convidar <@usuário>` - Convidar membro\n• `{family_prefix}expulsar <@usuário>` - Expulsar membro\n• `{family_prefix}promover <@usuário>` - Promover membro",
+                    inline=False
+                )
+                
+                embed.set_footer(text=f"FOLK APP VIP • Prefixo personalizado: {family_prefix} • {datetime.now().strftime('%d/%m/%Y %H:%M')}")
+                
+                await message.channel.send(embed=embed)
+                return
+            else:
+                # Usuário não tem VIP
+                embed = discord.Embed(
+                    title="🔒 Acesso Restrito",
+                    description="Este prefixo de família é exclusivo para usuários VIP!",
+                    color=0xFF0000
+                )
+                embed.add_field(
+                    name="💎 Como obter VIP?",
+                    value="Acesse nosso [dashboard](http://localhost:5173) e adquira sua assinatura mensal!",
+                    inline=False
+                )
+                await message.channel.send(embed=embed)
+                return
+    except Exception as e:
+        messages_logger.error(f"❌ Erro ao processar prefixo personalizado: {e}")
+
 if __name__ == "__main__":
     # Inicializar banco de dados
     init_db()
     init_perm_db()
     
+    # Carregar configurações dos servidores (e importar os JSON antigos do dashboard)
+    guild_settings.load_all()
+    guild_settings.import_legacy_files(CONFIG_DIR)
+    
     # Verificar token
     token = os.getenv('DISCORD_TOKEN')
     if not token:
-        print("❌ Token do Discord não encontrado! Configure a variável DISCORD_TOKEN.")
+        logger.error("❌ Token do Discord não encontrado! Configure a variável DISCORD_TOKEN.")
         sys.exit(1)
     
     # Configurar integração com dashboard
@@ -3780,16 +4647,13 @@ if __name__ == "__main__":
         await ctx.send(embed=embed)
     
     def register_dynamic_commands():
-        """Registra comandos dinâmicos baseados nas configurações do banco de dados"""
+        """Registra comandos dinâmicos baseados nas configurações dos servidores"""
         try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            
             # Buscar todas as configurações de family_command personalizadas
-            cursor.execute("SELECT DISTINCT family_command FROM server_configs WHERE family_command IS NOT NULL AND family_command != 'f' AND family_command != 'familia'")
-            custom_commands = cursor.fetchall()
-            
-            conn.close()
+            custom_commands = {
+                (settings.family_command,) for settings in guild_settings.all()
+                if settings.family_command not in ('f', 'familia')
+            }
             
             # Obter lista de comandos e aliases existentes
             existing_commands = set()
@@ -3816,276 +4680,219 @@ if __name__ == "__main__":
                     )
                     
                     bot.add_command(dynamic_command)
-                    print(f"✅ Comando dinâmico registrado: {command_name}")
+                    commands_logger.info(f"✅ Comando dinâmico registrado: {command_name}")
                 else:
-                    print(f"⚠️ Comando '{command_name}' já existe, pulando registro dinâmico")
+                    commands_logger.warning(f"⚠️ Comando '{command_name}' já existe, pulando registro dinâmico")
             
         except Exception as e:
-            print(f"❌ Erro ao registrar comandos dinâmicos: {e}")
+            commands_logger.error(f"❌ Erro ao registrar comandos dinâmicos: {e}")
     
-    @bot.event
+    @timed_event
     async def on_ready():
-        print(f"✅ Bot conectado como {bot.user}")
-        print(f"📊 Conectado a {len(bot.guilds)} servidores")
+        events_logger.info(f"✅ Bot conectado como {bot.user}")
+        events_logger.info(f"📊 Conectado a {len(bot.guilds)} servidores")
         
         # Armazenar tempo de início para uptime
         bot.start_time = datetime.now()
         
+        # Índice dos cargos de staff usado pelo sistema de tickets
+        staff_roles.build_all(bot.guilds)
+        
         # Registrar comandos dinâmicos baseados nas configurações
-        print("🔧 Registrando comandos dinâmicos...")
+        events_logger.info("🔧 Registrando comandos dinâmicos...")
         register_dynamic_commands()
         
         # Iniciar API local para sincronização com dashboard
         try:
             run_api_in_background()
-            print('✅ API local iniciada com sucesso na porta 3002')
+            events_logger.info('✅ API local iniciada com sucesso na porta 3002')
             
             # Aguardar um pouco para a API inicializar completamente
             await asyncio.sleep(3)
             
             # Sincronizar dados dos servidores com o backend APÓS a API estar rodando
-            print("🔄 Sincronizando dados dos servidores com o backend...")
+            events_logger.info("🔄 Sincronizando dados dos servidores com o backend...")
             await sync_guilds_with_backend()
             
         except Exception as e:
-            print(f'❌ Erro ao iniciar API local: {e}')
+            events_logger.error(f'❌ Erro ao iniciar API local: {e}')
         
-        print("🎯 Bot pronto para uso!")
+        events_logger.info("🎯 Bot pronto para uso!")
         
         # Listar servidores conectados
         for guild in bot.guilds:
-            print(f"   - {guild.name} ({guild.member_count} membros)")
+            events_logger.info(f"   - {guild.name} ({guild.member_count} membros)")
     
     @bot.event
     async def setup_hook():
         """Configurações iniciais do bot"""
-        print("🔧 Configurando sistema de tickets...")
-        
-        # Iniciar task de auto-fechamento de tickets
-        if not auto_close_inactive_tickets.is_running():
-            auto_close_inactive_tickets.start()
-            print("✅ Task de auto-fechamento de tickets iniciada")
-        
-        print("✅ Sistema de tickets configurado com sucesso!")
-    
-    @bot.event
-    async def on_message(message):
-        """Evento para processar mensagens e detectar prefixo personalizado"""
-        # Ignorar mensagens do próprio bot
-        if message.author == bot.user:
-            return
-        
-        # Atualizar última atividade se for um canal de ticket
-        if message.channel.name.startswith("ticket-"):
-            try:
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
-                cursor.execute(
-                    "UPDATE active_tickets SET last_activity = ? WHERE channel_id = ?",
-                    (datetime.now().isoformat(), str(message.channel.id))
-                )
-                conn.commit()
-                conn.close()
-            except Exception as e:
-                print(f"Erro ao atualizar atividade do ticket: {e}")
-        
-        # Processar comandos normais primeiro
-        await bot.process_commands(message)
-        
-        # Verificar se a mensagem é apenas o prefixo personalizado ou prefixo de família
-        if message.guild:
-            try:
-                # Buscar prefixos personalizados do servidor
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
-                cursor.execute("SELECT prefix, family_prefix FROM server_configs WHERE guild_id = ?", (str(message.guild.id),))
-                result = cursor.fetchone()
-                conn.close()
-                
-                if result:
-                    custom_prefix = result[0]
-                    family_prefix = result[1]
-                    
-                    # Se a mensagem for exatamente o prefixo personalizado
-                    if custom_prefix and message.content.strip() == custom_prefix:
-                        print(f"🎯 Prefixo personalizado detectado: '{custom_prefix}' no servidor {message.guild.id}")
-                        
-                        # Criar contexto fake para usar a função do painel
-                        ctx = await bot.get_context(message)
-                        
-                        # Abrir painel principal (mesmo do comando 'h')
-                        embed = discord.Embed(
-                            title="🤖 Painel do Bot - FOLK APP",
-                            description="Bem-vindo ao painel de ajuda do bot!",
-                            color=0x3498db
-                        )
-                        
-                        embed.add_field(
-                            name="🌐 Dashboard Web",
-                            value="[Acesse o painel completo](http://localhost:5173)\nConfigure o bot de forma visual e intuitiva!",
-                            inline=False
-                        )
-                        
-                        embed.add_field(
-                            name="📚 Comandos Principais",
-                            value=f"• `{custom_prefix}f` ou `{custom_prefix}familia` - Painel de famílias\n• `{custom_prefix}ajuda` - Lista todos os comandos\n• `{custom_prefix}painel` - Configurações do bot",
-                            inline=False
-                        )
-                        
-                        embed.add_field(
-                            name="⚙️ Configurações Rápidas",
-                            value=f"• `{custom_prefix}setprefix <prefixo>` - Alterar prefixo\n• `{custom_prefix}cl <número>` - Limpar mensagens",
-                            inline=False
-                        )
-                        
-                        embed.set_footer(text=f"FOLK APP • Use {custom_prefix} para abrir este painel • {datetime.now().strftime('%d/%m/%Y %H:%M')}")
-                        
-                        await message.channel.send(embed=embed)
-                        return
-                    
-                    # Se a mensagem for exatamente o prefixo de família personalizado
-                    elif family_prefix and message.content.strip() == family_prefix:
-                        print(f"👨‍👩‍👧‍👦 Prefixo de família detectado: '{family_prefix}' no servidor {message.guild.id}")
-                        
-                        # Verificar se o usuário tem VIP
-                        conn = sqlite3.connect(DB_PATH)
-                        cursor = conn.cursor()
-                        cursor.execute("SELECT vip FROM users WHERE user_id = ?", (str(message.author.id),))
-                        user_data = cursor.fetchone()
-                        conn.close()
-                        
-                        if user_data and user_data[0] == 1:
-                            # Abrir painel de famílias
-                            embed = discord.Embed(
-                                title="👨‍👩‍👧‍👦 Painel de Famílias VIP",
-                                description="Gerencie sua família exclusiva!",
-                                color=0xFFD700
-                            )
-                            
-                            embed.add_field(
-                                name="🏠 Comandos de Família",
-                                value=f"• `{family_prefix}criar` - Criar nova família\n• `{family_prefix}entrar <nome>` - Entrar em família\n• `{family_prefix}sair` - Sair da família\n• `{family_prefix}info` - Informações da família",
-                                inline=False
-                            )
-                            
-                            embed.add_field(
-                                name="👑 Comandos de Líder",
-                                value=f"• `{family_prefix}convidar <@usuário>` - Convidar membro\n• `{family_prefix}expulsar <@usuário>` - Expulsar membro\n• `{family_prefix}promover <@usuário>` - Promover membro",
-                                inline=False
-                            )
-                            
-                            embed.set_footer(text=f"FOLK APP VIP • Prefixo personalizado: {family_prefix} • {datetime.now().strftime('%d/%m/%Y %H:%M')}")
-                            
-                            await message.channel.send(embed=embed)
-                            return
-                        else:
-                            # Usuário não tem VIP
-                            embed = discord.Embed(
-                                title="🔒 Acesso Restrito",
-                                description="Este prefixo de família é exclusivo para usuários VIP!",
-                                color=0xFF0000
-                            )
-                            embed.add_field(
-                                name="💎 Como obter VIP?",
-                                value="Acesse nosso [dashboard](http://localhost:5173) e adquira sua assinatura mensal!",
-                                inline=False
-                            )
-                            await message.channel.send(embed=embed)
-                            return
-            except Exception as e:
-                print(f"❌ Erro ao processar prefixo personalizado: {e}")
-    
-    @bot.event
+        events_logger.info("🔧 Configurando sistema de tickets...")
+        
+        # Indexar backups antigos em segundo plano
+        asyncio.create_task(import_transcript_backups())
+        
+        # Carregar tickets abertos e iniciar as gravações em lote (última atividade e log de ações)
+        await ticket_activity.load()
+        await ticket_rate_limiter.load()
+        await ticket_queue.load()
+        await db.run(leaderboard.load)
+        await db.run(ticket_analytics.load)
+        if not snapshot_ticket_analytics.is_running():
+            snapshot_ticket_analytics.start()
+        if not snapshot_ticket_rate_limits.is_running():
+            snapshot_ticket_rate_limits.start()
+        if not flush_ticket_activity.is_running():
+            flush_ticket_activity.start()
+        if not flush_ticket_logs.is_running():
+            flush_ticket_logs.start()
+        if not flush_message_xp.is_running():
+            flush_message_xp.start()
+        
+        # Agendar o auto-fechamento dos tickets abertos
+        if not auto_close_scheduler.is_running():
+            await auto_close_scheduler.load()
+            auto_close_scheduler.start(auto_close_ticket)
+            events_logger.info("✅ Agendador de auto-fechamento de tickets iniciado")
+        
+        # Limpeza periódica de canais de voz de tickets órfãos
+        if not sweep_orphan_voice_channels.is_running():
+            sweep_orphan_voice_channels.start()
+        
+        events_logger.info("✅ Sistema de tickets configurado com sucesso!")
+    
+    @timed_event
     async def on_guild_join(guild):
         """Evento quando o bot entra em um servidor"""
-        print(f"✅ Bot adicionado ao servidor: {guild.name}")
+        events_logger.info(f"✅ Bot adicionado ao servidor: {guild.name}")
+        staff_roles.build(guild)
         await sync_guilds_with_backend()
     
-    @bot.event
+    @timed_event
     async def on_guild_remove(guild):
         """Evento quando o bot sai de um servidor"""
-        print(f"❌ Bot removido do servidor: {guild.name}")
+        events_logger.info(f"❌ Bot removido do servidor: {guild.name}")
+        staff_roles.forget(guild.id)
         await sync_guilds_with_backend()
     
-    @bot.event
+    @timed_event
     async def on_guild_update(before, after):
         """Evento quando um servidor é atualizado"""
         if before.name != after.name or before.icon != after.icon:
-            print(f"🔄 Servidor atualizado: {after.name}")
+            events_logger.info(f"🔄 Servidor atualizado: {after.name}")
             await sync_guilds_with_backend()
     
     # ================= EVENTOS DE SINCRONIZAÇÃO EM TEMPO REAL =================
     
-    @bot.event
+    @timed_event
     async def on_guild_role_create(role):
         """Evento quando um cargo é criado"""
-        print(f"🎭 Cargo criado: {role.name} no servidor {role.guild.name}")
+        events_logger.debug("🎭 Cargo criado: %s", role.name, extra={"guild_id": role.guild.id})
+        staff_roles.role_saved(role)
         await sync_role_with_backend(role.guild.id, 'create', role)
     
-    @bot.event
+    @timed_event
     async def on_guild_role_update(before, after):
         """Evento quando um cargo é atualizado"""
-        print(f"🔄 Cargo atualizado: {after.name} no servidor {after.guild.name}")
+        events_logger.debug("🔄 Cargo atualizado: %s", after.name, extra={"guild_id": after.guild.id})
+        staff_roles.role_saved(after)
         await sync_role_with_backend(after.guild.id, 'update', after)
     
-    @bot.event
+    @timed_event
     async def on_guild_role_delete(role):
         """Evento quando um cargo é removido"""
-        print(f"❌ Cargo removido: {role.name} no servidor {role.guild.name}")
+        events_logger.debug("❌ Cargo removido: %s", role.name, extra={"guild_id": role.guild.id})
+        staff_roles.role_deleted(role)
         await sync_role_with_backend(role.guild.id, 'delete', role)
     
-    @bot.event
+    @timed_event
     async def on_member_join(member):
         """Evento quando um membro entra no servidor"""
         if not member.bot:  # Ignorar bots
-            print(f"👋 Membro entrou: {member.display_name} no servidor {member.guild.name}")
+            events_logger.debug("👋 Membro entrou: %s", member.display_name, extra={"guild_id": member.guild.id})
             await sync_member_with_backend(member.guild.id, 'join', member)
     
-    @bot.event
+    @timed_event
     async def on_member_remove(member):
         """Evento quando um membro sai do servidor"""
         if not member.bot:  # Ignorar bots
-            print(f"👋 Membro saiu: {member.display_name} do servidor {member.guild.name}")
+            events_logger.debug("👋 Membro saiu: %s", member.display_name, extra={"guild_id": member.guild.id})
             await sync_member_with_backend(member.guild.id, 'leave', member)
     
-    @bot.event
+    @timed_event
     async def on_member_update(before, after):
         """Evento quando um membro é atualizado (cargos, nick, etc.)"""
         if not after.bot and (before.roles != after.roles or before.display_name != after.display_name):
-            print(f"🔄 Membro atualizado: {after.display_name} no servidor {after.guild.name}")
+            events_logger.debug("🔄 Membro atualizado: %s", after.display_name, extra={"guild_id": after.guild.id})
             await sync_member_with_backend(after.guild.id, 'update', after)
     
-    @bot.event
+    @timed_event
+    async def on_presence_update(before, after):
+        """Staff que volta a ficar disponível recebe os tickets em espera"""
+        if (
+            before.status in (discord.Status.offline, discord.Status.dnd)
+            and after.status in (discord.Status.online, discord.Status.idle)
+            and ticket_queue.waiting(after.guild.id)
+            and staff_roles.is_staff(after)
+        ):
+            await dispatch_ticket_queue(after.guild)
+    
+    @timed_event
     async def on_guild_channel_create(channel):
         """Evento quando um canal é criado"""
-        print(f"📺 Canal criado: {channel.name} no servidor {channel.guild.name}")
+        events_logger.debug("📺 Canal criado: %s", channel.name, extra={"guild_id": channel.guild.id})
         await sync_channel_with_backend(channel.guild.id, 'create', channel)
     
-    @bot.event
+    @timed_event
     async def on_guild_channel_update(before, after):
         """Evento quando um canal é atualizado"""
         if before.name != after.name or before.type != after.type:
-            print(f"🔄 Canal atualizado: {after.name} no servidor {after.guild.name}")
+            events_logger.debug("🔄 Canal atualizado: %s", after.name, extra={"guild_id": after.guild.id})
             await sync_channel_with_backend(after.guild.id, 'update', after)
     
-    @bot.event
+    @timed_event
     async def on_guild_channel_delete(channel):
         """Evento quando um canal é removido"""
-        print(f"❌ Canal removido: {channel.name} do servidor {channel.guild.name}")
+        events_logger.debug("❌ Canal removido: %s", channel.name, extra={"guild_id": channel.guild.id})
         await sync_channel_with_backend(channel.guild.id, 'delete', channel)
     
     # Iniciar servidor HTTP em background
     async def main():
         # await start_http_server()  # Comentado temporariamente
-        print("🚀 Iniciando bot...")
-        await bot.start(token)
+        events_logger.info("🚀 Iniciando bot...")
+        try:
+            await bot.start(token)
+        finally:
+            # Concluir escritas pendentes e fechar a conexão do banco
+            auto_close_scheduler.stop()
+            try:
+                await ticket_activity.flush()
+            except Exception as e:
+                tickets_logger.error(f"Erro ao gravar atividade dos tickets: {e}")
+            try:
+                await ticket_log.flush()
+            except Exception as e:
+                tickets_logger.error(f"Erro ao registrar log de ticket: {e}")
+            try:
+                await ticket_rate_limiter.flush()
+            except Exception as e:
+                tickets_logger.error(f"Erro ao gravar rate limit de tickets: {e}")
+            try:
+                await db.run(ticket_analytics.save)
+            except Exception as e:
+                tickets_logger.error(f"Erro ao gravar estatísticas de tickets: {e}")
+            try:
+                await xp_accumulator.flush()
+            except Exception as e:
+                commands_logger.error(f"Erro ao gravar XP: {e}")
+            shutdown_backup_writer()
+            db.close()
     
     # ================= FUNCIONALIDADES AVANÇADAS =================
     
     # Sistema de restrições de call
     call_restrictions = {}
     
-    @bot.event
+    @timed_event
     async def on_voice_state_update(member, before, after):
         """Gerencia restrições de call e gravação"""
         try:
@@ -4117,7 +4924,7 @@ if __name__ == "__main__":
                                     await channel.send(embed=embed)
                                     break
                     except Exception as e:
-                        print(f"❌ Erro ao enviar mensagem de restrição: {e}")
+                        events_logger.error(f"❌ Erro ao enviar mensagem de restrição: {e}")
                     
                     return
                 
@@ -4174,7 +4981,7 @@ if __name__ == "__main__":
                         await log_channel.send(embed=embed)
                         
         except Exception as e:
-            print(f"❌ Erro no evento de voz: {e}")
+            events_logger.error(f"❌ Erro no evento de voz: {e}")
     
     # Comandos de restrição de call
     @bot.command(name='restrictcall')
@@ -4368,7 +5175,7 @@ if __name__ == "__main__":
                             channel_mapping[channel.id] = new_channel.id
                             
                 except Exception as e:
-                    print(f"❌ Erro ao clonar categoria {category.name}: {e}")
+                    commands_logger.error(f"❌ Erro ao clonar categoria {category.name}: {e}")
             
             # Clonar canais sem categoria
             for channel in original_guild.channels:
@@ -4396,7 +5203,7 @@ if __name__ == "__main__":
                             channel_mapping[channel.id] = new_channel.id
                             
                     except Exception as e:
-                        print(f"❌ Erro ao clonar canal {channel.name}: {e}")
+                        commands_logger.error(f"❌ Erro ao clonar canal {channel.name}: {e}")
             
             # Atualizar progresso
             progress_embed.description = f"✅ Servidor criado: **{new_guild.name}**\n✅ Canais clonados\n🔄 Clonando cargos..."
@@ -4415,7 +5222,7 @@ if __name__ == "__main__":
                     )
                     role_mapping[role.id] = new_role.id
                 except Exception as e:
-                    print(f"❌ Erro ao clonar cargo {role.name}: {e}")
+                    commands_logger.error(f"❌ Erro ao clonar cargo {role.name}: {e}")
             
             # Atualizar progresso
             progress_embed.description = f"✅ Servidor criado: **{new_guild.name}**\n✅ Canais clonados\n✅ Cargos clonados\n🔄 Configurando emojis..."
@@ -4435,7 +5242,7 @@ if __name__ == "__main__":
                     )
                     emoji_count += 1
                 except Exception as e:
-                    print(f"❌ Erro ao clonar emoji {emoji.name}: {e}")
+                    commands_logger.error(f"❌ Erro ao clonar emoji {emoji.name}: {e}")
             
             # Criar convite para o servidor clonado
             invite = None
@@ -4478,7 +5285,7 @@ if __name__ == "__main__":
             await ctx.send(f"❌ Erro HTTP: {e}")
         except Exception as e:
             await ctx.send(f"❌ Erro inesperado: {e}")
-            print(f"❌ Erro na clonagem: {e}")
+            commands_logger.error(f"❌ Erro na clonagem: {e}")
     
     # Comando para listar servidores disponíveis para clonagem
     @bot.command(name='listservers')
@@ -4521,7 +5328,7 @@ if __name__ == "__main__":
     @commands.has_permissions(manage_channels=True)
     async def ticket_panel(ctx, panel_type: str = "main"):
         """Cria um painel de tickets"""
-        config = TicketConfig(ctx.guild.id)
+        config = await TicketConfig.load(ctx.guild.id)
         
         if panel_type not in config.panels:
             await ctx.send(f"❌ Tipo de painel inválido. Tipos disponíveis: {', '.join(config.panels.keys())}")
@@ -4544,30 +5351,17 @@ if __name__ == "__main__":
         await ctx.send(embed=embed, view=view)
         
         # Log da ação
-        await log_ticket_action(ctx.guild.id, "panel_created", ctx.author.id, f"Painel {panel_type} criado")
+        log_ticket_action(ctx.guild.id, ctx.channel.id, ctx.author.id, "panel_created", f"Painel {panel_type} criado")
     
     @bot.command(name='ticket')
     async def ticket_command(ctx, tipo: str = "suporte", *, motivo: str = None):
         """Comando slash para criar tickets"""
-        config = TicketConfig(ctx.guild.id)
-        
-        # Verificar rate limit
-        if not await check_rate_limit(ctx.author.id, config.settings["rate_limit_hours"]):
-            await ctx.send("❌ Você precisa aguardar antes de criar outro ticket!")
-            return
-        
-        # Verificar limite de tickets por usuário
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT COUNT(*) FROM active_tickets WHERE user_id = ? AND guild_id = ?",
-            (str(ctx.author.id), str(ctx.guild.id))
-        )
-        ticket_count = cursor.fetchone()[0]
-        conn.close()
+        config = await TicketConfig.load(ctx.guild.id)
         
-        if ticket_count >= config.settings["max_tickets_per_user"]:
-            await ctx.send(f"❌ Você já tem {ticket_count} tickets ativos. Limite: {config.settings['max_tickets_per_user']}")
+        # Verificar rate limit e limite de tickets por usuário
+        can_create, message = await check_rate_limit(ctx.author.id, ctx.guild.id)
+        if not can_create:
+            await ctx.send(f"❌ {message}")
             return
         
         # Criar o ticket
@@ -4592,9 +5386,8 @@ if __name__ == "__main__":
         }
         
         # Adicionar permissões para staff
-        for role in ctx.guild.roles:
-            if any(staff_name.lower() in role.name.lower() for staff_name in STAFF_ROLE_NAMES):
-                overwrites[role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
+        for role in staff_roles.roles(ctx.guild):
+            overwrites[role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
         
         channel = await ctx.guild.create_text_channel(
             ticket_name,
@@ -4603,17 +5396,11 @@ if __name__ == "__main__":
         )
         
         # Salvar no banco de dados
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO active_tickets (guild_id, channel_id, user_id, ticket_type, created_at, last_activity) VALUES (?, ?, ?, ?, ?, ?)",
-            (str(ctx.guild.id), str(channel.id), str(ctx.author.id), tipo, datetime.now().isoformat(), datetime.now().isoformat())
+        await db.execute(
+            "INSERT INTO active_tickets (guild_id, channel_id, user_id, ticket_type, created_at, last_activity) VALUES (?, ?, ?, ?, datetime('now'), datetime('now'))",
+            (str(ctx.guild.id), str(channel.id), str(ctx.author.id), tipo)
         )
-        conn.commit()
-        conn.close()
-        
-        # Adicionar rate limit
-        await add_rate_limit(ctx.author.id)
+        track_new_ticket(ctx.guild.id, ctx.author.id, channel.id, tipo)
         
         # Embed de boas-vindas
         embed = discord.Embed(
@@ -4632,9 +5419,33 @@ if __name__ == "__main__":
         await channel.send(embed=embed, view=view)
         
         # Log da ação
-        await log_ticket_action(ctx.guild.id, "ticket_created", ctx.author.id, f"Ticket {tipo} criado: {channel.mention}")
+        log_ticket_action(ctx.guild.id, channel.id, ctx.author.id, "ticket_created", f"Ticket {tipo} criado: {channel.mention}")
         
         await ctx.send(f"✅ Ticket criado: {channel.mention}")
+        await dispatch_ticket_queue(ctx.guild)
+    
+    @bot.command(name='proximo', aliases=['next', 'claim', 'atender'])
+    async def next_ticket_command(ctx):
+        """Pega o próximo ticket da fila (maior prioridade, mais antigo)"""
+        if not staff_roles.is_staff(ctx.author):
+            await ctx.send("❌ Apenas staff pode atender tickets!")
+            return
+        
+        channel_id = ticket_queue.claim_next(
+            ctx.guild.id, ctx.author.id,
+            exists=lambda channel_id: ctx.guild.get_channel(int(channel_id)) is not None
+        )
+        if channel_id is None:
+            await ctx.send("✅ Nenhum ticket esperando atendimento!")
+            return
+        
+        await announce_ticket_assignment(ctx.guild, channel_id, ctx.author.id, action="claimed")
+        priority = ticket_queue.priority(channel_id)
+        await ctx.send(
+            f"🎫 Seu próximo ticket: <#{channel_id}> ({TICKET_PRIORITY_LABELS[priority]})\n"
+            f"📋 Ainda na fila: {ticket_queue.waiting(ctx.guild.id)} • "
+            f"Seus tickets abertos: {ticket_queue.staff_load(ctx.guild.id, ctx.author.id)}"
+        )
     
     @bot.command(name='fechar')
     async def close_ticket_command(ctx):
@@ -4644,14 +5455,10 @@ if __name__ == "__main__":
             return
         
         # Verificar se é o autor do ticket ou staff
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
+        result = await db.fetchone(
             "SELECT user_id FROM active_tickets WHERE channel_id = ?",
             (str(ctx.channel.id),)
         )
-        result = cursor.fetchone()
-        conn.close()
         
         if not result:
             await ctx.send("❌ Ticket não encontrado no banco de dados!")
@@ -4659,13 +5466,13 @@ if __name__ == "__main__":
         
         ticket_owner_id = result[0]
         is_owner = str(ctx.author.id) == ticket_owner_id
-        is_staff = any(any(staff_name.lower() in role.name.lower() for staff_name in STAFF_ROLE_NAMES) for role in ctx.author.roles)
+        is_staff = staff_roles.is_staff(ctx.author)
         
         if not (is_owner or is_staff):
             await ctx.send("❌ Apenas o autor do ticket ou membros da equipe podem fechá-lo!")
             return
         
-        config = TicketConfig(ctx.guild.id)
+        config = await TicketConfig.load(ctx.guild.id)
         
         embed = discord.Embed(
             title="🔒 Fechar Ticket",
@@ -4686,88 +5493,126 @@ if __name__ == "__main__":
             await ctx.send("❌ Este canal não é um ticket!")
             return
         
-        config = TicketConfig(ctx.guild.id)
+        config = await TicketConfig.load(ctx.guild.id)
         
         # Fazer backup das mensagens se habilitado
-        if config.settings["backup_enabled"]:
+        if config.get_field(["settings", "backup_enabled"]):
             await backup_ticket_messages(target_channel)
         
-        # Remover do banco de dados
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM active_tickets WHERE channel_id = ?", (str(target_channel.id),))
-        conn.commit()
-        conn.close()
+        # Remover do banco de dados e o canal de voz do ticket
+        ticket_info = await db.transaction(_remove_active_ticket, target_channel.id)
+        untrack_ticket(target_channel.id)
+        if ticket_info:
+            await delete_ticket_voice_channel(ctx.guild, ticket_info[2])
         
         # Log da ação
-        await log_ticket_action(ctx.guild.id, "ticket_force_closed", ctx.author.id, f"Ticket {target_channel.name} fechado à força")
+        log_ticket_action(ctx.guild.id, target_channel.id, ctx.author.id, "ticket_force_closed", f"Ticket {target_channel.name} fechado à força")
         
         await ctx.send(f"✅ Ticket {target_channel.mention} será fechado em 5 segundos...")
         await asyncio.sleep(5)
         await target_channel.delete()
     
     # Task para fechar tickets inativos automaticamente
-    @tasks.loop(hours=1)
-    async def auto_close_inactive_tickets():
-        """Fecha tickets inativos automaticamente"""
-        try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
+    async def auto_close_ticket(guild_id, channel_id):
+        """Fecha um ticket cujo prazo de inatividade venceu (chamado pelo agendador)"""
+        guild = bot.get_guild(int(guild_id))
+        if not guild:
+            return
+        
+        config = await TicketConfig.load(guild_id)
+        auto_close_hours = config.get_field(["settings", "auto_close_hours"]) or 48
+        channel = guild.get_channel(int(channel_id))
+        
+        if channel:
+            # Fazer backup se habilitado
+            if config.get_field(["settings", "backup_enabled"]):
+                await backup_ticket_messages(channel)
             
-            # Buscar tickets inativos
-            cursor.execute(
-                "SELECT guild_id, channel_id, user_id, last_activity FROM active_tickets"
+            # Notificar sobre fechamento
+            embed = discord.Embed(
+                title="⏰ Ticket Fechado Automaticamente",
+                description=f"Este ticket foi fechado automaticamente por inatividade de {auto_close_hours} horas.",
+                color=0xff9900
+            )
+            await channel.send(embed=embed)
+        
+        # Remover do banco e o canal de voz do ticket
+        ticket = await db.transaction(_remove_active_ticket, channel_id)
+        untrack_ticket(channel_id)
+        if ticket:
+            await delete_ticket_voice_channel(guild, ticket[2])
+        
+        if channel:
+            # Log da ação (feita pelo bot; user_id do log não aceita nulo)
+            log_ticket_action(
+                guild_id, channel_id, bot.user.id,
+                "ticket_auto_closed", f"Ticket {channel.name} fechado por inatividade"
             )
-            tickets = cursor.fetchall()
             
-            for guild_id, channel_id, user_id, last_activity_str in tickets:
+            await asyncio.sleep(5)
+            await channel.delete()
+    
+    @tasks.loop(seconds=TICKET_ACTIVITY_FLUSH_SECONDS)
+    async def flush_ticket_activity():
+        """Grava em lote a última atividade dos tickets"""
+        try:
+            await ticket_activity.flush()
+        except Exception as e:
+            tickets_logger.error(f"Erro ao gravar atividade dos tickets: {e}")
+    
+    @tasks.loop(seconds=TICKET_RATE_LIMIT_SNAPSHOT_SECONDS)
+    async def snapshot_ticket_rate_limits():
+        """Grava periodicamente o estado do rate limit de tickets"""
+        try:
+            await ticket_rate_limiter.flush()
+        except Exception as e:
+            tickets_logger.error(f"Erro ao gravar rate limit de tickets: {e}")
+    
+    @tasks.loop(seconds=TICKET_ANALYTICS_SNAPSHOT_SECONDS)
+    async def snapshot_ticket_analytics():
+        """Grava periodicamente as estatísticas de tickets"""
+        try:
+            await db.run(ticket_analytics.save)
+        except Exception as e:
+            tickets_logger.error(f"Erro ao gravar estatísticas de tickets: {e}")
+    
+    @tasks.loop(seconds=TICKET_LOG_FLUSH_SECONDS)
+    async def flush_ticket_logs():
+        """Grava em lote as ações de tickets enfileiradas"""
+        try:
+            await ticket_log.flush()
+        except Exception as e:
+            tickets_logger.error(f"Erro ao registrar log de ticket: {e}")
+    
+    @tasks.loop(seconds=XP_FLUSH_SECONDS)
+    async def flush_message_xp():
+        """Grava em lote o XP das mensagens e avisa quem subiu de nível"""
+        try:
+            level_ups = await xp_accumulator.flush()
+        except Exception as e:
+            commands_logger.error(f"Erro ao gravar XP: {e}")
+            return
+        for user_id, channel_id, level in level_ups:
+            channel = channel_id and bot.get_channel(channel_id)
+            if channel:
                 try:
-                    guild = bot.get_guild(int(guild_id))
-                    if not guild:
-                        continue
-                    
-                    config = TicketConfig(int(guild_id))
-                    auto_close_hours = config.settings["auto_close_hours"]
-                    
-                    last_activity = datetime.fromisoformat(last_activity_str)
-                    hours_inactive = (datetime.now() - last_activity).total_seconds() / 3600
-                    
-                    if hours_inactive >= auto_close_hours:
-                        channel = guild.get_channel(int(channel_id))
-                        if channel:
-                            # Fazer backup se habilitado
-                            if config.settings["backup_enabled"]:
-                                await backup_ticket_messages(channel)
-                            
-                            # Notificar sobre fechamento
-                            embed = discord.Embed(
-                                title="⏰ Ticket Fechado Automaticamente",
-                                description=f"Este ticket foi fechado automaticamente por inatividade de {auto_close_hours} horas.",
-                                color=0xff9900
-                            )
-                            await channel.send(embed=embed)
-                            
-                            # Remover do banco
-                            cursor.execute("DELETE FROM active_tickets WHERE channel_id = ?", (channel_id,))
-                            
-                            # Log da ação
-                            await log_ticket_action(int(guild_id), "ticket_auto_closed", None, f"Ticket {channel.name} fechado por inatividade")
-                            
-                            await asyncio.sleep(5)
-                            await channel.delete()
-                        else:
-                            # Canal não existe mais, remover do banco
-                            cursor.execute("DELETE FROM active_tickets WHERE channel_id = ?", (channel_id,))
-                    
-                except Exception as e:
-                    print(f"Erro ao processar ticket {channel_id}: {e}")
-                    continue
-            
-            conn.commit()
-            conn.close()
-            
+                    await channel.send(f"🎉 <@{user_id}> subiu para o **nível {level}**!")
+                except discord.HTTPException:
+                    pass
+    
+    @tasks.loop(minutes=ORPHAN_VOICE_SWEEP_MINUTES)
+    async def sweep_orphan_voice_channels():
+        """Recupera canais de voz de tickets que ficaram para trás"""
+        try:
+            reclaimed = await reclaim_orphan_voice_channels(bot.guilds)
+            if reclaimed:
+                tickets_logger.info(f"🧹 {reclaimed} canais de voz de tickets órfãos removidos")
         except Exception as e:
-            print(f"Erro na task de auto-fechamento: {e}")
+            tickets_logger.error(f"Erro ao remover canais de voz órfãos: {e}")
+    
+    @sweep_orphan_voice_channels.before_loop
+    async def before_sweep_orphan_voice_channels():
+        await bot.wait_until_ready()
     
     # ==================== FIM DOS COMANDOS DE TICKETS ====================
     
@@ -4775,4 +5620,4 @@ if __name__ == "__main__":
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        print("\n🛑 Bot interrompido pelo usuário")
\ No newline at end of file
+        logger.info("🛑 Bot interrompido pelo usuário")
\ No newline at end of file
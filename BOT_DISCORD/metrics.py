@@ -0,0 +1,137 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# ================= MÉTRICAS DE LATÊNCIA =================
+# Histogramas de baldes fixos: registrar um tempo é uma busca binária e um
+# incremento, e a memória não cresce com o número de chamadas. Os percentis
+# saem dos baldes (limite superior do balde que contém o percentil).
+
+# Limites superiores dos baldes, em milissegundos; acima do último vai para o balde de estouro
+BUCKET_BOUNDS_MS = (
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100,
+    250, 500, 1000, 2500, 5000, 10000, 30000, 60000,
+)
+
+# Tipos de métrica registrados pelo bot
+KINDS = ("command", "event", "db", "ticket")
+
+class LatencyHistogram:
+    """Contagem de chamadas por faixa de tempo de um comando, evento ou consulta"""
+
+    __slots__ = ("buckets", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, seconds):
+        """Registra uma execução que levou `seconds` segundos"""
+        ms = seconds * 1000
+        self.buckets[bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, fraction):
+        """Percentil (0..1) em ms, arredondado para o limite superior do balde"""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(fraction * self.count + 0.5))
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank:
+                if index == len(BUCKET_BOUNDS_MS):
+                    return self.max_ms
+                # Nunca informa mais que o maior tempo realmente medido
+                return min(BUCKET_BOUNDS_MS[index], self.max_ms)
+        return self.max_ms
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "p50_ms": round(self.percentile(0.50), 3),
+            "p95_ms": round(self.percentile(0.95), 3),
+            "p99_ms": round(self.percentile(0.99), 3),
+            "max_ms": round(self.max_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+        }
+
+class MetricsRegistry:
+    """Histogramas por (tipo, nome), compartilhados pelo bot, pelo executor do banco e pela API
+
+    As consultas ao banco são registradas pelas threads do executor e lidas pela
+    thread da API local, por isso todo acesso passa por um lock (curto).
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def observe(self, kind, name, seconds):
+        """Registra o tempo de uma execução de `name` (comando, evento ou consulta)"""
+        key = (kind, name)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+            histogram.record(seconds)
+
+    @contextmanager
+    def timer(self, kind, name):
+        """Mede o bloco `with` e registra o tempo (mesmo se ele levantar exceção)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(kind, name, time.perf_counter() - started)
+
+    def timed(self, kind, name=None):
+        """Decorador para corrotinas: registra o tempo de cada chamada"""
+        def decorator(coro):
+            label = name or coro.__name__
+
+            @functools.wraps(coro)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await coro(*args, **kwargs)
+                finally:
+                    self.observe(kind, label, time.perf_counter() - started)
+            return wrapper
+        return decorator
+
+    def snapshot(self, kind=None, limit=None):
+        """Resumo {tipo: [{name, count, p50_ms, p95_ms, p99_ms, max_ms, avg_ms}, ...]}
+
+        Cada lista vem ordenada do maior p99 para o menor.
+        """
+        with self._lock:
+            items = [
+                (key, histogram.summary()) for key, histogram in self._histograms.items()
+                if kind is None or key[0] == kind
+            ]
+        result = {k: [] for k in (KINDS if kind is None else (kind,))}
+        for (item_kind, name), summary in items:
+            result.setdefault(item_kind, []).append({"name": name, **summary})
+        for rows in result.values():
+            rows.sort(key=lambda row: (row["p99_ms"], row["count"]), reverse=True)
+            if limit is not None:
+                del rows[limit:]
+        return result
+
+    def reset(self):
+        """Descarta todos os histogramas"""
+        with self._lock:
+            self._histograms = {}
+            self.started_at = time.time()
+
+# Instância compartilhada pelo bot, pelo banco e pela API local
+metrics = MetricsRegistry()
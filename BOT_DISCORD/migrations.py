@@ -0,0 +1,390 @@
+import logging
+
+logger = logging.getLogger("bot.db")
+
+# ================= MIGRAÇÕES DO BANCO =================
+# Cada migração roda uma única vez, em ordem, dentro de uma transação; a versão
+# aplicada fica registrada em schema_version e é pulada nas próximas inicializações.
+# Para alterar o schema, adicione uma nova função ao final de MIGRATIONS (nunca
+# edite uma migração que já foi publicada).
+
+def _columns(conn, table):
+    """Nomes das colunas de uma tabela"""
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+def _add_column(conn, table, column, definition):
+    """ALTER TABLE ADD COLUMN que ignora colunas já existentes (bancos anteriores ao versionamento)"""
+    if column not in _columns(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def migration_001_base_schema(conn):
+    """Tabelas que o init_db já criava antes do versionamento"""
+    # Tabela de usuários
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        money INTEGER DEFAULT 0,
+        bank INTEGER DEFAULT 0,
+        rep INTEGER DEFAULT 0,
+        xp INTEGER DEFAULT 0,
+        level INTEGER DEFAULT 1,
+        last_daily TEXT,
+        last_rep TEXT,
+        last_work TEXT,
+        about_me TEXT,
+        vip INTEGER DEFAULT 0,
+        vip_level INTEGER DEFAULT 0,
+        family_id INTEGER,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    
+    # Tabela de famílias
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS families (
+        family_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL,
+        leader_id INTEGER NOT NULL,
+        description TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        member_count INTEGER DEFAULT 1
+    )
+    """)
+    
+    # Tabela de advertências
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS warns (
+        warn_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        moderator_id INTEGER NOT NULL,
+        reason TEXT NOT NULL,
+        timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+        server_id INTEGER NOT NULL,
+        active INTEGER DEFAULT 1
+    )
+    """)
+    
+    # Tabela de staff
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS staff (
+        user_id INTEGER PRIMARY KEY,
+        role TEXT NOT NULL,
+        permissions TEXT,
+        join_date TEXT DEFAULT CURRENT_TIMESTAMP,
+        server_id INTEGER NOT NULL,
+        points INTEGER DEFAULT 0
+    )
+    """)
+    
+    # Tabela de primeira dama
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS primeira_dama (
+        server_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        cargo_name TEXT DEFAULT 'Primeira Dama',
+        data_indicacao TEXT DEFAULT CURRENT_TIMESTAMP,
+        active INTEGER DEFAULT 1,
+        PRIMARY KEY (server_id, user_id)
+    )
+    """)
+    
+    # Tabela de trabalhos
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS jobs (
+        job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        emoji TEXT,
+        min_pay INTEGER NOT NULL,
+        max_pay INTEGER NOT NULL,
+        description TEXT,
+        cooldown INTEGER DEFAULT 3600,
+        required_level INTEGER DEFAULT 1
+    )
+    """)
+    
+    # Tabela de configurações de servidor (para prefixos personalizados)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS server_configs (
+        guild_id TEXT PRIMARY KEY,
+        prefix TEXT DEFAULT '!',
+        family_command TEXT DEFAULT 'f',
+        family_prefix TEXT DEFAULT NULL,
+        settings_data TEXT DEFAULT '{}',
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    
+    # ---------- Sistema de tickets ----------
+    # Tabela de configurações de tickets por servidor
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ticket_configs (
+        guild_id TEXT PRIMARY KEY,
+        config_data TEXT NOT NULL,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    
+    # Tabela de tickets ativos
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS active_tickets (
+        channel_id TEXT PRIMARY KEY,
+        guild_id TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        ticket_type TEXT NOT NULL,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        voice_channel_id TEXT,
+        priority TEXT DEFAULT 'normal',
+        staff_assigned TEXT,
+        last_activity TEXT
+    )
+    """)
+    
+    # Tabela de logs de tickets
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ticket_logs (
+        log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        guild_id TEXT NOT NULL,
+        channel_id TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        action TEXT NOT NULL,
+        details TEXT,
+        timestamp TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    
+    # Tabela de controle de rate limit de tickets por usuário
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS user_tickets (
+        user_id TEXT NOT NULL,
+        guild_id TEXT NOT NULL,
+        last_ticket TEXT DEFAULT CURRENT_TIMESTAMP,
+        ticket_count INTEGER DEFAULT 0,
+        PRIMARY KEY (user_id, guild_id)
+    )
+    """)
+
+def migration_002_settings_and_ticket_activity(conn):
+    """Colunas adicionadas às tabelas existentes"""
+    # Seções do dashboard guardadas junto das configurações do servidor
+    _add_column(conn, "server_configs", "settings_data", "TEXT DEFAULT '{}'")
+    # Última atividade usada pelo auto-fechamento de tickets
+    _add_column(conn, "active_tickets", "last_activity", "TEXT")
+
+def migration_003_moderation_and_stats_tables(conn):
+    """Tabelas usadas pelos comandos de moderação e estatísticas que nunca eram criadas"""
+    # Advertências (!warn, !advertence, !removeadvertence)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS warnings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        server_id INTEGER NOT NULL,
+        moderator_id INTEGER,
+        reason TEXT,
+        warned_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    
+    # Migrações de membros (!migracoes, !migrar)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS migrations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        server_id INTEGER NOT NULL,
+        migrated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    
+    # Movimentação de chat (!movchat)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS chat_movements (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        server_id INTEGER NOT NULL,
+        channel_id INTEGER,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    
+    # Pontos de movimentação (!movpoints)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS movement_points (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        server_id INTEGER NOT NULL,
+        points INTEGER DEFAULT 0,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    
+    # Recrutamentos (!recrutamentos, !recrutar)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS recruitments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        recruiter_id INTEGER,
+        server_id INTEGER NOT NULL,
+        recruited_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    
+    # Registros de atividade (!register, !registers)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS activity_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        server_id INTEGER NOT NULL,
+        activity TEXT,
+        registered_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    
+    # Verificações (!verificar) - uma por usuário e servidor
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS verifications (
+        user_id INTEGER NOT NULL,
+        server_id INTEGER NOT NULL,
+        verified_by INTEGER,
+        verified_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, server_id)
+    )
+    """)
+    
+    # Tempo em call (!tempo)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS user_time (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        server_id INTEGER NOT NULL,
+        time_spent INTEGER DEFAULT 0,
+        recorded_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    
+    # Castigos (!castigar, !removecastigo)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS punishments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        server_id INTEGER NOT NULL,
+        moderator_id INTEGER,
+        reason TEXT,
+        end_time TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+def migration_004_lookup_indexes(conn):
+    """Índices compostos das consultas por (usuário, servidor), tickets e logs"""
+    for table in (
+        "warnings", "migrations", "chat_movements", "movement_points",
+        "recruitments", "activity_logs", "user_time", "punishments", "warns",
+    ):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_user_server ON {table} (user_id, server_id)")
+    
+    # Contagem de tickets abertos por usuário/tipo e rate limit
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_active_tickets_guild_user_type "
+        "ON active_tickets (guild_id, user_id, ticket_type)"
+    )
+    # Histórico de ações de tickets por servidor
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ticket_logs_guild_timestamp "
+        "ON ticket_logs (guild_id, timestamp)"
+    )
+
+def migration_005_ticket_transcript_archive(conn):
+    """Índice dos backups de tickets e busca textual (FTS5) nas mensagens"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ticket_transcripts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        guild_id TEXT NOT NULL,
+        channel_id TEXT NOT NULL,
+        channel_name TEXT,
+        opener_id TEXT,
+        ticket_type TEXT,
+        started_at TEXT,
+        ended_at TEXT,
+        message_count INTEGER DEFAULT 0,
+        file_name TEXT UNIQUE NOT NULL,
+        archived_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ticket_transcripts_guild_ended "
+        "ON ticket_transcripts (guild_id, ended_at)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ticket_transcripts_guild_opener "
+        "ON ticket_transcripts (guild_id, opener_id)"
+    )
+    # Uma linha por mensagem; só content e author entram no índice textual
+    conn.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS ticket_transcript_fts USING fts5(
+        content,
+        author,
+        transcript_id UNINDEXED,
+        message_id UNINDEXED,
+        timestamp UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """)
+
+def migration_006_ticket_analytics(conn):
+    """Estatísticas acumuladas de tickets por servidor e tipo"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ticket_analytics (
+        guild_id TEXT NOT NULL,
+        ticket_type TEXT NOT NULL,
+        data TEXT NOT NULL,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (guild_id, ticket_type)
+    )
+    """)
+
+def migration_007_users_wealth_index(conn):
+    """Índice de expressão (money + bank) para o ranking de dinheiro"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_wealth ON users ((money + bank) DESC, user_id)")
+
+# (versão, função) em ordem crescente de versão
+MIGRATIONS = [
+    (1, migration_001_base_schema),
+    (2, migration_002_settings_and_ticket_activity),
+    (3, migration_003_moderation_and_stats_tables),
+    (4, migration_004_lookup_indexes),
+    (5, migration_005_ticket_transcript_archive),
+    (6, migration_006_ticket_analytics),
+    (7, migration_007_users_wealth_index),
+]
+
+def run_migrations(conn, migrations=MIGRATIONS):
+    """Aplica as migrações ainda não registradas em schema_version e retorna as versões aplicadas"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    applied = {row[0] for row in conn.execute("SELECT version FROM schema_version")}
+    
+    newly_applied = []
+    for version, migrate in migrations:
+        if version in applied:
+            continue
+        description = (migrate.__doc__ or migrate.__name__).strip()
+        # BEGIN explícito: o sqlite3 não abre transação sozinho antes de DDL
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migrate(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description)
+            )
+        except Exception:
+            conn.rollback()
+            logger.error(f"❌ Migração {version} falhou: {description}")
+            raise
+        conn.commit()
+        logger.info(f"🗄️ Migração {version} aplicada: {description}")
+        newly_applied.append(version)
+    return newly_applied
@@ -0,0 +1,256 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+
+from database import parse_utc_timestamp
+
+# ================= ESTATÍSTICAS DE TICKETS =================
+# Contadores mantidos conforme os tickets abrem, recebem a primeira resposta e
+# fecham, por servidor e tipo de ticket. Nada é recalculado varrendo ticket_logs:
+# a API local só lê o estado atual (sob lock, porque roda em outra thread).
+
+# Limites superiores dos baldes de duração, em minutos (acima do último: estouro)
+DURATION_BOUNDS_MIN = (5, 15, 30, 60, 120, 240, 480, 720, 1440, 2880, 4320, 10080)
+HOURLY_HISTORY_HOURS = 48   # horas de criações guardadas por tipo
+
+class DurationHistogram:
+    """Distribuição de durações (fechamento ou primeira resposta) em baldes fixos"""
+
+    __slots__ = ("buckets", "count", "total_min")
+
+    def __init__(self, buckets=None, count=0, total_min=0.0):
+        self.buckets = list(buckets) if buckets else [0] * (len(DURATION_BOUNDS_MIN) + 1)
+        self.count = count
+        self.total_min = total_min
+
+    def record(self, seconds):
+        minutes = max(0.0, seconds / 60)
+        self.buckets[bisect_left(DURATION_BOUNDS_MIN, minutes)] += 1
+        self.count += 1
+        self.total_min += minutes
+
+    def percentile(self, fraction):
+        """Percentil (0..1) em minutos, pelo limite superior do balde (None no estouro)"""
+        if not self.count:
+            return None
+        rank = max(1, int(fraction * self.count + 0.5))
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank:
+                return DURATION_BOUNDS_MIN[index] if index < len(DURATION_BOUNDS_MIN) else None
+        return None
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "avg_min": round(self.total_min / self.count, 1) if self.count else None,
+            "p50_min": self.percentile(0.50),
+            "p90_min": self.percentile(0.90),
+            "buckets": [
+                {"le_min": bound, "count": count}
+                for bound, count in zip(DURATION_BOUNDS_MIN + (None,), self.buckets)
+            ],
+        }
+
+    def to_state(self):
+        return {"buckets": self.buckets, "count": self.count, "total_min": self.total_min}
+
+class TicketTypeStats:
+    """Estatísticas acumuladas de um tipo de ticket em um servidor"""
+
+    __slots__ = ("created_total", "closed_total", "hourly", "close_duration", "first_response")
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.created_total = state.get("created_total", 0)
+        self.closed_total = state.get("closed_total", 0)
+        # hora (timestamp // 3600) -> tickets criados
+        self.hourly = {int(hour): count for hour, count in state.get("hourly", {}).items()}
+        self.close_duration = DurationHistogram(**state.get("close_duration", {}))
+        self.first_response = DurationHistogram(**state.get("first_response", {}))
+
+    def record_created(self, when):
+        self.created_total += 1
+        hour = int(when // 3600)
+        self.hourly[hour] = self.hourly.get(hour, 0) + 1
+        oldest = hour - HOURLY_HISTORY_HOURS
+        for old_hour in [h for h in self.hourly if h <= oldest]:
+            del self.hourly[old_hour]
+
+    def to_state(self):
+        return {
+            "created_total": self.created_total,
+            "closed_total": self.closed_total,
+            "hourly": self.hourly,
+            "close_duration": self.close_duration.to_state(),
+            "first_response": self.first_response.to_state(),
+        }
+
+class TicketAnalytics:
+    """Estatísticas de tickets por servidor e tipo, atualizadas a cada evento"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}   # (guild_id, ticket_type) -> TicketTypeStats
+        # channel_id -> [guild_id, ticket_type, criado em, autor, já respondido]
+        self._open = {}
+        self._open_counts = {}   # (guild_id, ticket_type) -> tickets abertos
+        self._dirty = set()
+
+    def _type_stats(self, guild_id, ticket_type):
+        key = (str(guild_id), ticket_type or "ticket")
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = TicketTypeStats()
+        return key, stats
+
+    # ---------- carga ----------
+    def load_state(self, rows):
+        """Estado salvo: linhas (guild_id, ticket_type, data JSON) de ticket_analytics"""
+        with self._lock:
+            for guild_id, ticket_type, data in rows:
+                self._stats[(str(guild_id), ticket_type)] = TicketTypeStats(json.loads(data))
+
+    def load_open_tickets(self, rows):
+        """Tickets abertos: linhas (guild_id, channel_id, ticket_type, user_id, created_at em timestamp)
+
+        A primeira resposta de tickets abertos antes da inicialização não é medida.
+        """
+        with self._lock:
+            self._open = {
+                str(channel_id): [str(guild_id), ticket_type or "ticket", created_at, str(user_id), True]
+                for guild_id, channel_id, ticket_type, user_id, created_at in rows
+            }
+            self._open_counts = {}
+            for guild_id, ticket_type, *_ in self._open.values():
+                self._open_counts[(guild_id, ticket_type)] = self._open_counts.get((guild_id, ticket_type), 0) + 1
+
+    # ---------- eventos ----------
+    def ticket_opened(self, guild_id, channel_id, ticket_type, user_id, when=None):
+        when = when or time.time()
+        with self._lock:
+            key, stats = self._type_stats(guild_id, ticket_type)
+            stats.record_created(when)
+            if self._open.get(str(channel_id)) is None:
+                self._open_counts[key] = self._open_counts.get(key, 0) + 1
+            self._open[str(channel_id)] = [key[0], key[1], when, str(user_id), False]
+            self._dirty.add(key)
+
+    def message(self, channel_id, author_id, when=None):
+        """Mensagem em um canal de ticket: a primeira de outra pessoa é a primeira resposta"""
+        ticket = self._open.get(str(channel_id))
+        if ticket is None or ticket[4] or ticket[3] == str(author_id):
+            return
+        when = when or time.time()
+        with self._lock:
+            if ticket[4]:
+                return
+            ticket[4] = True
+            key, stats = self._type_stats(ticket[0], ticket[1])
+            stats.first_response.record(when - ticket[2])
+            self._dirty.add(key)
+
+    def ticket_closed(self, channel_id, when=None):
+        when = when or time.time()
+        with self._lock:
+            ticket = self._open.pop(str(channel_id), None)
+            if ticket is None:
+                return
+            key, stats = self._type_stats(ticket[0], ticket[1])
+            self._open_counts[key] -= 1
+            stats.closed_total += 1
+            stats.close_duration.record(when - ticket[2])
+            self._dirty.add(key)
+
+    # ---------- leitura ----------
+    def guild_summary(self, guild_id, hours=24):
+        """Resumo do servidor para o dashboard: totais e um bloco por tipo de ticket"""
+        guild_id = str(guild_id)
+        current_hour = int(time.time() // 3600)
+        hours = max(1, min(int(hours), HOURLY_HISTORY_HOURS))
+        with self._lock:
+            open_counts = {
+                ticket_type: count for (open_guild, ticket_type), count in self._open_counts.items()
+                if open_guild == guild_id and count
+            }
+            types = {}
+            for (stats_guild, ticket_type), stats in self._stats.items():
+                if stats_guild != guild_id:
+                    continue
+                hourly = [
+                    {"hour": (current_hour - offset) * 3600, "created": stats.hourly.get(current_hour - offset, 0)}
+                    for offset in range(hours - 1, -1, -1)
+                ]
+                types[ticket_type] = {
+                    "open": open_counts.get(ticket_type, 0),
+                    "created_total": stats.created_total,
+                    "closed_total": stats.closed_total,
+                    "created_last_hours": sum(item["created"] for item in hourly),
+                    "hourly": hourly,
+                    "close_duration": stats.close_duration.summary(),
+                    "first_response": stats.first_response.summary(),
+                }
+            for ticket_type, count in open_counts.items():
+                types.setdefault(ticket_type, {"open": count})
+        return {
+            "open": sum(open_counts.values()),
+            "hours": hours,
+            "types": types,
+        }
+
+    # ---------- persistência ----------
+    def dirty_state(self):
+        """Linhas (guild_id, ticket_type, data JSON) alteradas desde a última chamada"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            return [
+                (guild_id, ticket_type, json.dumps(self._stats[(guild_id, ticket_type)].to_state()))
+                for guild_id, ticket_type in dirty
+            ]
+
+    def mark_dirty(self, keys):
+        with self._lock:
+            self._dirty.update(keys)
+
+    def load(self, conn):
+        """Carrega o estado salvo e os tickets abertos (executa na thread do banco)"""
+        self.load_state(conn.execute("SELECT guild_id, ticket_type, data FROM ticket_analytics").fetchall())
+        rows = conn.execute(
+            "SELECT guild_id, channel_id, ticket_type, user_id, created_at FROM active_tickets"
+        ).fetchall()
+        self.load_open_tickets([
+            (guild_id, channel_id, ticket_type, user_id, _created_timestamp(created_at))
+            for guild_id, channel_id, ticket_type, user_id, created_at in rows
+        ])
+
+    def save(self, conn):
+        """Grava em ticket_analytics os tipos alterados (executa na thread do banco)"""
+        rows = self.dirty_state()
+        if not rows:
+            return 0
+        try:
+            with conn:
+                conn.executemany("""
+                    INSERT INTO ticket_analytics (guild_id, ticket_type, data, updated_at)
+                    VALUES (?, ?, ?, datetime('now'))
+                    ON CONFLICT(guild_id, ticket_type) DO UPDATE SET
+                        data = excluded.data,
+                        updated_at = excluded.updated_at
+                """, rows)
+        except Exception:
+            # Tentar de novo na próxima gravação
+            self.mark_dirty((guild_id, ticket_type) for guild_id, ticket_type, _ in rows)
+            raise
+        return len(rows)
+
+def _created_timestamp(value):
+    """created_at de active_tickets em timestamp (agora, se inválido)"""
+    try:
+        return parse_utc_timestamp(value)
+    except (TypeError, ValueError):
+        return time.time()
+
+# Instância compartilhada pelo bot e pela API local
+ticket_analytics = TicketAnalytics()
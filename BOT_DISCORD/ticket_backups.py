@@ -0,0 +1,123 @@
+import asyncio
+import collections
+import gzip
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+logger = logging.getLogger("bot.tickets")
+
+# ================= BACKUP DE TICKETS =================
+# Cada backup é um arquivo NDJSON compactado (uma linha de cabeçalho e uma por
+# mensagem). As mensagens são gravadas em blocos conforme chegam do histórico,
+# e a serialização, a compressão e o disco ficam numa thread própria: a memória
+# usada não depende do tamanho do ticket e o event loop nunca espera pelo arquivo.
+
+BACKUP_DIR = Path(__file__).parent / "backups"
+BACKUP_SUFFIX = ".ndjson.gz"
+BACKUP_CHUNK_MESSAGES = 200       # mensagens por escrita enviada à thread
+BACKUP_MAX_PENDING_CHUNKS = 2     # blocos em fila por backup antes de pausar a leitura do histórico
+BACKUP_COMPRESS_LEVEL = 6
+
+# Uma única thread grava todos os backups, na ordem em que os blocos chegam
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="backup")
+
+class TranscriptWriter:
+    """Arquivo de backup sendo gravado; só é renomeado para o nome final quando completo"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.partial_path = self.path.with_name(self.path.name + ".part")
+        self.count = 0
+        self._file = None
+        self._pending = collections.deque()
+
+    # ---------- executados na thread de backup ----------
+    def _open(self, header):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = gzip.open(self.partial_path, "wt", encoding="utf-8", compresslevel=BACKUP_COMPRESS_LEVEL)
+        self._write_lines([header])
+
+    def _write_lines(self, records):
+        self._file.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+
+    def _finish(self):
+        self._file.close()
+        self.partial_path.replace(self.path)
+
+    def _discard(self):
+        if self._file is not None:
+            self._file.close()
+        self.partial_path.unlink(missing_ok=True)
+
+    # ---------- chamados do event loop ----------
+    async def _submit(self, func, *args):
+        loop = asyncio.get_running_loop()
+        self._pending.append(loop.run_in_executor(_writer, func, *args))
+        # Limita quantos blocos ficam em memória esperando a thread
+        while len(self._pending) > BACKUP_MAX_PENDING_CHUNKS:
+            await self._pending.popleft()
+
+    async def _drain(self):
+        while self._pending:
+            await self._pending.popleft()
+
+    async def open(self, header):
+        await self._submit(self._open, header)
+
+    async def write(self, records):
+        self.count += len(records)
+        await self._submit(self._write_lines, records)
+
+    async def close(self):
+        """Conclui as escritas pendentes e publica o arquivo com o nome final"""
+        await self._submit(self._finish)
+        await self._drain()
+        return self.path
+
+    async def abort(self):
+        """Descarta o arquivo parcial (depois de um erro)"""
+        for future in self._pending:
+            future.cancel()
+        await asyncio.gather(*self._pending, return_exceptions=True)
+        self._pending.clear()
+        await asyncio.get_running_loop().run_in_executor(_writer, self._discard)
+
+async def write_backup(path, header, records):
+    """Grava o cabeçalho e as mensagens (iterável assíncrono de dicts) em `path`
+
+    Retorna o TranscriptWriter concluído (caminho e número de mensagens).
+    Em caso de erro o arquivo parcial é removido e a exceção é propagada.
+    """
+    writer = TranscriptWriter(path)
+    try:
+        await writer.open(header)
+        chunk = []
+        async for record in records:
+            chunk.append(record)
+            if len(chunk) >= BACKUP_CHUNK_MESSAGES:
+                await writer.write(chunk)
+                chunk = []
+        if chunk:
+            await writer.write(chunk)
+        await writer.close()
+    except BaseException:
+        await asyncio.shield(writer.abort())
+        raise
+    return writer
+
+def read_backup(path):
+    """Lê um backup de volta: (cabeçalho, gerador de mensagens)"""
+    file = gzip.open(path, "rt", encoding="utf-8")
+    header = json.loads(file.readline())
+
+    def messages():
+        with file:
+            for line in file:
+                yield json.loads(line)
+    return header, messages()
+
+def shutdown_backup_writer():
+    """Espera os backups em andamento terminarem de ser gravados (desligamento do bot)"""
+    _writer.shutdown(wait=True)
@@ -0,0 +1,184 @@
+import json
+import logging
+import re
+from pathlib import Path
+
+from ticket_backups import BACKUP_DIR, BACKUP_SUFFIX, read_backup
+
+logger = logging.getLogger("bot.tickets")
+
+# ================= ARQUIVO DE TRANSCRIÇÕES =================
+# Cada backup de ticket vira uma linha em ticket_transcripts (servidor, canal,
+# quem abriu, tipo, período) e suas mensagens entram no índice FTS5
+# ticket_transcript_fts. As funções recebem a conexão: o bot as chama pelo
+# executor do banco (db.run/db.transaction) e a API local com get_db().
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 50
+SNIPPET_TOKENS = 16
+
+_TERM_RE = re.compile(r"\w+\*?", re.UNICODE)
+
+def fts_query(text):
+    """Converte a busca digitada em uma consulta FTS5 segura (todas as palavras, prefixo com *)"""
+    terms = []
+    for term in _TERM_RE.findall(text or ""):
+        prefix = term.endswith("*")
+        word = term.rstrip("*")
+        if word:
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return " ".join(terms)
+
+def page_bounds(page, per_page):
+    """(página, itens por página, offset) dentro dos limites"""
+    page = max(1, int(page or 1))
+    per_page = max(1, min(int(per_page or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+    return page, per_page, (page - 1) * per_page
+
+# ---------- indexação ----------
+def _read_transcript(path):
+    """(cabeçalho, mensagens) de um backup NDJSON compactado ou do formato .json antigo"""
+    if path.name.endswith(BACKUP_SUFFIX):
+        return read_backup(path)
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data, iter(data.pop("messages", []))
+
+def load_transcript(path):
+    """(cabeçalho, lista de mensagens) já lidos do disco, para indexar sem segurar a transação"""
+    header, messages = _read_transcript(Path(path))
+    return header, list(messages)
+
+def index_transcript(conn, path, opener_id=None, ticket_type=None, transcript=None):
+    """Registra um backup no arquivo e indexa suas mensagens (chamar dentro de uma transação)
+
+    Sem opener_id/ticket_type, usa o ticket ainda registrado em active_tickets.
+    `transcript` é o resultado de load_transcript; sem ele o arquivo é lido aqui.
+    Retorna o id da transcrição, ou None se o arquivo já estava indexado.
+    """
+    path = Path(path)
+    if conn.execute("SELECT 1 FROM ticket_transcripts WHERE file_name = ?", (path.name,)).fetchone():
+        return None
+
+    header, messages = transcript or _read_transcript(path)
+    if opener_id is None or ticket_type is None:
+        ticket = conn.execute(
+            "SELECT user_id, ticket_type FROM active_tickets WHERE channel_id = ?",
+            (header.get("channel_id"),)
+        ).fetchone()
+        if ticket:
+            opener_id = opener_id or ticket[0]
+            ticket_type = ticket_type or ticket[1]
+
+    transcript_id = conn.execute("""
+        INSERT INTO ticket_transcripts (guild_id, channel_id, channel_name, opener_id, ticket_type, file_name)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (
+        header.get("guild_id"), header.get("channel_id"), header.get("channel_name"),
+        opener_id, ticket_type, path.name,
+    )).lastrowid
+
+    # As mensagens vão do arquivo para o índice sem serem carregadas todas juntas
+    stats = {"count": 0, "first": None, "last": None}
+
+    def rows():
+        for message in messages:
+            timestamp = message.get("timestamp")
+            stats["count"] += 1
+            stats["first"] = stats["first"] or timestamp
+            stats["last"] = timestamp or stats["last"]
+            yield (message.get("content") or "", message.get("author"), transcript_id, message.get("id"), timestamp)
+
+    conn.executemany("""
+        INSERT INTO ticket_transcript_fts (content, author, transcript_id, message_id, timestamp)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows())
+    conn.execute(
+        "UPDATE ticket_transcripts SET started_at = ?, ended_at = ?, message_count = ? WHERE id = ?",
+        (stats["first"], stats["last"] or header.get("backup_date"), stats["count"], transcript_id)
+    )
+    return transcript_id
+
+def import_backup_directory(conn, directory=BACKUP_DIR):
+    """Indexa os backups da pasta que ainda não estão no arquivo (um commit por arquivo)"""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return 0
+    indexed = 0
+    for path in sorted(directory.iterdir()):
+        if not (path.name.endswith(BACKUP_SUFFIX) or path.suffix == ".json"):
+            continue
+        try:
+            with conn:
+                if index_transcript(conn, path) is not None:
+                    indexed += 1
+        except Exception as e:
+            logger.error(f"Erro ao indexar backup {path.name}: {e}")
+    return indexed
+
+# ---------- consulta ----------
+def _transcript_dict(row):
+    return {
+        "id": row["id"],
+        "guild_id": row["guild_id"],
+        "channel_id": row["channel_id"],
+        "channel_name": row["channel_name"],
+        "opener_id": row["opener_id"],
+        "ticket_type": row["ticket_type"],
+        "started_at": row["started_at"],
+        "ended_at": row["ended_at"],
+        "message_count": row["message_count"],
+        "file_name": row["file_name"],
+    }
+
+def search_transcripts(conn, guild_id, query=None, page=1, per_page=DEFAULT_PAGE_SIZE,
+                       opener_id=None, ticket_type=None):
+    """Busca mensagens arquivadas do servidor (ou lista as transcrições, sem busca)
+
+    Retorna {"total", "page", "per_page", "results"}; com busca, cada resultado é
+    uma mensagem encontrada (mais relevantes primeiro) com um trecho destacado.
+    """
+    page, per_page, offset = page_bounds(page, per_page)
+    filters = ["t.guild_id = ?"]
+    params = [str(guild_id)]
+    if opener_id:
+        filters.append("t.opener_id = ?")
+        params.append(str(opener_id))
+    if ticket_type:
+        filters.append("t.ticket_type = ?")
+        params.append(ticket_type)
+    where = " AND ".join(filters)
+
+    match = fts_query(query)
+    if not match:
+        total = conn.execute(f"SELECT COUNT(*) FROM ticket_transcripts t WHERE {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT t.* FROM ticket_transcripts t WHERE {where} ORDER BY t.ended_at DESC LIMIT ? OFFSET ?",
+            params + [per_page, offset]
+        ).fetchall()
+        results = [_transcript_dict(row) for row in rows]
+    else:
+        source = f"""
+            FROM ticket_transcript_fts f
+            JOIN ticket_transcripts t ON t.id = f.transcript_id
+            WHERE ticket_transcript_fts MATCH ? AND {where}
+        """
+        total = conn.execute(f"SELECT COUNT(*) {source}", [match] + params).fetchone()[0]
+        rows = conn.execute(f"""
+            SELECT t.*, f.author, f.message_id, f.timestamp,
+                   snippet(ticket_transcript_fts, 0, '**', '**', '…', {SNIPPET_TOKENS}) AS snippet
+            {source}
+            ORDER BY f.rank
+            LIMIT ? OFFSET ?
+        """, [match] + params + [per_page, offset]).fetchall()
+        results = [
+            {
+                **_transcript_dict(row),
+                "author": row["author"],
+                "message_id": row["message_id"],
+                "timestamp": row["timestamp"],
+                "snippet": row["snippet"],
+            }
+            for row in rows
+        ]
+    return {"total": total, "page": page, "per_page": per_page, "results": results}